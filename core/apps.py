@@ -5,6 +5,9 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        # Conecta los receptores que invalidan cachés al escribir en el catálogo.
+        from . import signals  # noqa: F401
+
         # Registramos un hook post_migrate para crear el grupo Editor sin tocar la BD en import.
         from django.db.models.signals import post_migrate
         from django.apps import apps
@@ -0,0 +1,109 @@
+"""
+Índice de prefijos para el autocompletado de los buscadores.
+
+Cada nombre (personajes, especies, planetas, películas y afiliaciones) se
+guarda normalizado junto con sus sufijos desde cada palabra ("luke skywalker"
+y "skywalker"), todo en una lista ordenada: las claves que empiezan por un
+prefijo forman un tramo contiguo que se localiza con `bisect`. Los resultados
+se ordenan por popularidad (apariciones del personaje o los contadores de
+`core.counters`). Se reconstruye al cambiar los datos (ver `core.cache`).
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from typing import NamedTuple
+
+from django.urls import reverse
+
+from .cache import TableSnapshot
+from .entity_index import normalize
+from .models import Affiliation, Appearance, Character, Media, Planet, Species
+
+KINDS = ("character", "species", "planet", "media", "affiliation")
+DETAIL_ROUTES = {
+    "character": "detalle_personaje",
+    "species": "species_detail",
+    "planet": "planet_detail",
+    "media": "media_detail",
+    "affiliation": "affiliation_detail",
+}
+DEFAULT_LIMIT = 8
+
+
+class Suggestion(NamedTuple):
+    kind: str
+    id: int
+    name: str
+    popularity: int
+
+    def as_dict(self):
+        return {
+            "kind": self.kind,
+            "id": self.id,
+            "name": self.name,
+            "url": reverse(DETAIL_ROUTES[self.kind], args=[self.id]),
+        }
+
+
+class _PrefixData:
+    def __init__(self):
+        self.entries = []
+        # Claves ordenadas y, en paralelo, (entrada, empieza el nombre completo).
+        self.keys = []
+        self.targets = []
+
+
+class PrefixIndex(TableSnapshot):
+    models = (Character, Species, Planet, Media, Affiliation, Appearance)
+
+    def build(self):
+        appearances = Counter(Appearance.objects.values_list("character_id", flat=True))
+        sources = (
+            ("character", ((pk, name, appearances[pk]) for pk, name in Character.objects.values_list("id", "name"))),
+            ("species", Species.objects.values_list("id", "name", "character_count")),
+            ("planet", Planet.objects.values_list("id", "name", "resident_count")),
+            ("media", Media.objects.values_list("id", "title", "cast_size")),
+            ("affiliation", Affiliation.objects.values_list("id", "name", "member_count")),
+        )
+
+        data = _PrefixData()
+        pairs = []
+        for kind, rows in sources:
+            for pk, name, popularity in rows:
+                words = normalize(name).split()
+                if not words:
+                    continue
+                position = len(data.entries)
+                data.entries.append(Suggestion(kind, pk, name, popularity or 0))
+                for start in range(len(words)):
+                    pairs.append((" ".join(words[start:]), position, start == 0))
+        pairs.sort()
+        data.keys = [key for key, _, _ in pairs]
+        data.targets = [(position, full) for _, position, full in pairs]
+        return data
+
+    def complete(self, text, kinds=None, limit=DEFAULT_LIMIT):
+        """Sugerencias cuyo nombre (o alguna de sus palabras) empieza por `text`."""
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        data = self.get()
+
+        best = {}
+        index = bisect_left(data.keys, prefix)
+        while index < len(data.keys) and data.keys[index].startswith(prefix):
+            position, full = data.targets[index]
+            best[position] = best.get(position, False) or full
+            index += 1
+
+        ranked = []
+        for position, full in best.items():
+            entry = data.entries[position]
+            if kinds is None or entry.kind in kinds:
+                # Primero quien empieza por el prefijo, luego los más populares.
+                ranked.append((not full, -entry.popularity, entry.name, entry))
+        return [item[3] for item in heapq.nsmallest(limit, ranked, key=lambda item: item[:3])]
+
+
+prefix_index = PrefixIndex()
@@ -0,0 +1,283 @@
+"""
+Benchmark de las vistas: latencia, consultas SQL y tamaño de respuesta por ruta.
+
+`seed_catalog(characters)` llena la base de datos con un catálogo sintético del
+tamaño pedido (especies, planetas, películas y afiliaciones en proporción) y
+`run_benchmark()` recorre con el cliente de pruebas de Django cada ruta con
+nombre de `core/urls.py` (`scenarios()`, con las combinaciones de filtros
+habituales) en cada idioma. De cada escenario se guarda p50/p95 de latencia,
+la mediana de consultas y los bytes de la respuesta.
+
+Por defecto se vacía la caché de Django (salvo las versiones de tabla) antes de
+cada petición para medir la vista y no la caché de páginas; los snapshots en
+memoria sí se mantienen calientes, como en un worker en marcha.
+
+`compare()` contrasta un resultado con su línea base (`benchmarks/views.json`):
+cualquier consulta de más es una regresión y la latencia lo es si la mediana
+crece más de un `latency_threshold` relativo (el p95, el doble) y además más de
+`min_delta_ms` absolutos. Lo usa el comando `benchmark_views`.
+"""
+
+import gc
+import json
+import math
+import os
+import random
+import statistics
+import time
+from typing import NamedTuple
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import translation
+
+from .cache import bump_model_versions, clear_keeping_versions, reset_snapshots
+from .counters import recompute_all_counters
+from .models import (
+    Affiliation,
+    Appearance,
+    Character,
+    CharacterAffiliation,
+    Media,
+    Planet,
+    PlanetInquiry,
+    PlanetSpecies,
+    Region,
+    Sector,
+    Species,
+    StarSystem,
+)
+from .routes import language_codes
+from .search import rebuild_index
+
+SCALES = {"small": 200, "medium": 2000, "large": 10000}
+# En orden de borrado: primero las tablas que apuntan a las demás.
+SEED_MODELS = (
+    Appearance, CharacterAffiliation, PlanetSpecies, PlanetInquiry, Character,
+    Affiliation, Media, Planet, Species, StarSystem, Sector, Region,
+)
+CLIMATES = ("arid", "temperate", "frozen", "tropical", "murky", "artificial temperate")
+TERRAINS = ("desert", "forests, mountains", "tundra, ice caves", "jungle", "swamp", "cityscape")
+GENDERS = ("male", "female", "none")
+COLORS = ("blue", "brown", "red", "yellow", "black", "green")
+ADMIN_USERNAME = "benchmark-admin"
+
+
+# ---------------------------------------------------------------------------
+# Datos
+# ---------------------------------------------------------------------------
+def seed_catalog(characters, seed=0):
+    """Borra el catálogo y crea uno sintético con `characters` personajes (sin señales)."""
+    rng = random.Random(seed)
+    for model in SEED_MODELS:
+        model.objects.all()._raw_delete(connection.alias)
+
+    region = Region.objects.create(name="Outer Rim Territories")
+    sector = Sector.objects.create(name="Arkanis sector", region=region)
+    systems = StarSystem.objects.bulk_create(StarSystem(name=f"System {i:03d}", sector=sector) for i in range(max(3, characters // 100)))
+    species = Species.objects.bulk_create(
+        Species(name=f"Species {i:03d}", classification=rng.choice(("mammal", "reptile", "amphibian")), language=f"Tongue {i}")
+        for i in range(max(5, characters // 20))
+    )
+    planets = Planet.objects.bulk_create(
+        Planet(
+            name=f"Planet {i:04d}",
+            climate=rng.choice(CLIMATES),
+            terrain=rng.choice(TERRAINS),
+            population=rng.randrange(0, 10**9),
+            star_system=rng.choice(systems),
+        )
+        for i in range(max(5, characters // 5))
+    )
+    media = Media.objects.bulk_create(
+        Media(title=f"Episode {i}", episode=i, opening_crawl=f"Turmoil has engulfed the galaxy {i}. " * 8, director="Director")
+        for i in range(1, 13)
+    )
+    affiliations = Affiliation.objects.bulk_create(Affiliation(name=f"Order {i:02d}", category="faction") for i in range(20))
+    people = Character.objects.bulk_create(
+        Character(
+            name=f"Character {i:05d}",
+            species=rng.choice(species),
+            homeworld=rng.choice(planets),
+            gender=rng.choice(GENDERS),
+            height_m=round(rng.uniform(0.5, 2.5), 2),
+            eye_color=rng.choice(COLORS),
+            hair_color=rng.choice(COLORS),
+            image_url="https://example.com/character.png",
+        )
+        for i in range(characters)
+    )
+    Appearance.objects.bulk_create(
+        Appearance(character=person, media=film, credit_order=order)
+        for person in people
+        for order, film in enumerate(rng.sample(media, rng.randint(1, 3)))
+    )
+    CharacterAffiliation.objects.bulk_create(
+        CharacterAffiliation(character=person, affiliation=affiliation)
+        for person in people
+        for affiliation in rng.sample(affiliations, rng.randint(0, 2))
+    )
+    PlanetSpecies.objects.bulk_create(
+        PlanetSpecies(planet=planet, species=native) for planet in planets for native in rng.sample(species, 1)
+    )
+
+    recompute_all_counters()
+    rebuild_index()
+    bump_model_versions(*SEED_MODELS)
+    reset_snapshots()
+    cache.clear()
+    user, _ = get_user_model().objects.get_or_create(username=ADMIN_USERNAME, defaults={"is_staff": True, "is_superuser": True})
+    return user
+
+
+# ---------------------------------------------------------------------------
+# Escenarios
+# ---------------------------------------------------------------------------
+class Scenario(NamedTuple):
+    route: str
+    label: str
+    method: str = "get"
+    args: tuple = ()
+    params: dict = None
+    staff: bool = False
+
+    def key(self, language):
+        return f"{language}:{self.route}:{self.label}"
+
+
+def scenarios():
+    """Escenarios de cada ruta de `core/urls.py` con ids del catálogo sembrado."""
+    character = Character.objects.order_by("pk")[Character.objects.count() // 2]
+    species = Species.objects.annotate(total=Count("character")).order_by("-total", "pk").first()
+    film = Media.objects.order_by("pk").first()
+    planet = Planet.objects.order_by("pk").first()
+    affiliation = Affiliation.objects.order_by("pk").first()
+    name = character.name
+    return [
+        Scenario("home", "default"),
+        Scenario("chat", "default"),
+        Scenario("media", "default"),
+        Scenario("media_detail", "default", args=(film.pk,)),
+        Scenario("characters", "default"),
+        Scenario("characters", "text", params={"q": name[:-2]}),
+        Scenario("characters", "fuzzy", params={"q": name.replace("Character", "Charcter")}),
+        Scenario("characters", "species", params={"species": species.pk}),
+        Scenario("characters", "species+media+gender", params={"species": species.pk, "media": film.pk, "gender": "female"}),
+        Scenario("detalle_personaje", "default", args=(character.pk,)),
+        Scenario("index_personajes", "default"),
+        Scenario("species_list", "default"),
+        Scenario("species_list", "sort-count", params={"sort": "count", "min": 2}),
+        Scenario("species_detail", "default", args=(species.pk,)),
+        Scenario("planets", "default"),
+        Scenario("planets", "climate+system", params={"climate": "arid", "system": planet.star_system_id}),
+        Scenario("planet_detail", "default", args=(planet.pk,)),
+        Scenario("affiliation_detail", "default", args=(affiliation.pk,)),
+        Scenario("crear_personaje", "form", staff=True),
+        Scenario("chatbot_search", "local", params={"q": f"who is {name}"}),
+        Scenario("chatbot_search_async", "local", params={"q": f"who is {name}"}),
+        Scenario("chatbot_stream", "local", params={"q": f"who is {name}"}),
+        Scenario("chatbot_batch", "local", method="post", params={"queries": [name, film.title, "qué es la fuerza"]}, staff=True),
+        Scenario("autocomplete", "prefix", params={"q": "chara", "kinds": "character,planet"}),
+        Scenario("search", "two-terms", params={"q": "episode galaxy"}),
+        Scenario("search", "type-page", params={"q": "planet", "type": "planet", "page": 2}),
+        Scenario("search_api", "prefix", params={"q": "spec"}),
+        Scenario("cache_stats", "default", staff=True),
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Medición
+# ---------------------------------------------------------------------------
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def send_request(client, scenario):
+    """(estado, bytes de la respuesta) de una petición del escenario."""
+    url = reverse(scenario.route, args=scenario.args)
+    if scenario.method == "post":
+        response = client.post(url, json.dumps(scenario.params), content_type="application/json")
+    else:
+        response = client.get(url, scenario.params or {})
+    body = b"".join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, len(body)
+
+
+def measure(client, scenario, repeat, warm):
+    timings, queries = [], []
+    status, size = send_request(client, scenario)  # calentamiento (snapshots, índices...)
+    for _ in range(repeat):
+        if not warm:
+            clear_keeping_versions()
+        # Sin pausas del recolector a mitad de una medida: son el grueso del ruido del p95.
+        gc.collect()
+        gc.disable()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                status, size = send_request(client, scenario)
+                timings.append((time.perf_counter() - start) * 1000)
+        finally:
+            gc.enable()
+        queries.append(len(captured))
+    return {
+        "status": status,
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(_percentile(timings, 0.95), 2),
+        "queries": int(statistics.median(queries)),
+        "bytes": size,
+    }
+
+
+def run_benchmark(user, repeat=20, languages=None, routes=None, warm=False, progress=None):
+    """{clave del escenario: medidas} de todos los escenarios en cada idioma."""
+    anonymous, staff = Client(), Client()
+    staff.force_login(user)
+    results = {}
+    # El chatbot no sale a OpenAI: las preguntas sin ficha local devuelven el fallback.
+    with patch.dict(os.environ):
+        os.environ.pop("OPENAI_API_KEY", None)
+        for language in languages or language_codes():
+            with translation.override(language):
+                for scenario in scenarios():
+                    if routes and scenario.route not in routes:
+                        continue
+                    key = scenario.key(language)
+                    results[key] = measure(staff if scenario.staff else anonymous, scenario, repeat, warm)
+                    if progress:
+                        progress(key, results[key])
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Líneas base
+# ---------------------------------------------------------------------------
+class Regression(NamedTuple):
+    key: str
+    metric: str
+    baseline: float
+    current: float
+
+
+def compare(current, baseline, latency_threshold=0.5, min_delta_ms=5.0):
+    """Regresiones de `current` frente a `baseline` (mismo formato que `run_benchmark`)."""
+    regressions = []
+    for key, measures in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if measures["queries"] > base["queries"]:
+            regressions.append(Regression(key, "queries", base["queries"], measures["queries"]))
+        # La cola es más ruidosa que la mediana: el p95 tolera el doble.
+        for metric, threshold in (("p50_ms", latency_threshold), ("p95_ms", 2 * latency_threshold)):
+            limit = max(base[metric] * (1 + threshold), base[metric] + min_delta_ms)
+            if measures[metric] > limit:
+                regressions.append(Regression(key, metric, base[metric], measures[metric]))
+    return regressions
@@ -0,0 +1,431 @@
+"""
+Utilidades de caché compartidas por las vistas del catálogo.
+
+`cache_page_swr` sustituye a `cache_page` en las páginas populares: cuando una
+entrada caduca solo una petición la reconstruye (single-flight) mientras el
+resto sirve la copia antigua o espera unos instantes a que aparezca la nueva.
+La clave es la de `cache_page` (URL, idioma y cabeceras `Vary`) y, como en
+`UpdateCacheMiddleware`, no se guarda nada que ponga cookies o un token CSRF.
+
+`cached_queryset` guarda el resultado de consultas pequeñas y muy leídas. La
+clave incluye el SQL, sus parámetros y la versión de cada tabla implicada; las
+señales de `core.signals` cambian esa versión en cada escritura, así que las
+entradas antiguas dejan de usarse sin tener que borrarlas una a una.
+
+Las versiones son un token aleatorio por tabla en un fichero de
+`TABLE_VERSIONS_DIR`, no en `CACHES`: con LocMemCache cada proceso tendría las
+suyas y no vería las escrituras de los demás (workers, `load_data`,
+`flush_inquiries`).
+
+`TableSnapshot` es la base de las estructuras en memoria de proceso (registro de
+referencia, índices...) que se reconstruyen perezosamente cuando cambia la
+versión de alguna de sus tablas.
+"""
+
+import hashlib
+import math
+import os
+import random
+import threading
+import time
+import uuid
+import weakref
+from functools import wraps
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import get_cache_key, learn_cache_key, patch_response_headers, patch_vary_headers
+
+from . import perf
+
+
+class CacheStats:
+    """Contadores en proceso de una caché concreta (aciertos, fallos, etc.)."""
+
+    FIELDS = ("hits", "misses", "stale", "waits", "early_refreshes", "evictions")
+
+    def __init__(self, name, stale_served=True):
+        self.name = name
+        # En las páginas "stale" es una copia antigua servida (un acierto); en la
+        # caché del LLM, una entrada descartada que obliga a preguntar (un fallo).
+        self.stale_served = stale_served
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+        # También a las métricas de la petición en curso (ver core.perf).
+        if field == "hits" or (field == "stale" and self.stale_served):
+            perf.record(cache_hits=amount)
+        elif field in ("misses", "stale"):
+            perf.record(cache_misses=amount)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["hits"] + counts["misses"]
+        if not self.stale_served:
+            lookups += counts["stale"]
+        counts["hit_ratio"] = round(counts["hits"] / lookups, 3) if lookups else None
+        return counts
+
+    def reset(self):
+        with self._lock:
+            self._counts = dict.fromkeys(self.FIELDS, 0)
+
+
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+
+def get_cache_stats(name, stale_served=True) -> CacheStats:
+    with _STATS_LOCK:
+        if name not in _STATS:
+            _STATS[name] = CacheStats(name, stale_served)
+        return _STATS[name]
+
+
+def stale_is_served(name) -> bool:
+    """Si los "stale" de la caché `name` cuentan como aciertos (ver `CacheStats`)."""
+    with _STATS_LOCK:
+        stats = _STATS.get(name)
+    return stats is None or stats.stale_served
+
+
+def cache_stats() -> dict:
+    """Devuelve {nombre_cache: {contador: valor}} para todas las cachés registradas."""
+    with _STATS_LOCK:
+        registered = list(_STATS.values())
+    return {stats.name: stats.snapshot() for stats in registered}
+
+
+def cache_is_process_local(cache_alias="default") -> bool:
+    """True si la caché vive en la memoria de este proceso (lo que se guarde aquí no lo ven otros)."""
+    return isinstance(caches[cache_alias], LocMemCache)
+
+
+class _PageEntry(NamedTuple):
+    response: object
+    soft_expires: float
+    compute_time: float
+
+
+def _lock_key(prefix, request):
+    # Candado por URL e idioma: la clave real depende de las cabeceras Vary de la respuesta.
+    raw = "|".join([request.build_absolute_uri(), getattr(request, "LANGUAGE_CODE", "")])
+    digest = hashlib.md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest()
+    return f"{prefix}:lock:{digest}"
+
+
+def _is_cacheable(request, response):
+    """Como `UpdateCacheMiddleware`: nada que lleve cookies o un token CSRF de un usuario concreto."""
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+        return False
+    cache_control = response.get("Cache-Control", "")
+    return "private" not in cache_control and "no-store" not in cache_control
+
+
+def _should_refresh_early(entry, now, beta):
+    """Refresco probabilístico (XFetch): cuanto más cerca de caducar, más probable."""
+    if beta <= 0 or entry.compute_time <= 0:
+        return False
+    return now - entry.compute_time * beta * math.log(1.0 - random.random()) >= entry.soft_expires
+
+
+def cache_page_swr(
+    timeout,
+    *,
+    stale_ttl=None,
+    lock_timeout=30,
+    wait_timeout=2.0,
+    beta=1.0,
+    cache_alias="default",
+    key_prefix="swr",
+    stats_name="pages",
+):
+    """
+    Versión de `cache_page` con stale-while-revalidate y protección de estampidas.
+
+    - `timeout` es el TTL blando: pasado ese tiempo la entrada se considera
+      antigua y una única petición la regenera.
+    - `stale_ttl` es cuánto tiempo extra se puede servir la copia antigua
+      (TTL duro = timeout + stale_ttl). Por defecto igual a `timeout`.
+    - Si no hay copia que servir, las peticiones concurrentes esperan hasta
+      `wait_timeout` segundos a que la reconstruya quien tiene el candado.
+    - `beta` controla el refresco anticipado probabilístico (0 lo desactiva).
+    """
+    stale_ttl = timeout if stale_ttl is None else stale_ttl
+    hard_ttl = timeout + stale_ttl
+    stats = get_cache_stats(stats_name)
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view_func(request, *args, **kwargs)
+
+            cache = caches[cache_alias]
+            lock_key = _lock_key(key_prefix, request)
+            now = time.time()
+
+            def rebuild():
+                started = time.perf_counter()
+                try:
+                    response = view_func(request, *args, **kwargs)
+                    if hasattr(response, "render") and callable(response.render):
+                        response.render()
+                    # SessionMiddleware añadirá Vary: Cookie después; la clave tiene que contarlo ya.
+                    session = getattr(request, "session", None)
+                    if session is not None and session.accessed:
+                        patch_vary_headers(response, ("Cookie",))
+                    if _is_cacheable(request, response):
+                        patch_response_headers(response, timeout)
+                        entry = _PageEntry(
+                            response=response,
+                            soft_expires=time.time() + timeout,
+                            compute_time=time.perf_counter() - started,
+                        )
+                        key = learn_cache_key(request, response, hard_ttl, key_prefix, cache=cache)
+                        cache.set(key, entry, hard_ttl)
+                    response["X-Cache"] = "MISS"
+                    return response
+                finally:
+                    cache.delete(lock_key)
+
+            def lookup():
+                # Misma clave que cache_page: URL, idioma y las cabeceras Vary aprendidas.
+                key = get_cache_key(request, key_prefix, "GET", cache=cache)
+                return cache.get(key) if key is not None else None
+
+            def serve(entry, label):
+                response = entry.response
+                response["X-Cache"] = label
+                return response
+
+            entry = lookup()
+            if entry is not None:
+                fresh = now < entry.soft_expires
+                if fresh and not _should_refresh_early(entry, now, beta):
+                    stats.incr("hits")
+                    return serve(entry, "HIT")
+                if cache.add(lock_key, 1, lock_timeout):
+                    stats.incr("early_refreshes" if fresh else "misses")
+                    return rebuild()
+                stats.incr("hits" if fresh else "stale")
+                return serve(entry, "HIT" if fresh else "STALE")
+
+            if cache.add(lock_key, 1, lock_timeout):
+                stats.incr("misses")
+                return rebuild()
+
+            # Otro proceso está reconstruyendo: esperamos un poco antes de rendirnos.
+            stats.incr("waits")
+            deadline = time.monotonic() + wait_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                entry = lookup()
+                if entry is not None:
+                    return serve(entry, "HIT")
+
+            stats.incr("misses")
+            response = view_func(request, *args, **kwargs)
+            response["X-Cache"] = "MISS"
+            return response
+
+        _wrapped.cache_page_swr = True
+        return _wrapped
+
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Versiones por tabla y caché de querysets
+# ---------------------------------------------------------------------------
+QUERYSET_CACHE_TIMEOUT = 60 * 60
+
+# Se incrementa con cada escritura hecha desde este proceso; permite a los
+# snapshots detectar cambios locales sin mirar el directorio de versiones.
+_local_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _versions_dir() -> Path:
+    return Path(settings.TABLE_VERSIONS_DIR)
+
+
+def _write_token(path, token, replace=True):
+    """Escribe `token` en `path` de forma atómica: quien lea nunca ve un fichero a medias."""
+    tmp = path.with_name(f".{path.name}.{token}")
+    tmp.write_text(token)
+    try:
+        if replace:
+            os.replace(tmp, path)
+            return token
+        try:
+            # link no pisa: si otro proceso creó la versión antes, gana la suya.
+            os.link(tmp, path)
+            return token
+        except FileExistsError:
+            return path.read_text()
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def table_versions(tables) -> dict:
+    """Devuelve {tabla: versión}; las tablas sin versión reciben una nueva."""
+    directory = _versions_dir()
+    versions = {}
+    for table in tables:
+        path = directory / table
+        try:
+            versions[table] = path.read_text()
+        except FileNotFoundError:
+            directory.mkdir(parents=True, exist_ok=True)
+            versions[table] = _write_token(path, uuid.uuid4().hex, replace=False)
+    return versions
+
+
+def bump_table_versions(*tables):
+    """Invalida todo lo cacheado que dependa de estas tablas, en todos los procesos."""
+    if not tables:
+        return
+    directory = _versions_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    # Tokens aleatorios en vez de contadores: una versión nueva nunca coincide
+    # con la de entradas antiguas, aunque se borre el directorio.
+    for table in tables:
+        _write_token(directory / table, uuid.uuid4().hex)
+    global _local_generation
+    with _generation_lock:
+        _local_generation += 1
+
+
+def clear_keeping_versions(cache_alias="default"):
+    """Vacía la caché: páginas fuera, snapshots intactos (las versiones viven en disco)."""
+    caches[cache_alias].clear()
+
+
+def bump_model_versions(*models):
+    tables = set()
+    for model in models:
+        tables.add(model._meta.db_table)
+        for field in model._meta.local_many_to_many:
+            tables.add(field.remote_field.through._meta.db_table)
+    bump_table_versions(*sorted(tables))
+
+
+def queryset_tables(queryset) -> set:
+    """Tablas que toca un queryset (la base y las de sus JOIN)."""
+    query = queryset.query
+    # Compilar garantiza que alias_map contiene también la tabla base.
+    query.sql_with_params()
+    tables = {alias.table_name for alias in query.alias_map.values()}
+    tables.add(queryset.model._meta.db_table)
+    return tables
+
+
+def cached_queryset(queryset, timeout=QUERYSET_CACHE_TIMEOUT, tables=(), cache_alias="default"):
+    """
+    Evalúa `queryset` una sola vez mientras no cambien sus tablas y devuelve una lista.
+
+    Es opt-in: pensado para consultas de referencia pequeñas (opciones de
+    filtros, listados de películas...). `tables` permite añadir tablas que el
+    ORM no refleja en los JOIN, por ejemplo las de una subconsulta.
+    """
+    stats = get_cache_stats("queryset")
+    involved = queryset_tables(queryset) | set(tables)
+    sql, params = queryset.query.sql_with_params()
+    versions = table_versions(sorted(involved))
+
+    raw = "|".join([queryset.db, sql, repr(params), repr(sorted(versions.items()))])
+    key = "qs:" + hashlib.md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest()
+
+    cache = caches[cache_alias]
+    result = cache.get(key)
+    if result is not None:
+        stats.incr("hits")
+        return result
+
+    stats.incr("misses")
+    result = list(queryset)
+    cache.set(key, result, timeout)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Snapshots en memoria de proceso
+# ---------------------------------------------------------------------------
+_SNAPSHOTS = weakref.WeakSet()
+
+
+class TableSnapshot:
+    """
+    Estructura en memoria que se reconstruye cuando cambian sus tablas.
+
+    Las subclases definen `models` y `build()`. Las escrituras de este mismo
+    proceso se detectan al instante; las de otros procesos (p. ej. `load_data`
+    o `flush_inquiries`) se comprueban contra `TABLE_VERSIONS_DIR` como mucho
+    cada `check_interval` segundos. Por si alguna escritura no pasa por las
+    señales (SQL a mano, otra máquina), pasados `max_age` segundos se
+    reconstruye igualmente.
+    """
+
+    models = ()
+    check_interval = 1.0
+    max_age = 300.0
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = None
+        self._versions = None
+        self._generation = -1
+        self._checked_at = 0.0
+        self._built_at = 0.0
+        _SNAPSHOTS.add(self)
+
+    def build(self):
+        raise NotImplementedError
+
+    @property
+    def tables(self):
+        return sorted({model._meta.db_table for model in self.models})
+
+    def get(self):
+        now = time.monotonic()
+        if (
+            self._data is not None
+            and self._generation == _local_generation
+            and now - self._checked_at < self.check_interval
+            and now - self._built_at < self.max_age
+        ):
+            return self._data
+
+        with self._lock:
+            generation = _local_generation
+            # Leemos las versiones antes de construir: si alguien escribe durante
+            # la construcción, la siguiente comprobación verá otra versión.
+            versions = table_versions(self.tables)
+            if self._data is None or versions != self._versions or now - self._built_at >= self.max_age:
+                with perf.rebuilding():
+                    self._data = self.build()
+                self._versions = versions
+                self._built_at = now
+            self._generation = generation
+            self._checked_at = now
+            return self._data
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+
+
+def reset_snapshots():
+    """Descarta todos los snapshots del proceso (útil en tests tras un rollback)."""
+    for snapshot in list(_SNAPSHOTS):
+        snapshot.invalidate()
@@ -0,0 +1,681 @@
+"""
+Lógica del chatbot compartida por sus endpoints (síncrono y asíncrono).
+
+La resolución tiene dos pasos:
+1) `resolve_local`: índice de nombres en memoria, búsqueda aproximada y, si
+   no hay nombres, búsqueda semántica sobre el texto del catálogo.
+2) `resolve_llm`: pregunta a OpenAI (si hay `OPENAI_API_KEY`) e intenta
+   enlazar su respuesta con una ficha del catálogo.
+
+Las llamadas a OpenAI reutilizan conexiones: una `requests.Session` para la
+ruta síncrona y un `httpx.AsyncClient` por event loop para la asíncrona. Las
+respuestas se guardan en `core.llm_cache` para no repetir preguntas, las
+preguntas iguales en curso comparten una sola llamada y un circuit breaker
+corta las llamadas mientras OpenAI falla o va lento (ver `core.resilience`).
+
+`stream_events` / `astream_events` dan la misma respuesta como Server-Sent
+Events: la ficha local al instante o el texto del LLM según se genera.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import requests
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.urls import reverse
+
+from . import perf
+from .entity_index import entity_index
+from .fuzzy import fuzzy_index
+from .llm_cache import llm_cache, normalize_query
+from .metrics import metrics_registry
+from .resilience import AsyncSingleFlight, CircuitBreaker, Deadline, SingleFlight
+from .semantic import semantic_index
+
+FALLBACK_REPLY = "Solo puedo ayudarte con personajes o películas de Star Wars. Prueba con un nombre o especie."
+LLM_TIMEOUT = 10
+# Presupuesto de una petición al chatbot, compartido por la búsqueda local y el
+# LLM; con menos margen que MIN_LLM_TIMEOUT ya no se llama al LLM.
+LATENCY_BUDGET = 10.0
+MIN_LLM_TIMEOUT = 0.5
+# Tope de llamadas simultáneas al LLM por proceso (peticiones sueltas y lotes).
+LLM_MAX_CONCURRENCY = 8
+# Preguntas admitidas por petición en `chatbot/batch/`.
+BATCH_MAX_QUERIES = 50
+# Más exigente que el buscador de personajes: aquí un falso positivo
+# sustituye a la respuesta del LLM.
+FUZZY_THRESHOLD = 0.6
+SEMANTIC_THRESHOLD = 0.35
+
+SYSTEM_PROMPT = (
+    "Responde solo sobre personajes o películas de Star Wars. "
+    "Devuelve siempre un JSON con los campos 'name' y 'body'. "
+    "En 'name' pon el nombre del personaje o título de la película si se entiende de la pregunta; "
+    "si no es de Star Wars, deja name vacío y body indicando que solo respondes sobre Star Wars."
+)
+
+
+# ---------------------------------------------------------------------------
+# Tarjetas de respuesta
+# ---------------------------------------------------------------------------
+def character_payload(card, body=None):
+    return {
+        "kind": "character",
+        "name": card["name"],
+        "body": body or f"Aquí tienes información sobre {card['name']}.",
+        "species": card["species"],
+        "homeworld": card["homeworld"],
+        "cybernetics": card["cybernetics"],
+        "film": card["film"],
+        "image": card["image"],
+        "detail_url": reverse("detalle_personaje", args=[card["id"]]),
+    }
+
+
+def media_payload(card, body=None):
+    return {
+        "kind": "media",
+        "name": card["name"],
+        "body": body or f"Aquí tienes información sobre {card['name']}.",
+        "release_year": card["release_year"],
+        "episode": card["episode"],
+        "poster": card["poster"],
+        "detail_url": reverse("media_detail", args=[card["id"]]),
+    }
+
+
+def card_payload(kind, card, body=None):
+    if kind == "character":
+        return character_payload(card, body=body)
+    return media_payload(card, body=body)
+
+
+# ---------------------------------------------------------------------------
+# Resolución
+# ---------------------------------------------------------------------------
+def find_fuzzy(text):
+    matches = fuzzy_index.search(text, limit=1, threshold=FUZZY_THRESHOLD)
+    if not matches:
+        return None
+    kind, target_id = matches[0].card
+    if kind == "character":
+        return kind, entity_index.character_card(target_id)
+    return kind, entity_index.media_card(target_id)
+
+
+def _outcome(payload, outcome):
+    # Contador `chatbot_replies_total` de /metrics.
+    if payload is not None:
+        metrics_registry.inc("chatbot_replies_total", outcome=outcome)
+    return payload
+
+
+def resolve_local(query):
+    """Respuesta sin salir del proceso, o None si hace falta el LLM."""
+    return _outcome(_resolve_local(query), "local")
+
+
+def _resolve_local(query):
+    personaje = entity_index.find_character(query)
+    if personaje:
+        return character_payload(personaje, body=f"Te muestro info de {personaje['name']}:")
+
+    media_obj = entity_index.find_media(query)
+    if media_obj:
+        return media_payload(media_obj, body=f"Te muestro info de {media_obj['name']}:")
+
+    # Erratas y variantes ("skywaker", "Obi Wan") se resuelven sin llamar al LLM.
+    fuzzy = find_fuzzy(query)
+    if fuzzy:
+        kind, card = fuzzy
+        return card_payload(kind, card, body=f"¿Buscabas {card['name']}? Te muestro su info:")
+
+    # Descripciones ("planeta desértico con dos soles") contra el texto del catálogo.
+    hits = semantic_index.search(query, k=1, min_score=SEMANTIC_THRESHOLD)
+    if hits:
+        return semantic_payload(hits[0])
+    return None
+
+
+DETAIL_ROUTES = {
+    "character": "detalle_personaje",
+    "species": "species_detail",
+    "planet": "planet_detail",
+    "media": "media_detail",
+    "affiliation": "affiliation_detail",
+}
+
+
+def semantic_payload(hit):
+    body = f"Por lo que cuenta el catálogo, creo que hablas de {hit.name}:"
+    # Los dos índices se reconstruyen por separado: la ficha puede no estar aún.
+    if hit.kind == "character" and entity_index.character_card(hit.id):
+        return character_payload(entity_index.character_card(hit.id), body=body)
+    if hit.kind == "media" and entity_index.media_card(hit.id):
+        return media_payload(entity_index.media_card(hit.id), body=body)
+    return {
+        "kind": hit.kind,
+        "name": hit.name,
+        "body": body,
+        "detail_url": reverse(DETAIL_ROUTES[hit.kind], args=[hit.id]),
+    }
+
+
+def resolve_llm(gpt_data):
+    """Convierte la respuesta {name, body} del LLM en tarjeta o texto (None si no sirve)."""
+    return _outcome(_resolve_llm(gpt_data), "llm")
+
+
+def _resolve_llm(gpt_data):
+    if not gpt_data:
+        return None
+    name = gpt_data.get("name") or ""
+    body = gpt_data.get("body")
+
+    for text in (name, body):
+        if not text:
+            continue
+        match = entity_index.find_character(text)
+        if match:
+            return character_payload(match, body=body)
+        media_match = entity_index.find_media(text)
+        if media_match:
+            return media_payload(media_match, body=body)
+
+    if body:
+        return {"reply": body}
+    return None
+
+
+def fallback_payload():
+    return _outcome({"reply": FALLBACK_REPLY}, "fallback")
+
+
+# ---------------------------------------------------------------------------
+# Cliente de OpenAI
+# ---------------------------------------------------------------------------
+def llm_request(query):
+    """(url, json, headers) de la petición a OpenAI, o None si no hay clave."""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    base_url = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+    payload = {
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": query},
+        ],
+        "temperature": 0.2,
+        "max_tokens": 120,
+        "response_format": {"type": "json_object"},
+    }
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+    return f"{base_url}/chat/completions", payload, headers
+
+
+def parse_llm_response(data):
+    content = data["choices"][0]["message"]["content"]
+    if isinstance(content, str):
+        return json.loads(content)
+    return content
+
+
+_session = requests.Session()
+_llm_slots = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+llm_breaker = CircuitBreaker("openai", failure_threshold=5, slow_call=5.0, cooldown=30.0)
+_flights = SingleFlight()
+_async_flights = AsyncSingleFlight()
+
+
+def _llm_timeout(deadline):
+    return deadline.timeout(LLM_TIMEOUT) if deadline else LLM_TIMEOUT
+
+
+def _flight_key(query, payload):
+    # Preguntas equivalentes ("who is yoda", "¿quién es yoda?") comparten llamada.
+    return payload["model"], normalize_query(query) or query
+
+
+def _record(ok, elapsed, timeout, timed_out):
+    perf.record(http_calls=1, http_ms=elapsed * 1000)
+    # Un timeout más corto que una llamada lenta lo fija el presupuesto de esta
+    # petición: no dice nada de la salud del upstream.
+    if timed_out and timeout < llm_breaker.slow_call:
+        llm_breaker.release()
+    else:
+        llm_breaker.record(ok, elapsed)
+
+
+def gpt_reply(query, deadline=None):
+    """Llama a la API de OpenAI si hay clave y devuelve JSON {name, body}."""
+    request = llm_request(query)
+    if request is None:
+        return None
+    url, payload, headers = request
+    cached = llm_cache.get(query, payload["model"])
+    if cached is not None:
+        return cached
+    timeout = _llm_timeout(deadline)
+    if timeout < MIN_LLM_TIMEOUT:
+        return None
+
+    def call():
+        # Hueco en el tope global de llamadas simultáneas (ver LLM_MAX_CONCURRENCY).
+        if not _llm_slots.acquire(timeout=timeout):
+            return None
+        try:
+            return _post(_llm_timeout(deadline))
+        finally:
+            _llm_slots.release()
+
+    def _post(timeout):
+        if timeout < MIN_LLM_TIMEOUT or not llm_breaker.allow():
+            return None
+        start = time.monotonic()
+        try:
+            res = _session.post(url, json=payload, headers=headers, timeout=timeout)
+            res.raise_for_status()
+            reply = parse_llm_response(res.json())
+        except Exception as exc:
+            _record(False, time.monotonic() - start, timeout, isinstance(exc, requests.Timeout))
+            return None
+        _record(True, time.monotonic() - start, timeout, False)
+        llm_cache.set(query, payload["model"], reply)
+        return reply
+
+    return _flights.do(_flight_key(query, payload), call, timeout=timeout)
+
+
+# Un AsyncClient solo puede usarse dentro del event loop en el que se creó.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+_async_slots = weakref.WeakKeyDictionary()
+
+
+def _async_llm_slots():
+    loop = asyncio.get_running_loop()
+    if loop not in _async_slots:
+        _async_slots[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _async_slots[loop]
+
+
+def async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+async def agpt_reply(query, deadline=None):
+    """Versión asíncrona de `gpt_reply`: no bloquea ningún worker mientras espera."""
+    request = llm_request(query)
+    if request is None:
+        return None
+    url, payload, headers = request
+    cached = await sync_to_async(llm_cache.get)(query, payload["model"])
+    if cached is not None:
+        return cached
+    timeout = _llm_timeout(deadline)
+    if timeout < MIN_LLM_TIMEOUT:
+        return None
+
+    async def call():
+        slots = _async_llm_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        try:
+            return await _post(_llm_timeout(deadline))
+        finally:
+            slots.release()
+
+    async def _post(timeout):
+        if timeout < MIN_LLM_TIMEOUT or not llm_breaker.allow():
+            return None
+        start = time.monotonic()
+        try:
+            res = await async_client().post(url, json=payload, headers=headers, timeout=timeout)
+            res.raise_for_status()
+            reply = parse_llm_response(res.json())
+        except Exception as exc:
+            _record(False, time.monotonic() - start, timeout, isinstance(exc, httpx.TimeoutException))
+            return None
+        _record(True, time.monotonic() - start, timeout, False)
+        await sync_to_async(llm_cache.set)(query, payload["model"], reply)
+        return reply
+
+    return await _async_flights.do(_flight_key(query, payload), call, timeout=timeout)
+
+
+# ---------------------------------------------------------------------------
+# Lotes de preguntas
+# ---------------------------------------------------------------------------
+def _gpt_reply_in_worker(query, deadline):
+    try:
+        return gpt_reply(query, deadline=deadline)
+    finally:
+        connections.close_all()
+
+
+def resolve_batch(queries):
+    """
+    Respuestas para una lista de preguntas, en el mismo orden.
+
+    Los índices locales se cargan una vez para todo el lote; las preguntas sin
+    coincidencia local van al LLM en paralelo (sin pasar de LLM_MAX_CONCURRENCY
+    llamadas en todo el proceso) y comparten un único presupuesto de tiempo.
+    """
+    deadline = Deadline(LATENCY_BUDGET)
+    entity_index.get()
+    fuzzy_index.get()
+    semantic_index.get()
+
+    results = {}
+    pending = []
+    for query in dict.fromkeys(queries):
+        if not query:
+            results[query] = {"error": "Falta la consulta"}
+            continue
+        payload = resolve_local(query)
+        if payload is None:
+            pending.append(query)
+        else:
+            results[query] = payload
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(LLM_MAX_CONCURRENCY, len(pending))) as pool:
+            # Cada hilo con una copia del contexto: sus llamadas cuentan en las métricas de la petición.
+            contexts = [contextvars.copy_context() for _ in pending]
+            replies = pool.map(lambda context, query: context.run(_gpt_reply_in_worker, query, deadline), contexts, pending)
+            for query, gpt_data in zip(pending, replies):
+                results[query] = resolve_llm(gpt_data) or fallback_payload()
+    return [{"query": query, **results[query]} for query in queries]
+
+
+# ---------------------------------------------------------------------------
+# Respuestas en streaming (Server-Sent Events)
+# ---------------------------------------------------------------------------
+# En streaming el LLM contesta en texto plano: un JSON a medias no se puede
+# mostrar según llega. Al terminar se busca en el texto una ficha del catálogo.
+STREAM_SYSTEM_PROMPT = (
+    "Responde solo sobre personajes o películas de Star Wars, en dos o tres frases. "
+    "Menciona el nombre completo del personaje o el título de la película. "
+    "Si la pregunta no es de Star Wars, indica que solo respondes sobre Star Wars."
+)
+
+
+def llm_stream_request(query):
+    request = llm_request(query)
+    if request is None:
+        return None
+    url, payload, headers = request
+    payload = {key: value for key, value in payload.items() if key != "response_format"}
+    payload["messages"] = [{"role": "system", "content": STREAM_SYSTEM_PROMPT}, payload["messages"][-1]]
+    payload["stream"] = True
+    return url, payload, headers
+
+
+def parse_stream_line(line):
+    """Texto de una línea `data: {...}` del stream de OpenAI; None al terminar."""
+    if not line or not line.startswith("data:"):
+        return ""
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+# El primer byte sale al momento aunque el LLM tarde en empezar.
+SSE_OPEN = ": stream\n\n"
+
+
+def stream_reply(body):
+    """{name, body} para la caché de una respuesta en streaming: `name` es la ficha que menciona."""
+    card = None
+    if body:
+        card = entity_index.find_character(body) or entity_index.find_media(body)
+    return {"name": card["name"] if card else "", "body": body}
+
+
+class _StreamFlight:
+    """Respuesta en streaming en curso; `body` queda con el texto solo si el stream terminó bien."""
+
+    __slots__ = ("done", "body")
+
+    def __init__(self, done):
+        self.done = done
+        self.body = None
+
+
+_stream_flights = {}
+_stream_flights_lock = threading.Lock()
+_async_stream_flights = weakref.WeakKeyDictionary()
+
+
+def stream_gpt_reply(query, deadline):
+    """
+    Genera los fragmentos de texto del LLM según llegan (nada si no se le puede llamar).
+
+    Como `gpt_reply`, ocupa un hueco de LLM_MAX_CONCURRENCY y agrupa preguntas
+    equivalentes: quien llega mientras otra petición genera la misma respuesta
+    recibe el texto completo de una vez al terminar.
+    """
+    request = llm_stream_request(query)
+    if request is None:
+        return
+    url, payload, headers = request
+    cached = llm_cache.get(query, payload["model"])
+    if cached is not None:
+        yield cached.get("body") or ""
+        return
+    timeout = _llm_timeout(deadline)
+    if timeout < MIN_LLM_TIMEOUT:
+        return
+
+    key = _flight_key(query, payload)
+    with _stream_flights_lock:
+        flight = _stream_flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _stream_flights[key] = _StreamFlight(threading.Event())
+    if not leader:
+        if flight.done.wait(timeout) and flight.body:
+            yield flight.body
+        return
+
+    try:
+        if not _llm_slots.acquire(timeout=timeout):
+            return
+        try:
+            yield from _stream_llm(url, payload, headers, deadline, flight)
+        finally:
+            _llm_slots.release()
+        # Una respuesta cortada por el presupuesto no se guarda: la próxima vez, entera.
+        if flight.body:
+            llm_cache.set(query, payload["model"], stream_reply(flight.body))
+    finally:
+        with _stream_flights_lock:
+            del _stream_flights[key]
+        flight.done.set()
+
+
+def _stream_llm(url, payload, headers, deadline, flight):
+    timeout = _llm_timeout(deadline)
+    if timeout < MIN_LLM_TIMEOUT or not llm_breaker.allow():
+        return
+    start, parts, complete = time.monotonic(), [], False
+    try:
+        with _session.post(url, json=payload, headers=headers, timeout=timeout, stream=True) as res:
+            res.raise_for_status()
+            for line in res.iter_lines(decode_unicode=True):
+                text = parse_stream_line(line)
+                if text is None:
+                    complete = True
+                    break
+                if not deadline.remaining():
+                    break
+                if text:
+                    parts.append(text)
+                    yield text
+    except GeneratorExit:
+        # El cliente cerró la conexión: no hay veredicto sobre OpenAI.
+        llm_breaker.release()
+        raise
+    except Exception as exc:
+        _record(False, time.monotonic() - start, timeout, isinstance(exc, requests.Timeout))
+        return
+    _finish_stream(complete, parts, start, timeout, flight)
+
+
+def _finish_stream(complete, parts, start, timeout, flight):
+    if complete:
+        _record(True, time.monotonic() - start, timeout, False)
+        flight.body = "".join(parts)
+    else:
+        # Cortado por el presupuesto de la petición: cuenta como un timeout.
+        _record(False, time.monotonic() - start, timeout, True)
+
+
+async def astream_gpt_reply(query, deadline):
+    """Versión asíncrona de `stream_gpt_reply`."""
+    request = llm_stream_request(query)
+    if request is None:
+        return
+    url, payload, headers = request
+    cached = await sync_to_async(llm_cache.get)(query, payload["model"])
+    if cached is not None:
+        yield cached.get("body") or ""
+        return
+    timeout = _llm_timeout(deadline)
+    if timeout < MIN_LLM_TIMEOUT:
+        return
+
+    key = _flight_key(query, payload)
+    loop = asyncio.get_running_loop()
+    flights = _async_stream_flights.setdefault(loop, {})
+    flight = flights.get(key)
+    if flight is not None:
+        try:
+            await asyncio.wait_for(flight.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            return
+        if flight.body:
+            yield flight.body
+        return
+
+    flight = flights[key] = _StreamFlight(asyncio.Event())
+    slots = _async_llm_slots()
+    try:
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            return
+        try:
+            async for text in _astream_llm(url, payload, headers, deadline, flight):
+                yield text
+        finally:
+            slots.release()
+        if flight.body:
+            await sync_to_async(llm_cache.set)(query, payload["model"], stream_reply(flight.body))
+    finally:
+        del flights[key]
+        flight.done.set()
+
+
+async def _astream_llm(url, payload, headers, deadline, flight):
+    timeout = _llm_timeout(deadline)
+    if timeout < MIN_LLM_TIMEOUT or not llm_breaker.allow():
+        return
+    start, parts, complete = time.monotonic(), [], False
+    try:
+        async with async_client().stream("POST", url, json=payload, headers=headers, timeout=timeout) as res:
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                text = parse_stream_line(line)
+                if text is None:
+                    complete = True
+                    break
+                if not deadline.remaining():
+                    break
+                if text:
+                    parts.append(text)
+                    yield text
+    except (GeneratorExit, asyncio.CancelledError):
+        llm_breaker.release()
+        raise
+    except Exception as exc:
+        _record(False, time.monotonic() - start, timeout, isinstance(exc, httpx.TimeoutException))
+        return
+    _finish_stream(complete, parts, start, timeout, flight)
+
+
+def _closing_events(body):
+    """Eventos finales: ficha mencionada en la respuesta, o el fallback si no hubo texto."""
+    if not body:
+        yield sse("reply", fallback_payload())
+    else:
+        match = resolve_llm({"name": "", "body": body})
+        if match and "kind" in match:
+            yield sse("match", match)
+    yield sse("done", {})
+
+
+def stream_events(query):
+    """
+    Eventos SSE del chatbot: `match` con la ficha local si la hay (al instante),
+    si no `token` por cada fragmento del LLM y, al final, `match` o `reply` y `done`.
+    """
+    deadline = Deadline(LATENCY_BUDGET)
+    payload = resolve_local(query)
+    if payload is not None:
+        yield sse("match", payload)
+        yield sse("done", {})
+        return
+    yield SSE_OPEN
+    parts = []
+    for text in stream_gpt_reply(query, deadline):
+        parts.append(text)
+        yield sse("token", {"text": text})
+    yield from _closing_events("".join(parts).strip())
+
+
+async def astream_events(query):
+    """Versión asíncrona de `stream_events` para ASGI."""
+    deadline = Deadline(LATENCY_BUDGET)
+    payload = await sync_to_async(resolve_local)(query)
+    if payload is not None:
+        yield sse("match", payload)
+        yield sse("done", {})
+        return
+    yield SSE_OPEN
+    parts = []
+    async for text in astream_gpt_reply(query, deadline):
+        parts.append(text)
+        yield sse("token", {"text": text})
+    closing = await sync_to_async(lambda: list(_closing_events("".join(parts).strip())))()
+    for event in closing:
+        yield event
@@ -0,0 +1,74 @@
+"""
+Contadores desnormalizados del catálogo.
+
+Cada contador vive en una columna del modelo destino y se recalcula con un
+único UPDATE correlacionado para los ids afectados:
+
+- Species.character_count  → personajes con esa especie.
+- Planet.resident_count    → personajes con ese planeta natal.
+- Affiliation.member_count → vínculos CharacterAffiliation.
+- Media.cast_size          → apariciones (Appearance).
+
+`core.signals` los mantiene al día en cada escritura y `load_data` llama a
+`recompute_all_counters()` al terminar.
+"""
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import bump_table_versions
+from .models import Affiliation, Appearance, Character, CharacterAffiliation, Media, Planet, Species
+
+# (modelo destino, columna contador, modelo origen, FK del origen al destino)
+COUNTERS = (
+    (Species, "character_count", Character, "species"),
+    (Planet, "resident_count", Character, "homeworld"),
+    (Affiliation, "member_count", CharacterAffiliation, "affiliation"),
+    (Media, "cast_size", Appearance, "media"),
+)
+
+# FKs de cada modelo origen que alimentan algún contador.
+TRACKED_FIELDS = {}
+for _target, _field, _source, _fk in COUNTERS:
+    TRACKED_FIELDS.setdefault(_source, []).append((_fk, _target))
+
+
+def count_subquery(source, fk):
+    return Coalesce(
+        Subquery(
+            source.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(total=Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def refresh_counters(target, pks=None):
+    """Recalcula los contadores de `target` (solo para `pks` si se indican)."""
+    if pks is not None:
+        pks = {pk for pk in pks if pk is not None}
+        if not pks:
+            return
+    for model, field, source, fk in COUNTERS:
+        if model is not target:
+            continue
+        queryset = target.objects.all() if pks is None else target.objects.filter(pk__in=pks)
+        queryset.update(**{field: count_subquery(source, fk)})
+    # QuerySet.update no emite señales: invalidamos a mano las cachés de la tabla.
+    bump_table_versions(target._meta.db_table)
+
+
+def recompute_all_counters():
+    for target in {model for model, *_ in COUNTERS}:
+        refresh_counters(target)
+
+
+def tracked_values(instance) -> dict:
+    """{modelo destino: id} para las FKs con contador de una instancia origen."""
+    return {
+        target: getattr(instance, f"{fk}_id")
+        for fk, target in TRACKED_FIELDS.get(type(instance), [])
+    }
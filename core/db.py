@@ -0,0 +1,48 @@
+"""
+Ajustes de SQLite para producción (`DJANGO_DB_PROFILE=production`).
+
+`apply_sqlite_pragmas` se conecta a `connection_created` (ver `core.signals`) y
+lanza los `SQLITE_PRAGMAS` de `settings.py` en cada conexión nueva:
+
+- `journal_mode=WAL`: los lectores no esperan a `load_data` ni a los envíos del
+  formulario de planetas, y una escritura no espera a las lecturas en curso.
+  Queda guardado en el fichero; para volver al modo clásico hay que ejecutar
+  `PRAGMA journal_mode=DELETE` a mano.
+- `synchronous=NORMAL`: con WAL solo se pierde, en un corte de luz, la última
+  transacción; el fichero nunca se corrompe.
+- `mmap_size`, `cache_size` y `temp_store=MEMORY`: lecturas desde la memoria del
+  sistema, más páginas en caché por conexión y ordenaciones temporales en RAM.
+- `busy_timeout`: cuánto espera una escritura al cerrojo antes de "database is
+  locked" (que `DatabaseLockMiddleware` convierte en un 503).
+
+Con el perfil por defecto `SQLITE_PRAGMAS` está vacío y no se toca nada, salvo
+`query_only` en las conexiones de solo lectura (`mode=ro`, ver `core.routers`).
+"""
+
+from django.conf import settings
+from django.db import connection
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = dict(getattr(settings, "SQLITE_PRAGMAS", {}))
+    if "mode=ro" in str(connection.settings_dict["NAME"]):
+        # Réplica de solo lectura (core.routers): el journal lo decide la primaria.
+        pragmas.pop("journal_mode", None)
+        pragmas["query_only"] = "ON"
+    # Directamente sobre sqlite3: no cuentan en el presupuesto de consultas de core.perf.
+    for name, value in pragmas.items():
+        connection.connection.execute(f"PRAGMA {name} = {value}")
+
+
+def current_pragmas(conn=None, names=None):
+    """Valores efectivos de los PRAGMAs en `conn` (por defecto, los de SQLITE_PRAGMAS)."""
+    conn = conn or connection
+    names = names or list(getattr(settings, "SQLITE_PRAGMAS", {})) or ["journal_mode", "synchronous", "busy_timeout"]
+    values = {}
+    with conn.cursor() as cursor:
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            values[name] = cursor.fetchone()[0]
+    return values
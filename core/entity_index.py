@@ -0,0 +1,208 @@
+"""
+Índice en memoria de nombres de entidades para el chatbot.
+
+Reúne nombres de personajes, especies, planetas natales y películas en un
+autómata Aho-Corasick, de modo que cualquier mención dentro de un texto libre
+se encuentra en una sola pasada. Además guarda "tarjetas" precalculadas con
+todo lo que devuelve el chatbot, así que una coincidencia no necesita ninguna
+consulta a la base de datos. Se reconstruye al cambiar los datos (ver
+`core.cache.TableSnapshot`).
+"""
+
+import unicodedata
+from collections import deque
+
+from .cache import TableSnapshot
+from .models import Appearance, Character, Media, Planet, Species
+
+MIN_PATTERN_LENGTH = 3
+POSTER_POOL = [f"img/{i}.jpg" for i in range(1, 8)]
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sin tildes y con cualquier signo convertido en un espacio."""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    cleaned = "".join(ch if ch.isalnum() else " " for ch in stripped.casefold())
+    return " ".join(cleaned.split())
+
+
+class AhoCorasick:
+    """Autómata clásico: transiciones en dicts, enlaces de fallo y salidas por nodo."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.lengths = []
+        for pattern_id, pattern in enumerate(patterns):
+            self._add(pattern, pattern_id)
+            self.lengths.append(len(pattern))
+        self._link()
+
+    def _add(self, pattern, pattern_id):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+        self.output[node].append(pattern_id)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def iter_matches(self, text):
+        """Genera (inicio, fin, pattern_id) para cada aparición, solapadas incluidas."""
+        node = 0
+        for index, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for pattern_id in self.output[node]:
+                yield index + 1 - self.lengths[pattern_id], index + 1, pattern_id
+
+
+class _IndexData:
+    """Contenido de una versión concreta del índice."""
+
+    def __init__(self):
+        self.character_cards = {}
+        self.media_cards = {}
+        # Tuplas con id y nombres normalizados, en el orden en que el chatbot las prueba.
+        self.characters = []
+        self.films = []
+        # Para cada patrón: (tipo, prioridad, id de la tarjeta a devolver).
+        self.patterns = []
+        self.automaton = None
+
+
+class EntityIndex(TableSnapshot):
+    models = (Character, Species, Planet, Media, Appearance)
+
+    def build(self):
+        data = _IndexData()
+
+        first_film = {}
+        appearances = (
+            Appearance.objects.filter(media__media_type=Media.FILM)
+            .order_by("media__episode", "media__release_date")
+            .values_list("character_id", "media__title")
+        )
+        for character_id, title in appearances:
+            first_film.setdefault(character_id, title)
+
+        characters = Character.objects.select_related("species", "homeworld").order_by("name")
+        for character in characters:
+            species = getattr(character.species, "name", None)
+            homeworld = getattr(character.homeworld, "name", None)
+            data.character_cards[character.id] = {
+                "kind": "character",
+                "id": character.id,
+                "name": character.name,
+                "species": species or "Desconocida",
+                "homeworld": homeworld or "Desconocido",
+                "cybernetics": character.cybernetics or "",
+                "film": first_film.get(character.id, "Sin película registrada"),
+                "image": character.image_url or "",
+            }
+            data.characters.append(
+                (character.id, normalize(character.name), normalize(species), normalize(homeworld))
+            )
+
+        films = Media.objects.filter(media_type=Media.FILM).order_by("episode", "release_date", "title")
+        for film in films:
+            data.media_cards[film.id] = {
+                "kind": "media",
+                "id": film.id,
+                "name": film.title,
+                "release_year": film.release_date.year if film.release_date else None,
+                "episode": film.episode,
+                "poster": POSTER_POOL[(film.id - 1) % len(POSTER_POOL)],
+            }
+            data.films.append((film.id, normalize(film.title)))
+
+        # Patrones para menciones. Un nombre de especie o planeta apunta al primer
+        # personaje (por nombre) que la tiene, igual que la búsqueda original.
+        pattern_texts = []
+        seen = set()
+
+        def add_pattern(text, kind, priority, target_id):
+            if len(text) < MIN_PATTERN_LENGTH or (text, kind, priority) in seen:
+                return
+            seen.add((text, kind, priority))
+            # Los espacios alrededor obligan a que coincidan palabras completas.
+            pattern_texts.append(f" {text} ")
+            data.patterns.append((kind, priority, target_id))
+
+        for character_id, name, species, homeworld in data.characters:
+            add_pattern(name, "character", 0, character_id)
+            add_pattern(species, "character", 1, character_id)
+            add_pattern(homeworld, "character", 1, character_id)
+        for film_id, title in data.films:
+            add_pattern(title, "media", 0, film_id)
+
+        data.automaton = AhoCorasick(pattern_texts)
+        return data
+
+    # Búsquedas -------------------------------------------------------------
+    def find_character(self, text):
+        """Tarjeta del personaje cuyo nombre, especie o planeta contiene `text` o aparece en él."""
+        return self._find(text, "character")
+
+    def find_media(self, text):
+        """Tarjeta de la película cuyo título contiene `text` o aparece en él."""
+        return self._find(text, "media")
+
+    def character_card(self, character_id):
+        return self.get().character_cards.get(character_id)
+
+    def media_card(self, media_id):
+        return self.get().media_cards.get(media_id)
+
+    def _find(self, text, kind):
+        needle = normalize(text)
+        if not needle:
+            return None
+        data = self.get()
+        cards = data.character_cards if kind == "character" else data.media_cards
+
+        # 1) Consulta corta contenida en un nombre ("luke" → "Luke Skywalker").
+        if kind == "character":
+            for character_id, name, species, homeworld in data.characters:
+                if needle in name or needle in species or needle in homeworld:
+                    return cards[character_id]
+        else:
+            for film_id, title in data.films:
+                if needle in title:
+                    return cards[film_id]
+
+        # 2) Nombre mencionado dentro de un texto libre, en una sola pasada.
+        best = None
+        for start, end, pattern_id in data.automaton.iter_matches(f" {needle} "):
+            match_kind, priority, target_id = data.patterns[pattern_id]
+            if match_kind != kind:
+                continue
+            # Primero nombres propios, luego el más largo y luego el más temprano.
+            rank = (priority, -(end - start), start)
+            if best is None or rank < best[0]:
+                best = (rank, target_id)
+        return cards[best[1]] if best else None
+
+
+entity_index = EntityIndex()
@@ -0,0 +1,177 @@
+"""
+Servidor falso de la API de OpenAI para pruebas y benchmarks del chatbot.
+
+Responde a `POST /v1/chat/completions` con el mismo formato que la API real
+(también en streaming, `stream: true`) tras un retardo configurable, sin dependencias externas (asyncio puro). Se
+usa apuntando `OPENAI_BASE_URL` a él:
+
+    python -m core.fake_openai --port 8765 --delay 0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python manage.py runserver
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+
+
+def reply_text(query):
+    return f"Respuesta simulada para: {query}"
+
+
+def completion(query):
+    """Respuesta con el formato de la API: el contenido es un JSON {name, body}."""
+    content = json.dumps({"name": "", "body": reply_text(query)})
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion",
+        "model": "fake",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+    }
+
+
+class FakeOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, delay=0.5, token_delay=0.02):
+        self.host = host
+        self.port = port
+        self.delay = delay
+        self.token_delay = token_delay
+        self.requests = 0
+        self._server = None
+        self._handlers = {}
+        self._closing = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._closing = asyncio.Event()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, backlog=4096)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        self._server.close()
+        self._closing.set()
+        # Cerrar los sockets abiertos deja que cada handler termine solo.
+        for writer in list(self._handlers.values()):
+            writer.close()
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=2)
+        await self._server.wait_closed()
+
+    async def _pause(self, seconds):
+        # Como asyncio.sleep, pero se interrumpe al cerrar el servidor.
+        try:
+            await asyncio.wait_for(self._closing.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        self._handlers[asyncio.current_task()] = writer
+        try:
+            # Conexiones keep-alive: varias peticiones por socket.
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    self.requests += 1
+                    request = json.loads(body or b"{}")
+                    messages = request.get("messages", [])
+                    query = messages[-1]["content"] if messages else ""
+                    if request.get("stream"):
+                        await self._stream(writer, query)
+                        break
+                    await self._pause(self.delay)
+                    status, payload = "200 OK", completion(query)
+                else:
+                    status, payload = "404 Not Found", {"error": {"message": "not found"}}
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\nConnection: keep-alive\r\n\r\n".encode()
+                    + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._handlers.pop(asyncio.current_task(), None)
+            writer.close()
+
+
+    async def _stream(self, writer, query):
+        """Respuesta `stream: true`: `delay` hasta el primer token y luego una palabra cada `token_delay`."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+        await self._pause(self.delay)
+        words = reply_text(query).split(" ")
+        for index, word in enumerate(words):
+            chunk = {"choices": [{"index": 0, "delta": {"content": word if index == 0 else f" {word}"}}]}
+            writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await writer.drain()
+            await self._pause(self.token_delay)
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+
+def run_in_thread(delay=0.5, host="127.0.0.1", port=0):
+    """Arranca el servidor en un hilo daemon y devuelve (servidor, función para pararlo)."""
+    server = FakeOpenAIServer(host=host, port=port, delay=delay)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def target():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start())
+        ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=target, name="fake-openai", daemon=True)
+    thread.start()
+    ready.wait()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(server.close(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+    return server, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor falso de OpenAI para benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.5, help="Segundos de latencia simulada por respuesta.")
+    args = parser.parse_args()
+    server = FakeOpenAIServer(args.host, args.port, args.delay)
+    print(f"Fake OpenAI en {server.base_url} (retardo {args.delay}s)")
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Búsqueda aproximada por trigramas sobre nombres de entidades.
+
+Tolera erratas y variantes de escritura ("skywaker", "Obi Wan", "Jar-Jar"):
+cada nombre y sus alias se descomponen en trigramas, un índice invertido
+trigrama → alias da los candidatos y se ordenan por coeficiente de Dice. Se
+construye a partir de `core.entity_index`, así que se refresca con él.
+"""
+
+from collections import defaultdict
+from typing import NamedTuple
+
+from .cache import TableSnapshot
+from .entity_index import EntityIndex, entity_index, normalize
+
+DEFAULT_THRESHOLD = 0.5
+MIN_TERM_LENGTH = 4
+
+
+class FuzzyMatch(NamedTuple):
+    kind: str  # character, species, planet o media
+    id: int  # id de la entidad (para species/planet, su nombre normalizado)
+    name: str
+    score: float
+    card: tuple  # ("character" | "media", id) con la tarjeta que mostraría el chatbot
+
+
+def trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def aliases(name: str) -> set:
+    """Variantes normalizadas de un nombre: completo, sin espacios y palabras sueltas."""
+    normalized = normalize(name)
+    if not normalized:
+        return set()
+    variants = {normalized, normalized.replace(" ", "")}
+    words = normalized.split()
+    variants.update(word for word in words if len(word) >= MIN_TERM_LENGTH)
+    if len(words) > 2:
+        variants.add(" ".join(words[:2]))
+    return variants
+
+
+class _FuzzyData:
+    def __init__(self):
+        self.entries = []  # (kind, id, nombre visible, tarjeta)
+        self.alias_entry = []  # alias → posición en entries
+        self.alias_grams = []
+        self.postings = defaultdict(list)
+
+
+class FuzzyIndex(TableSnapshot):
+    models = EntityIndex.models
+
+    def build(self):
+        source = entity_index.get()
+        data = _FuzzyData()
+
+        def add(kind, pk, name, card):
+            position = len(data.entries)
+            data.entries.append((kind, pk, name, card))
+            for alias in aliases(name):
+                alias_id = len(data.alias_entry)
+                grams = trigrams(alias)
+                data.alias_entry.append(position)
+                data.alias_grams.append(len(grams))
+                for gram in grams:
+                    data.postings[gram].append(alias_id)
+
+        seen_groups = set()
+        for character_id, _, species, homeworld in source.characters:
+            card = source.character_cards[character_id]
+            add("character", character_id, card["name"], ("character", character_id))
+            # Especie y planeta llevan a su primer personaje, como la búsqueda exacta.
+            for kind, value, label in (
+                ("species", species, card["species"]),
+                ("planet", homeworld, card["homeworld"]),
+            ):
+                if value and (kind, value) not in seen_groups:
+                    seen_groups.add((kind, value))
+                    add(kind, value, label, ("character", character_id))
+        for film_id, _ in source.films:
+            add("media", film_id, source.media_cards[film_id]["name"], ("media", film_id))
+        return data
+
+    def search(self, text, kinds=None, limit=5, threshold=DEFAULT_THRESHOLD):
+        """Devuelve hasta `limit` FuzzyMatch con puntuación >= `threshold`, de mejor a peor."""
+        normalized = normalize(text)
+        if not normalized:
+            return []
+        data = self.get()
+
+        # Se prueba la consulta entera y cada palabra o pareja de palabras,
+        # para que una errata dentro de una frase también encuentre el nombre.
+        words = normalized.split()
+        terms = {normalized, normalized.replace(" ", "")}
+        terms.update(word for word in words if len(word) >= MIN_TERM_LENGTH)
+        terms.update(" ".join(pair) for pair in zip(words, words[1:]))
+
+        # Por entidad: mejor puntuación de cada término. Se ordena por la mejor y,
+        # a igualdad ("darth" encaja igual en Maul y en Vader), por la suma.
+        per_term = defaultdict(dict)
+        for term in terms:
+            grams = trigrams(term)
+            shared = defaultdict(int)
+            for gram in grams:
+                for alias_id in data.postings.get(gram, ()):
+                    shared[alias_id] += 1
+            for alias_id, count in shared.items():
+                score = 2 * count / (len(grams) + data.alias_grams[alias_id])
+                scores = per_term[data.alias_entry[alias_id]]
+                if score > scores.get(term, 0):
+                    scores[term] = score
+
+        ranked = []
+        for position, scores in per_term.items():
+            kind, pk, name, card = data.entries[position]
+            best = max(scores.values())
+            if best >= threshold and (kinds is None or kind in kinds):
+                ranked.append((-best, -sum(scores.values()), name, FuzzyMatch(kind, pk, name, round(best, 3), card)))
+        ranked.sort(key=lambda item: item[:3])
+        return [item[3] for item in ranked[:limit]]
+
+
+fuzzy_index = FuzzyIndex()
@@ -0,0 +1,202 @@
+"""
+Cola de escritura de `PlanetInquiry` (formulario de la lista de planetas).
+
+La vista valida el formulario y `enqueue()` añade la consulta aceptada como una
+línea JSON a `INQUIRY_QUEUE_DIR/queue.jsonl`, con `flock` y `fsync` (sobrevive
+a un reinicio) y sin pedir el cerrojo de escritura de SQLite. Un hilo de cada
+proceso web (cada `INQUIRY_FLUSH_INTERVAL` segundos) o `manage.py
+flush_inquiries` vacía la cola: renombra el fichero a `batch-*.jsonl`, lo
+inserta con `bulk_create` en lotes y lo borra. Solo un proceso vacía a la vez
+(`flush.lock`).
+
+Cada línea lleva un `intake_id` único: si el proceso muere tras insertar y antes
+de borrar el lote, el siguiente vaciado no duplica filas.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .cache import bump_model_versions
+from .metrics import metrics_registry
+from .models import Planet, PlanetInquiry
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin flock; basta para un único proceso de desarrollo.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+QUEUE_NAME = "queue.jsonl"
+BATCH_SIZE = 500
+FIELDS = ("name", "email", "affiliation", "message")
+
+_flusher_lock = threading.Lock()
+_flusher_pid = None
+
+
+def queue_dir() -> Path:
+    return Path(settings.INQUIRY_QUEUE_DIR)
+
+
+@contextmanager
+def _locked(handle, blocking=True):
+    """flock exclusivo sobre `handle`; devuelve False si `blocking=False` y está ocupado."""
+    if fcntl is None:
+        yield True
+        return
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def enqueue(cleaned_data):
+    """Añade a la cola una consulta ya validada (`form.cleaned_data`); devuelve su `intake_id`."""
+    planet = cleaned_data.get("planet")
+    entry = {
+        "intake_id": uuid.uuid4().hex,
+        "created_at": timezone.now().isoformat(),
+        "planet_id": planet.pk if planet else None,
+        **{field: cleaned_data.get(field) for field in FIELDS},
+    }
+    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode()
+    directory = queue_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / QUEUE_NAME
+    while True:
+        with open(path, "ab") as handle, _locked(handle):
+            # El vaciado pudo renombrar el fichero entre el open y el flock: a por el nuevo.
+            if fcntl is not None and os.fstat(handle.fileno()).st_ino != _inode(path):
+                continue
+            handle.write(line)
+            handle.flush()
+            os.fsync(handle.fileno())
+        break
+    metrics_registry.inc("inquiries_total", stage="queued")
+    _ensure_flusher()
+    return entry["intake_id"]
+
+
+def pending():
+    """Consultas en cola que aún no están en la base de datos."""
+    count = 0
+    for path in queue_dir().glob("*.jsonl"):
+        with open(path, "rb") as handle:
+            count += sum(1 for _ in handle)
+    return count
+
+
+def flush(batch_size=BATCH_SIZE):
+    """Pasa la cola a la base de datos; devuelve las filas insertadas (None si otro proceso está en ello)."""
+    directory = queue_dir()
+    if not directory.exists():
+        return 0
+    with open(directory / "flush.lock", "a") as lock, _locked(lock, blocking=False) as acquired:
+        if not acquired:
+            return None
+        path = directory / QUEUE_NAME
+        if path.exists() and path.stat().st_size:
+            with open(path, "ab") as handle, _locked(handle):
+                os.replace(path, directory / f"batch-{time.time_ns()}.jsonl")
+        inserted = 0
+        # Los lotes que dejó a medias un vaciado anterior van primero.
+        for batch_path in sorted(directory.glob("batch-*.jsonl")):
+            inserted += _insert(_read(batch_path), batch_size)
+            batch_path.unlink()
+    if inserted:
+        bump_model_versions(PlanetInquiry)
+        metrics_registry.inc("inquiries_total", inserted, stage="flushed")
+    return inserted
+
+
+def _read(path):
+    entries = []
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Solo puede pasar con la última línea de un corte a mitad de escritura.
+                logger.warning("Línea %s de %s ilegible, se descarta", number, path.name)
+    return entries
+
+
+def _insert(entries, batch_size):
+    inserted = 0
+    for start in range(0, len(entries), batch_size):
+        chunk = entries[start:start + batch_size]
+        ids = [uuid.UUID(entry["intake_id"]) for entry in chunk]
+        planet_ids = {entry["planet_id"] for entry in chunk if entry["planet_id"]}
+        with transaction.atomic():
+            seen = set(PlanetInquiry.objects.filter(intake_id__in=ids).values_list("intake_id", flat=True))
+            # Planetas borrados mientras la consulta esperaba: como on_delete=SET_NULL.
+            planets = set(Planet.objects.filter(pk__in=planet_ids).values_list("pk", flat=True))
+            rows = [
+                PlanetInquiry(
+                    intake_id=intake_id,
+                    created_at=parse_datetime(entry["created_at"]),
+                    planet_id=entry["planet_id"] if entry["planet_id"] in planets else None,
+                    **{field: entry.get(field) for field in FIELDS},
+                )
+                for intake_id, entry in zip(ids, chunk)
+                if intake_id not in seen
+            ]
+            PlanetInquiry.objects.bulk_create(rows, ignore_conflicts=True)
+        inserted += len(rows)
+    return inserted
+
+
+# ---------------------------------------------------------------------------
+# Hilo de vaciado de cada proceso
+# ---------------------------------------------------------------------------
+def _ensure_flusher():
+    global _flusher_pid
+    interval = getattr(settings, "INQUIRY_FLUSH_INTERVAL", 2.0)
+    if not interval or _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        threading.Thread(target=_run_flusher, args=(interval,), name="inquiry-flusher", daemon=True).start()
+        atexit.register(_flush_quietly)
+        _flusher_pid = os.getpid()
+
+
+def _flush_quietly():
+    try:
+        flush()
+    except Exception:
+        logger.exception("No se pudo vaciar la cola de consultas de planetas")
+    finally:
+        close_old_connections()
+
+
+def _run_flusher(interval):
+    while True:
+        time.sleep(interval)
+        _flush_quietly()
@@ -0,0 +1,156 @@
+"""
+Caché persistente de respuestas del LLM del chatbot.
+
+Las preguntas repetidas ("who is Yoda", "¿quién es yoda?") no vuelven a
+llamar a OpenAI: la clave es la consulta normalizada (sin tildes, mayúsculas
+ni palabras vacías en español o inglés) más el modelo. Se conservan el orden
+de los términos y las negaciones: "is vader luke's father" y "is luke vader's
+father" no son la misma pregunta. Las respuestas se guardan en un SQLite en disco (`LLM_CACHE_PATH`),
+así que sobreviven a reinicios, con caducidad (`LLM_CACHE_TTL`) y expulsión
+LRU al superar `LLM_CACHE_MAX_ENTRIES`. Los contadores están en
+`core.cache.get_cache_stats("llm")`.
+
+Si al guardarla la respuesta nombraba una entidad del catálogo, al leerla se
+comprueba que sigue en el índice de entidades: si el personaje se renombró o
+borró, la entrada se descarta y se vuelve a preguntar.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .cache import get_cache_stats
+from .entity_index import entity_index, normalize
+
+# Sin negaciones ("no", "not", "sin"...): cambian el sentido de la pregunta.
+STOPWORDS = frozenset(
+    # español
+    "a al algo como con cual cuales cuando de del dime donde el en es esta este esto fue ha hay la las le lo los "
+    "me mi muy o para pero por que quien quienes se sabes sobre son su sus te tu un una uno y ya era eres "
+    "habla hablame cuentame info informacion "
+    # inglés
+    "about an and are can did do does for from he her his how i in is it me of on or she tell that the their "
+    "them they this to was what when where which who whom why with you your know"
+    .split()
+)
+
+
+def normalize_query(text: str) -> str:
+    """Forma canónica de una pregunta: términos significativos en su orden y sin repetir."""
+    terms = [word for word in normalize(text).split() if word not in STOPWORDS]
+    return " ".join(dict.fromkeys(terms))
+
+
+class LLMReplyCache:
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        self._path = path
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_key = None
+        self.stats = get_cache_stats("llm", stale_served=False)
+
+    # Los ajustes se leen en cada uso para respetar override_settings en tests.
+    @property
+    def path(self):
+        return str(self._path or settings.LLM_CACHE_PATH)
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else settings.LLM_CACHE_TTL
+
+    @property
+    def max_entries(self):
+        return self._max_entries if self._max_entries is not None else settings.LLM_CACHE_MAX_ENTRIES
+
+    def _connection(self):
+        # Una conexión por proceso (tras un fork se abre otra) protegida por el lock.
+        key = (os.getpid(), self.path)
+        if self._conn is None or self._conn_key != key:
+            if key[1] != ":memory:":
+                Path(key[1]).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(key[1], timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS replies ("
+                " key TEXT PRIMARY KEY, reply TEXT NOT NULL, linked INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS replies_accessed ON replies (accessed_at)")
+            self._conn, self._conn_key = conn, key
+        return self._conn
+
+    @staticmethod
+    def make_key(query, model):
+        normalized = normalize_query(query)
+        return f"{model}:{normalized}" if normalized else None
+
+    def get(self, query, model):
+        """Respuesta {name, body} guardada, o None (caducada, inexistente o ya no válida)."""
+        if not self.ttl:
+            return None
+        key = self.make_key(query, model)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT reply, linked, created_at FROM replies WHERE key = ?", (key,)
+            ).fetchone()
+        reply, outcome = None, "misses"
+        if row and time.time() - row[2] <= self.ttl:
+            reply, outcome = json.loads(row[0]), "hits"
+            # El índice puede reconstruirse desde la BD: fuera del lock.
+            if row[1] and not self.links_entity(reply):
+                reply, outcome = None, "stale"
+
+        with self._lock:
+            if reply is not None:
+                self._connection().execute("UPDATE replies SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            elif row:
+                self._connection().execute("DELETE FROM replies WHERE key = ?", (key,))
+        self.stats.incr(outcome)
+        return reply
+
+    def set(self, query, model, reply):
+        if not self.ttl or not isinstance(reply, dict):
+            return
+        key = self.make_key(query, model)
+        if key is None:
+            return
+        linked = self.links_entity(reply)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO replies (key, reply, linked, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(reply, ensure_ascii=False), linked, now, now),
+            )
+            excess = conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM replies WHERE key IN (SELECT key FROM replies ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                )
+                self.stats.incr("evictions", excess)
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM replies")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+
+    @staticmethod
+    def links_entity(reply):
+        name = reply.get("name")
+        return bool(name and (entity_index.find_character(name) or entity_index.find_media(name)))
+
+
+llm_cache = LLMReplyCache()
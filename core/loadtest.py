@@ -0,0 +1,246 @@
+"""
+Prueba de carga concurrente contra un servidor en marcha (comando `loadtest`).
+
+Cada usuario virtual es una corrutina que, hasta agotar la duración, elige una
+petición de `MIX` según su peso (home, listados con filtros, fichas, búsqueda,
+autocompletado, chatbot con y sin respuesta local y formularios de planetas) y
+la manda con un `httpx.AsyncClient` compartido. Los ids y nombres salen de la
+base de datos local, que debe ser la misma que usa el servidor.
+
+`LoadStats` acumula latencias por escenario, códigos de estado, errores de red
+y los 503 de `core.middleware.DatabaseLockMiddleware` (SQLite bloqueado).
+"""
+
+import asyncio
+import math
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from typing import NamedTuple
+
+import httpx
+from django.urls import reverse
+from django.utils import translation
+
+from .middleware import LOCK_HEADER
+from .models import Affiliation, Character, Media, Planet, Species
+
+# escenario: peso relativo
+MIX = {
+    "home": 8,
+    "characters": 10,
+    "characters_filtered": 8,
+    "character_detail": 15,
+    "media": 4,
+    "media_detail": 6,
+    "species_list": 4,
+    "species_detail": 5,
+    "planets_filtered": 6,
+    "planet_detail": 6,
+    "affiliation_detail": 3,
+    "search": 6,
+    "autocomplete": 10,
+    "chatbot_local": 5,
+    # Sin respuesta local: cada una es una llamada de pago si el servidor habla
+    # con OpenAI de verdad. Solo entra con el OpenAI falso o con --allow-llm.
+    "chatbot_llm": 0,
+    "inquiry_post": 2,
+}
+LLM_WEIGHT = 2
+CLIMATES = ("arid", "temperate", "frozen", "tropical", "murky")
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+def parse_mix(text, llm=False):
+    """'home=10,inquiry_post=5' → MIX con esos pesos cambiados; `llm` activa `chatbot_llm`."""
+    mix = dict(MIX)
+    if llm:
+        mix["chatbot_llm"] = LLM_WEIGHT
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        name, _, weight = item.partition("=")
+        if name not in MIX:
+            raise ValueError(f"Escenario desconocido: {name} (disponibles: {', '.join(MIX)})")
+        mix[name] = float(weight)
+    if mix["chatbot_llm"] > 0 and not llm:
+        raise ValueError("chatbot_llm llama a OpenAI: usa --serve, --fake-openai-port o --allow-llm")
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+class Targets(NamedTuple):
+    """Ids y nombres del catálogo con los que se construyen las peticiones."""
+
+    characters: list
+    names: list
+    media: list
+    species: list
+    planets: list
+    affiliations: list
+    urls: dict  # nombre de ruta → path (sin ids) en el idioma elegido
+
+    @classmethod
+    def load(cls, language="es"):
+        characters = list(Character.objects.values_list("id", "name"))
+        if not characters:
+            raise ValueError("El catálogo está vacío: ejecuta load_data antes.")
+        names = ("home", "characters", "media", "species_list", "planets", "search", "autocomplete", "chatbot_search")
+        with translation.override(language):
+            urls = {name: reverse(name) for name in names}
+            # Fichas: plantilla con el id sustituido al construir cada petición.
+            for name in ("detalle_personaje", "media_detail", "species_detail", "planet_detail", "affiliation_detail"):
+                urls[name] = reverse(name, args=[0]).replace("/0/", "/{}/")
+        return cls(
+            characters=[pk for pk, _ in characters],
+            names=[name for _, name in characters],
+            media=list(Media.objects.values_list("id", flat=True)),
+            species=list(Species.objects.values_list("id", flat=True)),
+            planets=list(Planet.objects.values_list("id", flat=True)),
+            affiliations=list(Affiliation.objects.values_list("id", flat=True)),
+            urls=urls,
+        )
+
+
+def build_request(scenario, targets, rng):
+    """(método, path, parámetros) de una petición del escenario."""
+    urls = targets.urls
+    if scenario == "home":
+        return "GET", urls["home"], None
+    if scenario == "characters":
+        return "GET", urls["characters"], None
+    if scenario == "characters_filtered":
+        params = {"species": rng.choice(targets.species)} if targets.species else {}
+        if targets.media and rng.random() < 0.5:
+            params["media"] = rng.choice(targets.media)
+        if rng.random() < 0.3:
+            params["q"] = rng.choice(targets.names)[:4]
+        return "GET", urls["characters"], params
+    if scenario == "character_detail":
+        return "GET", urls["detalle_personaje"].format(rng.choice(targets.characters)), None
+    if scenario == "media":
+        return "GET", urls["media"], None
+    if scenario == "media_detail" and targets.media:
+        return "GET", urls["media_detail"].format(rng.choice(targets.media)), None
+    if scenario == "species_list":
+        return "GET", urls["species_list"], rng.choice([None, {"sort": "count"}])
+    if scenario == "species_detail" and targets.species:
+        return "GET", urls["species_detail"].format(rng.choice(targets.species)), None
+    if scenario == "planets_filtered":
+        return "GET", urls["planets"], {"climate": rng.choice(CLIMATES)}
+    if scenario == "planet_detail" and targets.planets:
+        return "GET", urls["planet_detail"].format(rng.choice(targets.planets)), None
+    if scenario == "affiliation_detail" and targets.affiliations:
+        return "GET", urls["affiliation_detail"].format(rng.choice(targets.affiliations)), None
+    if scenario == "search":
+        return "GET", urls["search"], {"q": rng.choice(targets.names).split()[0]}
+    if scenario == "autocomplete":
+        name = rng.choice(targets.names)
+        return "GET", urls["autocomplete"], {"q": name[: rng.randint(2, max(2, min(6, len(name))))]}
+    if scenario == "chatbot_local":
+        return "GET", urls["chatbot_search"], {"q": f"quién es {rng.choice(targets.names)}"}
+    if scenario == "chatbot_llm":
+        # Pregunta única en cada petición: no la sirve la caché de respuestas del LLM.
+        return "GET", urls["chatbot_search"], {"q": f"pregunta {rng.getrandbits(40):x} sobre el universo"}
+    if scenario == "inquiry_post":
+        return "POST", urls["planets"], {
+            "name": "Carga",
+            "email": "loadtest@example.com",
+            "planet": rng.choice(targets.planets) if targets.planets else "",
+            "message": "Mensaje de la prueba de carga.",
+        }
+    return "GET", urls["home"], None
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()  # excepciones de red o timeouts del cliente
+        self.lock_timeouts = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, scenario, elapsed, response=None, error=None):
+        self.latencies[scenario].append(elapsed)
+        if error is not None:
+            self.errors[type(error).__name__] += 1
+            return
+        self.statuses[response.status_code] += 1
+        if response.headers.get(LOCK_HEADER):
+            self.lock_timeouts += 1
+
+    @property
+    def total(self):
+        return sum(len(values) for values in self.latencies.values())
+
+    @property
+    def failed(self):
+        return sum(self.errors.values()) + sum(count for status, count in self.statuses.items() if status >= 500)
+
+    def summary(self) -> dict:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        every = [value for values in self.latencies.values() for value in values]
+        return {
+            "seconds": round(elapsed, 2),
+            "requests": self.total,
+            "throughput": round(self.total / elapsed, 1) if elapsed else 0.0,
+            "p50_ms": round(percentile(every, 0.50) * 1000, 1),
+            "p95_ms": round(percentile(every, 0.95) * 1000, 1),
+            "p99_ms": round(percentile(every, 0.99) * 1000, 1),
+            "error_rate": round(self.failed / self.total, 4) if self.total else 0.0,
+            "lock_timeouts": self.lock_timeouts,
+            "statuses": dict(sorted(self.statuses.items())),
+            "errors": dict(self.errors),
+            "scenarios": {
+                scenario: {
+                    "requests": len(values),
+                    "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                }
+                for scenario, values in sorted(self.latencies.items())
+            },
+        }
+
+
+async def _csrf_token(client, planets_url):
+    """Token CSRF de la sesión del cliente (cookie + campo del formulario de planetas)."""
+    response = await client.get(planets_url)
+    match = CSRF_INPUT_RE.search(response.text)
+    return match.group(1) if match else client.cookies.get("csrftoken", "")
+
+
+async def run_load(base_url, targets, mix, concurrency=10, duration=30.0, timeout=30.0, seed=None, transport=None):
+    """Lanza `concurrency` usuarios virtuales durante `duration` segundos; devuelve `LoadStats`."""
+    stats = LoadStats()
+    names, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits, transport=transport) as client:
+        csrf = await _csrf_token(client, targets.urls["planets"]) if "inquiry_post" in mix else ""
+
+        async def user(number):
+            rng = random.Random(None if seed is None else seed + number)
+            while time.perf_counter() < deadline:
+                scenario = rng.choices(names, weights)[0]
+                method, path, params = build_request(scenario, targets, rng)
+                start = time.perf_counter()
+                try:
+                    if method == "POST":
+                        response = await client.post(path, data={**params, "csrfmiddlewaretoken": csrf}, headers={"X-CSRFToken": csrf})
+                    else:
+                        response = await client.get(path, params=params)
+                except httpx.HTTPError as exc:
+                    stats.add(scenario, time.perf_counter() - start, error=exc)
+                    continue
+                stats.add(scenario, time.perf_counter() - start, response)
+
+        await asyncio.gather(*(user(number) for number in range(concurrency)))
+    stats.finished = time.perf_counter()
+    return stats
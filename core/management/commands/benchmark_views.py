@@ -0,0 +1,115 @@
+"""
+Benchmark de las vistas contra líneas base (ver `core.benchmark`).
+
+Crea una base de datos de pruebas aparte (la de desarrollo no se toca), la
+siembra a cada escala pedida y mide todas las rutas de `core/urls.py` en cada
+idioma. Compara con `benchmarks/views.json` y termina con error si alguna vista
+hace más consultas o su latencia empeora más del umbral; `--save` guarda el
+resultado como nueva línea base.
+"""
+
+import json
+import logging
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from core.benchmark import SCALES, compare, run_benchmark, seed_catalog
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "views.json"
+
+
+class Command(BaseCommand):
+    help = "Mide latencia p50/p95, consultas SQL y tamaño de cada vista a varias escalas y detecta regresiones."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            nargs="+",
+            choices=sorted(SCALES),
+            default=["small", "medium"],
+            help="Tamaños del catálogo sintético (por defecto small y medium).",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Peticiones medidas por escenario (por defecto 20).")
+        parser.add_argument("--languages", nargs="+", help="Idiomas a medir (por defecto todos los de LANGUAGES).")
+        parser.add_argument("--routes", nargs="+", help="Limita el benchmark a estos nombres de ruta.")
+        parser.add_argument("--warm", action="store_true", help="No vaciar la caché de páginas entre peticiones.")
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Fichero JSON de líneas base.")
+        parser.add_argument("--save", action="store_true", help="Guarda el resultado como línea base.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.5,
+            help="Empeoramiento relativo tolerado del p50 (por defecto 0.5 = +50 %%; el p95, el doble).",
+        )
+        parser.add_argument(
+            "--min-delta-ms",
+            type=float,
+            default=5.0,
+            help="Empeoramiento absoluto que se ignora siempre (por defecto 5 ms).",
+        )
+
+    def handle(self, *args, **options):
+        baseline = json.loads(options["baseline"].read_text()) if options["baseline"].exists() else {}
+        results = {}
+        # Sin líneas JSON por petición ni métricas en el /metrics real.
+        perf_logger = logging.getLogger("core.perf")
+        level = perf_logger.level
+        perf_logger.setLevel(logging.WARNING)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as metrics_dir, override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], METRICS_DIR=metrics_dir
+            ):
+                for scale in options["scales"]:
+                    results[scale] = self._run_scale(scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            perf_logger.setLevel(level)
+
+        regressions = []
+        for scale, measures in results.items():
+            for regression in compare(measures, baseline.get(scale, {}), options["threshold"], options["min_delta_ms"]):
+                regressions.append((scale, regression))
+
+        if options["save"]:
+            options["baseline"].parent.mkdir(parents=True, exist_ok=True)
+            for scale, measures in results.items():
+                baseline[scale] = {**baseline.get(scale, {}), **measures}
+            options["baseline"].write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {options['baseline']}"))
+            return
+        if not baseline:
+            self.stdout.write(self.style.WARNING(f"Sin línea base en {options['baseline']}; usa --save para crearla."))
+            return
+        if regressions:
+            lines = [
+                f"  [{scale}] {r.key} {r.metric}: {r.baseline} → {r.current}" for scale, r in regressions
+            ]
+            raise CommandError("Regresiones frente a la línea base:\n" + "\n".join(lines))
+        self.stdout.write(self.style.SUCCESS("Sin regresiones frente a la línea base."))
+
+    def _run_scale(self, scale, options):
+        characters = SCALES[scale]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Escala {scale} ({characters} personajes)"))
+        user = seed_catalog(characters)
+        self.stdout.write(f"{'escenario':<52} {'estado':>6} {'p50 ms':>8} {'p95 ms':>8} {'SQL':>5} {'bytes':>9}")
+
+        def progress(key, measures):
+            self.stdout.write(
+                f"{key:<52} {measures['status']:>6} {measures['p50_ms']:>8.2f} {measures['p95_ms']:>8.2f} "
+                f"{measures['queries']:>5} {measures['bytes']:>9}"
+            )
+
+        return run_benchmark(
+            user,
+            repeat=options["repeat"],
+            languages=options["languages"],
+            routes=options["routes"],
+            warm=options["warm"],
+            progress=progress,
+        )
@@ -0,0 +1,37 @@
+"""
+Vacía la cola de consultas de planetas en la base de datos (ver `core.inquiry_queue`).
+
+Los procesos web ya lo hacen solos cada `INQUIRY_FLUSH_INTERVAL` segundos; este
+comando sirve tras un despliegue (lo que quedó en cola sin ningún worker vivo),
+desde cron o, con `--watch`, como proceso aparte con `INQUIRY_FLUSH_INTERVAL=0`.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.inquiry_queue import BATCH_SIZE, flush, pending
+
+
+class Command(BaseCommand):
+    help = "Inserta en lote las consultas de planetas encoladas por el formulario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help=f"Filas por bulk_create (por defecto {BATCH_SIZE}).")
+        parser.add_argument("--watch", action="store_true", help="Sigue vaciando la cola hasta Ctrl+C.")
+        parser.add_argument("--interval", type=float, default=2.0, help="Con --watch: segundos entre vaciados.")
+
+    def handle(self, *args, **options):
+        while True:
+            queued = pending()
+            inserted = flush(options["batch_size"])
+            if inserted is None:
+                self.stdout.write(self.style.WARNING("Otro proceso está vaciando la cola."))
+            elif inserted or not options["watch"]:
+                self.stdout.write(self.style.SUCCESS(f"{inserted} consultas insertadas ({queued} en cola)."))
+            if not options["watch"]:
+                return
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                return
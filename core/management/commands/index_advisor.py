@@ -0,0 +1,116 @@
+"""
+Revisa los planes de ejecución de las consultas del sitio (ver `core.query_plans`).
+
+En una base de datos de pruebas aparte ejecuta `load_data` (sin SWAPI), siembra
+después el catálogo sintético de `core.benchmark` (con películas, que sin SWAPI
+no hay) y recorre todas las vistas de `core/urls.py` en cada idioma; recoge el
+SQL distinto que lanzan y pide a SQLite su `EXPLAIN QUERY PLAN`. Muestra las consultas con
+recorridos completos de tablas grandes o B-trees temporales, de más a menos
+tiempo total, con el índice compuesto que las evitaría.
+
+Además compara las consultas calientes (`HOT_QUERIES`) con su firma guardada en
+`benchmarks/query_plans.json`; `--snapshot` la regenera.
+"""
+
+import io
+import json
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import translation
+
+from core.benchmark import scenarios, seed_catalog, send_request
+from core.query_plans import SNAPSHOT_PATH, QueryCollector, advise, analyze, hot_query_signatures, plan_regressions
+from core.routes import language_codes
+
+
+class Command(BaseCommand):
+    help = "Busca recorridos completos y B-trees temporales en el SQL de las vistas y de load_data y propone índices."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-rows", type=int, default=200, help="Ignora recorridos de tablas más pequeñas (por defecto 200 filas).")
+        parser.add_argument("--limit", type=int, default=20, help="Consultas a mostrar (por defecto 20).")
+        parser.add_argument(
+            "--skip-load-data",
+            action="store_true",
+            help="No ejecuta load_data: solo se analizan las vistas (más rápido).",
+        )
+        parser.add_argument(
+            "--characters", type=int, default=2000, help="Personajes del catálogo sintético de las vistas (por defecto 2000)."
+        )
+        parser.add_argument("--snapshot", action="store_true", help="Guarda la firma de los planes de HOT_QUERIES.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("index_advisor solo sabe leer planes de SQLite.")
+        perf_logger = logging.getLogger("core.perf")
+        level = perf_logger.level
+        perf_logger.setLevel(logging.WARNING)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as metrics_dir, override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], METRICS_DIR=metrics_dir
+            ):
+                # Firmas sobre la base de datos recién migrada, igual que en los tests.
+                signatures = hot_query_signatures()
+                collector = self._collect(options)
+                analyze()
+                findings = advise(collector.queries.values(), min_rows=options["min_rows"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            perf_logger.setLevel(level)
+
+        self._report(findings, len(collector.queries), options["limit"])
+
+        if options["snapshot"]:
+            SNAPSHOT_PATH.parent.mkdir(parents=True, exist_ok=True)
+            SNAPSHOT_PATH.write_text(json.dumps(signatures, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"\nFirmas de {len(signatures)} consultas calientes en {SNAPSHOT_PATH}"))
+        elif SNAPSHOT_PATH.exists():
+            problems = plan_regressions(signatures, json.loads(SNAPSHOT_PATH.read_text()))
+            if problems:
+                lines = [f"  {label}: {', '.join(items)}" for label, items in problems.items()]
+                raise CommandError("Consultas calientes que han empeorado su plan:\n" + "\n".join(lines))
+            self.stdout.write(self.style.SUCCESS("\nLas consultas calientes mantienen sus índices."))
+
+    def _collect(self, options):
+        collector = QueryCollector()
+        if not options["skip_load_data"]:
+            self.stdout.write("Ejecutando load_data (sin SWAPI)...")
+            with collector.capture("load_data"):
+                call_command("load_data", skip_swapi=True, stdout=io.StringIO())
+        user = seed_catalog(options["characters"])
+        anonymous, staff = Client(), Client()
+        staff.force_login(user)
+        self.stdout.write("Recorriendo las vistas...")
+        for language in language_codes():
+            with translation.override(language):
+                for scenario in scenarios():
+                    with collector.capture(scenario.key(language)):
+                        send_request(staff if scenario.staff else anonymous, scenario)
+        return collector
+
+    def _report(self, findings, total, limit):
+        self.stdout.write(f"{total} consultas distintas analizadas, {len(findings)} con problemas.\n")
+        suggestions = {}
+        for finding in findings[:limit]:
+            query = finding.query
+            sources = sorted(query.sources)
+            origin = ", ".join(sources[:3]) + (f" (+{len(sources) - 3})" if len(sources) > 3 else "")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{query.total_ms:8.1f} ms  ×{query.count}  {origin}"))
+            self.stdout.write(f"  {query.sql[:300]}{'…' if len(query.sql) > 300 else ''}")
+            for problem in finding.problems:
+                self.stdout.write(self.style.WARNING(f"  ! {problem}"))
+            for suggestion in finding.suggestions:
+                self.stdout.write(self.style.SUCCESS(f"  → {suggestion}"))
+                suggestions[suggestion] = suggestions.get(suggestion, 0) + query.total_ms
+        if suggestions:
+            self.stdout.write(self.style.MIGRATE_HEADING("\nÍndices propuestos (por tiempo de las consultas afectadas):"))
+            for suggestion, ms in sorted(suggestions.items(), key=lambda item: -item[1]):
+                self.stdout.write(f"  {ms:8.1f} ms  {suggestion}")
@@ -14,13 +14,21 @@ import csv
 import json
 import os
 import re
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
 import requests
+from django.core.management import call_command
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 
+from core.cache import bump_model_versions, cache_is_process_local
+from core.counters import recompute_all_counters
+from core.metrics import metrics_registry
+from core.query_plans import analyze
+from core.search import pause_indexing, rebuild_index
 from core.models import (
     Affiliation,
     Appearance,
@@ -38,6 +46,19 @@ from core.models import (
 SWAPI_ROOT = "https://swapi.py4e.com/api"
 UNKNOWN_TOKENS = {"unknown", "various", "n/a", "none", "—", "-", "", "0"}
 SPECIES_SPLIT_RE = re.compile(r"[;/,&]| and | y ", flags=re.IGNORECASE)
+CATALOG_MODELS = (
+    Affiliation,
+    Appearance,
+    Character,
+    CharacterAffiliation,
+    Media,
+    Planet,
+    PlanetSpecies,
+    Region,
+    Sector,
+    Species,
+    StarSystem,
+)
 
 
 class Command(BaseCommand):
@@ -62,8 +83,18 @@ class Command(BaseCommand):
             "--skip-swapi",
             action="store_true",
             help="Omitir la descarga y el enriquecimiento desde SWAPI.",
-    )
+        )
+        parser.add_argument(
+            "--warm-cache",
+            action="store_true",
+            help="Al terminar, precalentar la caché de páginas (ver comando warm_cache).",
+        )
+        parser.add_argument(
+            "--warm-base-url",
+            help="Con --warm-cache: servidor en marcha a precalentar (el --base-url de warm_cache).",
+        )
 
+    @pause_indexing()
     def handle(self, *args, **options):
         self._swapi_cache = {}
         self._planet_data_cache = {}
@@ -72,7 +103,8 @@ class Command(BaseCommand):
 
         if not options.get("skip_akabab"):
             self.stdout.write("1) Cargando dataset local de akabab...")
-            stats = self._load_akabab_dataset(Path("data/all.json"))
+            with self._stage("akabab"):
+                stats = self._load_akabab_dataset(Path("data/all.json"))
             self.stdout.write(
                 self.style.SUCCESS(
                     "   ✔ Species +{species_created}, Planets +{planets_created}, "
@@ -87,7 +119,8 @@ class Command(BaseCommand):
 
         if not options.get("skip_planets"):
             self.stdout.write("2) Importando catálogo extendido de planetas...")
-            stats = self._load_planets_catalog(Path("data/sw_planets.csv"))
+            with self._stage("planets"):
+                stats = self._load_planets_catalog(Path("data/sw_planets.csv"))
             self.stdout.write(
                 self.style.SUCCESS(
                     "   ✔ Regions +{regions_created}, Sectors +{sectors_created}, Systems +{systems_created} | "
@@ -101,7 +134,8 @@ class Command(BaseCommand):
         if not options.get("skip_swapi") and load_swapi_enabled:
             self.stdout.write("3) Enriqueciendo con films y personajes de SWAPI...")
             try:
-                stats = self._enrich_from_swapi()
+                with self._stage("swapi"):
+                    stats = self._enrich_from_swapi()
                 self.stdout.write(
                     self.style.SUCCESS(
                         "   ✔ Media films creados {media_created}, actualizados {media_updated} | "
@@ -125,6 +159,47 @@ class Command(BaseCommand):
                 "3) Enriquecimiento SWAPI omitido (flag --skip-swapi o LOAD_SWAPI_ENABLED=false)."
             )
 
+        # Algunas actualizaciones masivas (QuerySet.update) no emiten señales:
+        # recalculamos los contadores y el índice de búsqueda e invalidamos de
+        # golpe todo lo cacheado.
+        with self._stage("counters"):
+            recompute_all_counters()
+        with self._stage("search_index"):
+            rebuild_index()
+        # Estadísticas frescas para que el planificador elija bien los índices.
+        with self._stage("analyze"):
+            analyze()
+        bump_model_versions(*CATALOG_MODELS)
+
+        if options.get("warm_cache"):
+            self._warm_cache(options.get("warm_base_url"))
+        metrics_registry.flush()
+
+    def _warm_cache(self, base_url):
+        if base_url:
+            self.stdout.write(f"4) Precalentando la caché de páginas de {base_url}...")
+            with self._stage("warm_cache"):
+                call_command("warm_cache", "--base-url", base_url, stdout=self.stdout, stderr=self.stderr)
+        elif cache_is_process_local():
+            # Lo que se renderice aquí muere con este proceso: ningún worker lo vería.
+            self.stdout.write(self.style.WARNING(
+                "4) Precalentado omitido: la caché es local al proceso (LocMemCache). "
+                "Usa --warm-base-url http://127.0.0.1:8000 con el servidor en marcha."
+            ))
+        else:
+            self.stdout.write("4) Precalentando la caché de páginas...")
+            with self._stage("warm_cache"):
+                call_command("warm_cache", stdout=self.stdout, stderr=self.stderr)
+
+    @contextmanager
+    def _stage(self, name):
+        # Duración de cada etapa en /metrics (load_data_stage_duration_seconds).
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics_registry.set_gauge("load_data_stage_duration_seconds", time.perf_counter() - start, stage=name)
+
     # ------------------------------------------------------------------
     # Etapa 1: dataset akabab
     # ------------------------------------------------------------------
@@ -0,0 +1,160 @@
+"""
+Prueba de carga concurrente con una mezcla ponderada de URLs (ver `core.loadtest`).
+
+Contra un servidor ya arrancado (`--base-url`) o, con `--serve`, lanzando aquí
+uvicorn con `--workers` procesos y un OpenAI falso local (`core.fake_openai`),
+de modo que las preguntas del chatbot sin respuesta local no salen a internet.
+Contra otro servidor ese escenario (`chatbot_llm`) queda fuera salvo con
+`--allow-llm`: cada pregunta sería una llamada de pago a OpenAI.
+Informa del throughput, percentiles de latencia, tasa de errores y de los 503
+por SQLite bloqueado. Los POST del formulario de planetas crean filas reales
+en `PlanetInquiry` (a través de la cola de `core.inquiry_queue`).
+"""
+
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fake_openai import run_in_thread
+from core.loadtest import Targets, parse_mix, run_load
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = "Lanza usuarios concurrentes contra el sitio y mide throughput, latencia, errores y bloqueos de SQLite."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Servidor en marcha (por defecto el de runserver).")
+        parser.add_argument("--serve", action="store_true", help="Arranca uvicorn y un OpenAI falso solo para la prueba.")
+        parser.add_argument("--workers", type=int, default=2, help="Con --serve: procesos de uvicorn (por defecto 2).")
+        parser.add_argument("--concurrency", type=int, default=20, help="Usuarios virtuales simultáneos (por defecto 20).")
+        parser.add_argument("--duration", type=float, default=30, help="Segundos de prueba (por defecto 30).")
+        parser.add_argument("--timeout", type=float, default=30, help="Timeout de cada petición en segundos.")
+        parser.add_argument(
+            "--mix",
+            help="Pesos a cambiar, p. ej. 'characters=0,inquiry_post=10' (escenarios en core/loadtest.py).",
+        )
+        parser.add_argument("--language", default="es", help="Idioma de las URLs (por defecto es).")
+        parser.add_argument("--llm-delay", type=float, default=0.5, help="Latencia del OpenAI falso en segundos.")
+        parser.add_argument(
+            "--fake-openai-port",
+            type=int,
+            help="Sin --serve: arranca el OpenAI falso en este puerto para un servidor lanzado con "
+            "OPENAI_BASE_URL=http://127.0.0.1:<puerto>/v1.",
+        )
+        parser.add_argument(
+            "--allow-llm",
+            action="store_true",
+            help="Incluye chatbot_llm sin el OpenAI falso (llamadas reales y de pago a OpenAI).",
+        )
+        parser.add_argument("--seed", type=int, help="Semilla para repetir la misma secuencia de peticiones.")
+        parser.add_argument("--json", action="store_true", help="Imprime el resumen en JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            llm = bool(options["serve"] or options["fake_openai_port"] or options["allow_llm"])
+            mix = parse_mix(options["mix"], llm=llm)
+            targets = Targets.load(options["language"])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        fake, stop_fake = None, None
+        server = None
+        base_url = options["base_url"].rstrip("/")
+        try:
+            if options["serve"] or options["fake_openai_port"]:
+                fake, stop_fake = run_in_thread(delay=options["llm_delay"], port=options["fake_openai_port"] or 0)
+                self.stdout.write(f"OpenAI falso en {fake.base_url} ({options['llm_delay']}s de latencia)")
+            if options["serve"]:
+                server, base_url = self._serve(options["workers"], fake.base_url)
+
+            self.stdout.write(
+                f"{options['concurrency']} usuarios durante {options['duration']:.0f}s contra {base_url} "
+                f"({len(mix)} escenarios)"
+            )
+            stats = asyncio.run(
+                run_load(
+                    base_url,
+                    targets,
+                    mix,
+                    concurrency=options["concurrency"],
+                    duration=options["duration"],
+                    timeout=options["timeout"],
+                    seed=options["seed"],
+                )
+            )
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+            if stop_fake is not None:
+                stop_fake()
+
+        summary = stats.summary()
+        if fake is not None:
+            summary["llm_calls"] = fake.requests
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+        self._report(summary)
+
+    def _serve(self, workers, openai_url):
+        port = _free_port()
+        env = {
+            **os.environ,
+            "OPENAI_BASE_URL": openai_url,
+            "OPENAI_API_KEY": "fake",
+            "PERF_LOG_LEVEL": "WARNING",
+            "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "swsite.settings"),
+        }
+        command = [
+            sys.executable, "-m", "uvicorn", "swsite.asgi:application",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ]
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        base_url = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f"uvicorn terminó al arrancar (código {server.returncode}).")
+            try:
+                httpx.get(base_url + "/", timeout=1)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        else:
+            server.terminate()
+            raise CommandError("uvicorn no respondió en 30 s.")
+        self.stdout.write(f"uvicorn con {workers} workers en {base_url}")
+        return server, base_url
+
+    def _report(self, summary):
+        self.stdout.write(self.style.MIGRATE_HEADING("\nResumen"))
+        self.stdout.write(
+            f"{summary['requests']} peticiones en {summary['seconds']}s → {summary['throughput']} req/s  "
+            f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms"
+        )
+        style = self.style.ERROR if summary["error_rate"] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"Errores {summary['error_rate']:.2%}  estados {summary['statuses']}  "
+            f"red {summary['errors'] or '-'}  SQLite bloqueado {summary['lock_timeouts']}"
+        ))
+        if "llm_calls" in summary:
+            self.stdout.write(f"Llamadas al OpenAI falso: {summary['llm_calls']}")
+        self.stdout.write(self.style.MIGRATE_HEADING("\nPor escenario"))
+        self.stdout.write(f"{'escenario':<22} {'peticiones':>10} {'p50 ms':>9} {'p95 ms':>9}")
+        for scenario, values in summary["scenarios"].items():
+            self.stdout.write(f"{scenario:<22} {values['requests']:>10} {values['p50_ms']:>9} {values['p95_ms']:>9}")
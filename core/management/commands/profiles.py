@@ -0,0 +1,86 @@
+"""
+Lista y resume los perfiles guardados por `core.profiling.ProfilingMiddleware`.
+
+    manage.py profiles                      # últimos perfiles
+    manage.py profiles --show latest        # funciones y reservas de memoria top
+    manage.py profiles --route home --merge # todos los de una ruta sumados
+    manage.py profiles --token --memory     # cabecera X-Profile para pedir uno
+"""
+
+import io
+import pstats
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import HEADER, load_profiles, make_token, profile_dir
+
+
+class Command(BaseCommand):
+    help = "Lista los perfiles de CPU y memoria de logs/profiles/ y muestra sus funciones más costosas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--route", help="Solo los perfiles de este nombre de ruta.")
+        parser.add_argument("--limit", type=int, default=20, help="Perfiles a listar (por defecto 20).")
+        parser.add_argument("--show", metavar="ID", help="Resume un perfil (su id o 'latest').")
+        parser.add_argument("--merge", action="store_true", help="Resume todos los perfiles listados sumados.")
+        parser.add_argument("--top", type=int, default=15, help="Funciones y líneas a mostrar (por defecto 15).")
+        parser.add_argument(
+            "--sort",
+            choices=("cumulative", "tottime", "calls"),
+            default="cumulative",
+            help="Orden de las funciones (por defecto cumulative).",
+        )
+        parser.add_argument("--token", action="store_true", help="Imprime una cabecera X-Profile firmada.")
+        parser.add_argument("--memory", action="store_true", help="Con --token: medir también la memoria.")
+
+    def handle(self, *args, **options):
+        if options["token"]:
+            self.stdout.write(f"{HEADER}: {make_token('memory' if options['memory'] else 'cpu')}")
+            return
+
+        profiles = load_profiles()
+        if options["route"]:
+            profiles = [meta for meta in profiles if meta["route"] == options["route"]]
+
+        if options["show"]:
+            wanted = options["show"]
+            selected = profiles[:1] if wanted == "latest" else [meta for meta in profiles if meta["id"] == wanted]
+            if not selected:
+                raise CommandError(f"No hay ningún perfil '{wanted}' en {profile_dir()}.")
+            self._summary(selected, options)
+            return
+
+        profiles = profiles[: options["limit"]]
+        if not profiles:
+            self.stdout.write(f"No hay perfiles en {profile_dir()}.")
+            return
+        if options["merge"]:
+            self._summary(profiles, options)
+            return
+        for meta in profiles:
+            self.stdout.write(
+                f"{meta['id']}  {meta['method']} {meta['path']}  {meta['status']}  "
+                f"{meta['total_ms']:.0f} ms  [{meta['mode']}]"
+            )
+
+    def _summary(self, profiles, options):
+        top = options["top"]
+        for meta in profiles:
+            self.stdout.write(f"{meta['id']}: {meta['method']} {meta['path']} ({meta['route']}) {meta['total_ms']:.0f} ms")
+
+        output = io.StringIO()
+        stats = pstats.Stats(*(str(profile_dir() / f"{meta['id']}.prof") for meta in profiles), stream=output)
+        stats.strip_dirs().sort_stats(options["sort"]).print_stats(top)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nFunciones ({options['sort']}):"))
+        self.stdout.write(output.getvalue().strip())
+
+        allocations = defaultdict(lambda: [0.0, 0])
+        for meta in profiles:
+            for site in meta["allocations"]:
+                allocations[site["where"]][0] += site["size_kb"]
+                allocations[site["where"]][1] += site["count"]
+        if allocations:
+            self.stdout.write(self.style.MIGRATE_HEADING("\nReservas de memoria:"))
+            for where, (size_kb, count) in sorted(allocations.items(), key=lambda item: -item[1][0])[:top]:
+                self.stdout.write(f"{size_kb:>10.1f} KiB {count:>8} bloques  {where}")
@@ -0,0 +1,24 @@
+"""
+Reconstruye desde cero el índice de la búsqueda global (ver `core.search`).
+
+Las escrituras normales lo mantienen al día mediante señales; este comando es
+para la primera vez, tras cargas que no emiten señales (`QuerySet.update`,
+`loaddata`...) o si se sospecha que el índice se ha desincronizado.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice invertido de la búsqueda global del catálogo."
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = rebuild_index()
+        elapsed = time.perf_counter() - started
+        summary = ", ".join(f"{kind} {total}" for kind, total in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Índice reconstruido en {elapsed:.2f}s: {summary}"))
@@ -0,0 +1,149 @@
+"""
+Precalienta la caché de páginas recorriendo todo el catálogo en cada idioma.
+
+Por defecto renderiza las páginas dentro de este proceso con el cliente de
+pruebas de Django, lo que rellena la caché configurada en `CACHES` (útil con
+backends compartidos: ficheros, memcached, redis...). Con `--base-url` pide las
+páginas por HTTP a un servidor en marcha, que es lo necesario cuando la caché
+es local al proceso (LocMemCache).
+"""
+
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from core.cache import cache_is_process_local
+from core.routes import CATALOG_ROUTES, iter_catalog_urls, language_codes
+
+
+class Command(BaseCommand):
+    help = (
+        "Renderiza todas las fichas y listados del catálogo (media, personajes, "
+        "especies, planetas y afiliaciones) en cada idioma para llenar la caché."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Número de peticiones concurrentes (por defecto 8).",
+        )
+        parser.add_argument(
+            "--languages",
+            nargs="+",
+            help="Idiomas a precalentar (por defecto todos los de LANGUAGES).",
+        )
+        parser.add_argument(
+            "--routes",
+            nargs="+",
+            help="Limita el recorrido a estos nombres de ruta.",
+        )
+        parser.add_argument(
+            "--base-url",
+            help="Servidor en marcha al que pedir las páginas (p. ej. http://127.0.0.1:8000).",
+        )
+        parser.add_argument(
+            "--host",
+            help="Cabecera Host para el cliente interno (por defecto el primer ALLOWED_HOSTS).",
+        )
+
+    def handle(self, *args, **options):
+        languages = options.get("languages") or language_codes()
+        unknown = set(languages) - set(language_codes())
+        if unknown:
+            raise CommandError(f"Idiomas no configurados en LANGUAGES: {', '.join(sorted(unknown))}")
+
+        route_names = options.get("routes")
+        if route_names:
+            valid = {name for name, _ in CATALOG_ROUTES}
+            invalid = set(route_names) - valid
+            if invalid:
+                raise CommandError(f"Rutas desconocidas: {', '.join(sorted(invalid))}")
+
+        urls = list(iter_catalog_urls(languages, route_names))
+        if not options.get("base_url") and cache_is_process_local():
+            self.stdout.write(self.style.WARNING(
+                "La caché es local al proceso (LocMemCache): solo este proceso verá lo precalentado. "
+                "Para un servidor en marcha usa --base-url."
+            ))
+        fetch = self._http_fetcher(options["base_url"]) if options.get("base_url") else self._client_fetcher(options.get("host"))
+
+        self.stdout.write(f"Precalentando {len(urls)} URLs con {options['workers']} workers...")
+        started = time.perf_counter()
+        if options["workers"] <= 1:
+            results = [self._timed(fetch, *item) for item in urls]
+        else:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+                results = list(pool.map(lambda item: self._timed(fetch, *item, in_thread=True), urls))
+        elapsed = time.perf_counter() - started
+
+        self._report(results, elapsed)
+
+    def _timed(self, fetch, name, path, in_thread=False):
+        started = time.perf_counter()
+        try:
+            status = fetch(path)
+        except Exception as exc:  # un fallo aislado no debe parar el recorrido
+            self.stderr.write(f"   • {path}: {exc}")
+            status = None
+        finally:
+            if in_thread:
+                connections.close_all()
+        return name, path, status, time.perf_counter() - started
+
+    def _client_fetcher(self, host):
+        host = host or (settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost")
+        local = threading.local()
+
+        def fetch(path):
+            if not hasattr(local, "client"):
+                local.client = Client(HTTP_HOST=host)
+            # En producción SECURE_SSL_REDIRECT redirige todo lo que no sea https.
+            return local.client.get(path, secure=not settings.DEBUG).status_code
+
+        return fetch
+
+    def _http_fetcher(self, base_url):
+        base_url = base_url.rstrip("/")
+        local = threading.local()
+
+        def fetch(path):
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return local.session.get(f"{base_url}{path}", timeout=30).status_code
+
+        return fetch
+
+    def _report(self, results, elapsed):
+        by_route = defaultdict(list)
+        errors = 0
+        for name, path, status, duration in results:
+            by_route[name].append(duration)
+            if status != 200:
+                errors += 1
+                self.stdout.write(self.style.WARNING(f"   • {path} respondió {status}"))
+
+        self.stdout.write("   Ruta                    URLs   total(s)  media(ms)  máx(ms)")
+        for name, durations in sorted(by_route.items(), key=lambda item: -sum(item[1])):
+            self.stdout.write(
+                "   {:<22} {:>5} {:>10.2f} {:>10.1f} {:>8.1f}".format(
+                    name,
+                    len(durations),
+                    sum(durations),
+                    1000 * sum(durations) / len(durations),
+                    1000 * max(durations),
+                )
+            )
+
+        style = self.style.SUCCESS if not errors else self.style.WARNING
+        self.stdout.write(
+            style(f"   ✔ {len(results)} URLs en {elapsed:.2f}s ({errors} con error).")
+        )
@@ -0,0 +1,322 @@
+"""
+Registro de métricas en formato Prometheus, sin servicios externos.
+
+Cada proceso acumula en memoria contadores, histogramas y gauges y cada
+`FLUSH_INTERVAL` segundos (y al salir) vuelca su estado a
+`METRICS_DIR/<pid>-<id>.json` con una escritura atómica. El endpoint
+`/metrics` suma los ficheros de todos los procesos (workers de gunicorn o
+uvicorn, `load_data`...), así que los contadores no retroceden aunque un
+worker se reinicie. Los gauges se combinan quedándose con el valor más reciente.
+Al leerlos, los ficheros de procesos que ya no existen (workers reciclados,
+cada `manage.py` que termina) se suman a `aggregate.json` y se borran, así que
+el directorio no crece sin límite.
+
+Métricas (prefijo `swsite_`):
+- `requests_total`, `request_duration_seconds` y `request_db_queries` por
+  ruta (desde `core.perf.PerformanceMiddleware`).
+- `cache_events_total` y `cache_hit_ratio` por caché (`core.cache.CacheStats`).
+- `chatbot_replies_total` por origen de la respuesta: local, llm o fallback.
+- `db_lock_timeouts_total` por ruta (`core.middleware.DatabaseLockMiddleware`).
+- `load_data_stage_duration_seconds` de la última ejecución de cada etapa.
+- `inquiries_total` de la cola de consultas de planetas (`core.inquiry_queue`):
+  `stage="queued"` al aceptar el formulario y `stage="flushed"` al insertarlas.
+"""
+
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+PREFIX = "swsite_"
+FLUSH_INTERVAL = 1.0
+AGGREGATE_NAME = "aggregate.json"
+
+# nombre: (tipo, ayuda, cubetas si es histograma)
+METRICS = {
+    "requests_total": ("counter", "Peticiones atendidas por ruta, método y estado.", None),
+    "request_duration_seconds": (
+        "histogram", "Duración de las peticiones por ruta.",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    ),
+    "request_db_queries": ("histogram", "Consultas SQL por petición y ruta.", (0, 1, 2, 5, 10, 20, 50, 100)),
+    "cache_events_total": ("counter", "Eventos de cada caché (hits, misses, stale...).", None),
+    "cache_hit_ratio": ("gauge", "Aciertos (incluidas respuestas caducadas) / consultas de cada caché.", None),
+    "chatbot_replies_total": ("counter", "Respuestas del chatbot según su origen (local, llm, fallback).", None),
+    "db_lock_timeouts_total": ("counter", "Peticiones respondidas con 503 porque SQLite estaba bloqueado.", None),
+    "load_data_stage_duration_seconds": ("gauge", "Duración de cada etapa en la última ejecución de load_data.", None),
+    "inquiries_total": ("counter", "Consultas de planetas encoladas e insertadas en la base de datos.", None),
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # existe, pero es de otro usuario
+        return True
+    return True
+
+
+class _Totals:
+    """Suma de los estados (el JSON de un proceso) que se le van pasando."""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.gauges = {}
+        self.caches = defaultdict(lambda: defaultdict(float))
+
+    def add(self, state):
+        for name, labels, value in state["counters"]:
+            self.counters[_key(name, labels)] += value
+        for name, labels, data in state["histograms"]:
+            merged = self.histograms.setdefault(_key(name, labels), {"buckets": [0] * len(data["buckets"]), "sum": 0.0, "count": 0})
+            merged["buckets"] = [a + b for a, b in zip(merged["buckets"], data["buckets"])]
+            merged["sum"] += data["sum"]
+            merged["count"] += data["count"]
+        for name, labels, value, stamp in state["gauges"]:
+            key = _key(name, labels)
+            if key not in self.gauges or self.gauges[key][1] < stamp:
+                self.gauges[key] = (value, stamp)
+        for cache, counts in state["caches"].items():
+            for field, value in counts.items():
+                if field != "hit_ratio":
+                    self.caches[cache][field] += value
+
+    def state(self):
+        return {
+            "counters": [[name, dict(labels), value] for (name, labels), value in self.counters.items()],
+            "histograms": [[name, dict(labels), data] for (name, labels), data in self.histograms.items()],
+            "gauges": [[name, dict(labels), *pair] for (name, labels), pair in self.gauges.items()],
+            "caches": {cache: dict(counts) for cache, counts in self.caches.items()},
+        }
+
+
+class MetricsRegistry:
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._file = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._gauges = {}
+        self._flushed_at = 0.0
+
+    @property
+    def directory(self) -> Path:
+        return Path(self._directory or settings.METRICS_DIR)
+
+    def _check_fork(self):
+        # Tras un fork (gunicorn --preload) el hijo empieza de cero con su propio fichero.
+        if os.getpid() != self._pid:
+            self._reset()
+
+    # Registro ----------------------------------------------------------------
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self._check_fork()
+            self._counters[_key(name, labels)] += amount
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        with self._lock:
+            self._check_fork()
+            key = _key(name, labels)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+        self._maybe_flush()
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._check_fork()
+            self._gauges[_key(name, labels)] = (value, time.time())
+        self._maybe_flush()
+
+    # Ficheros por proceso -------------------------------------------------------
+    def _state(self):
+        from .cache import cache_stats
+
+        with self._lock:
+            return {
+                "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                "histograms": [[name, dict(labels), data] for (name, labels), data in self._histograms.items()],
+                "gauges": [[name, dict(labels), *pair] for (name, labels), pair in self._gauges.items()],
+                "caches": cache_stats(),
+            }
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._flushed_at >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Escribe el estado de este proceso (atómico: tmp + rename)."""
+        self._flushed_at = time.monotonic()
+        state = self._state()
+        # Un comando que no ha medido nada (migrate, shell...) no deja fichero.
+        if state["counters"] or state["histograms"] or state["gauges"] or any(
+            value for counts in state["caches"].values() for field, value in counts.items() if field != "hit_ratio"
+        ):
+            self._write(self._file, state)
+
+    def _write(self, name, state):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+            with os.fdopen(fd, "w") as handle:
+                json.dump(state, handle)
+            os.replace(tmp, self.directory / name)
+        except OSError:
+            # Las métricas nunca deben tumbar una petición.
+            pass
+
+    def _read(self, path):
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def clear(self):
+        """Borra las métricas de todos los procesos (útil en tests)."""
+        with self._lock:
+            self._reset()
+        for path in self.directory.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+    # Agregación -------------------------------------------------------------------
+    def compact(self):
+        """Suma a `aggregate.json` los ficheros de procesos que ya no existen y los borra."""
+        if fcntl is None:  # sin flock ni os.kill(pid, 0) fiables (Windows): se quedan
+            return
+        try:
+            with open(self.directory / "compact.lock", "a") as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # otro proceso está en ello
+                dead = [
+                    path for path in self.directory.glob("*-*.json")
+                    if path.name.partition("-")[0].isdigit() and not _pid_alive(int(path.name.partition("-")[0]))
+                ]
+                if not dead:
+                    return
+                aggregate = self._read(self.directory / AGGREGATE_NAME) or _Totals().state()
+                # Si morimos entre escribir el agregado y borrar los ficheros, `merged`
+                # evita sumarlos dos veces.
+                merged = set(aggregate.get("merged", ()))
+                totals = _Totals()
+                totals.add(aggregate)
+                for path in dead:
+                    state = self._read(path) if path.name not in merged else None
+                    if state is not None:
+                        totals.add(state)
+                        merged.add(path.name)
+                state = totals.state()
+                state["merged"] = sorted(name for name in merged if (self.directory / name).exists())
+                self._write(AGGREGATE_NAME, state)
+                for path in dead:
+                    path.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def collect(self):
+        """Estado sumado de todos los procesos."""
+        from .cache import stale_is_served
+
+        self.flush()
+        self.compact()
+        # Primero los ficheros y luego el agregado: si otro proceso los compacta en
+        # medio, `merged` dice cuáles ya están sumados allí.
+        states = {path.name: self._read(path) for path in sorted(self.directory.glob("*.json")) if path.name != AGGREGATE_NAME}
+        aggregate = self._read(self.directory / AGGREGATE_NAME)
+        totals = _Totals()
+        merged = set()
+        if aggregate is not None:
+            totals.add(aggregate)
+            merged = set(aggregate.get("merged", ()))
+        for name, state in states.items():
+            if state is not None and name not in merged:
+                totals.add(state)
+
+        counters, histograms, gauges = totals.counters, totals.histograms, totals.gauges
+        for cache, counts in totals.caches.items():
+            for field, value in counts.items():
+                counters[_key("cache_events_total", {"cache": cache, "event": field})] += value
+            # Una respuesta caducada servida mientras se recalcula también es un acierto
+            # (en la caché del LLM, "stale" es una entrada descartada: un fallo).
+            lookups = counts["hits"] + counts["stale"] + counts["misses"]
+            served = counts["hits"] + (counts["stale"] if stale_is_served(cache) else 0)
+            if lookups:
+                gauges[_key("cache_hit_ratio", {"cache": cache})] = (served / lookups, 0)
+        return counters, histograms, gauges
+
+    def render(self) -> str:
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        counters, histograms, gauges = self.collect()
+        series = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            series[name].append(_line(name, labels, value))
+        for (name, labels), (value, _) in sorted(gauges.items()):
+            series[name].append(_line(name, labels, value))
+        for (name, labels), data in sorted(histograms.items()):
+            for bound, count in zip(METRICS[name][2], data["buckets"]):
+                series[name].append(_line(f"{name}_bucket", labels + (("le", _number(bound)),), count))
+            series[name].append(_line(f"{name}_bucket", labels + (("le", "+Inf"),), data["count"]))
+            series[name].append(_line(f"{name}_sum", labels, data["sum"]))
+            series[name].append(_line(f"{name}_count", labels, data["count"]))
+
+        lines = []
+        for name in METRICS:
+            if series[name]:
+                kind, help_text, _ = METRICS[name]
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+                lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                lines.extend(series[name])
+        return "\n".join(lines) + "\n"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "+Inf" if value == math.inf else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _line(name, labels, value):
+    text = ",".join(f'{key}="{_escape(label)}"' for key, label in labels)
+    return f"{PREFIX}{name}{{{text}}} {_number(value)}" if text else f"{PREFIX}{name} {_number(value)}"
+
+
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,76 @@
+"""
+Middlewares propios del proyecto.
+"""
+
+import logging
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+LOCK_HEADER = "X-DB-Lock-Timeout"
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise con soporte asíncrono.
+
+    El middleware original solo es síncrono: bajo ASGI obliga a Django a pasar
+    toda la cadena por un único hilo y las vistas asíncronas (el chatbot) se
+    atienden de una en una. Aquí la búsqueda del fichero es un dict, así que
+    solo el envío del estático va a un hilo.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    def _static_file(self, request):
+        if self.autorefresh:
+            return self.find_file(request.path_info)
+        return self.files.get(request.path_info)
+
+    async def __acall__(self, request):
+        static_file = await sync_to_async(self._static_file)(request) if self.autorefresh else self._static_file(request)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+class DatabaseLockMiddleware(MiddlewareMixin):
+    """
+    Convierte "database is locked" de SQLite en un 503 con `Retry-After`.
+
+    Con varias escrituras a la vez SQLite puede agotar su espera por el cerrojo;
+    es una saturación temporal, no un fallo de la vista. La respuesta lleva la
+    cabecera `X-DB-Lock-Timeout` (la cuenta `manage.py loadtest`) y suma a
+    `db_lock_timeouts_total` en /metrics.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, OperationalError) or "locked" not in str(exception):
+            return None
+        match = getattr(request, "resolver_match", None)
+        route = (match.url_name if match else None) or "unmatched"
+        logger.warning("SQLite bloqueado en %s (%s): %s", request.path, route, exception)
+        metrics_registry.inc("db_lock_timeouts_total", route=route)
+        response = HttpResponse("Servicio saturado, reintenta en unos segundos.", status=503, content_type="text/plain; charset=utf-8")
+        response["Retry-After"] = "1"
+        response[LOCK_HEADER] = "1"
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:50
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    counters = (
+        ("Species", "character_count", "Character", "species"),
+        ("Planet", "resident_count", "Character", "homeworld"),
+        ("Affiliation", "member_count", "CharacterAffiliation", "affiliation"),
+        ("Media", "cast_size", "Appearance", "media"),
+    )
+    for target_name, field, source_name, fk in counters:
+        target = apps.get_model("core", target_name)
+        source = apps.get_model("core", source_name)
+        total = (
+            source.objects.filter(**{fk: OuterRef("pk")})
+            .order_by()
+            .values(fk)
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        target.objects.update(**{field: Coalesce(Subquery(total), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_planetinquiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='affiliation',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='media',
+            name='cast_size',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='planet',
+            name='resident_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='species',
+            name='character_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_counter_caches'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('body', models.TextField(blank=True)),
+                ('length', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=60)),
+                ('frequency', models.PositiveIntegerField()),
+                ('in_title', models.BooleanField(default=False)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='core.searchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'document'], name='core_search_term_43f7a6_idx')],
+            },
+        ),
+    ]
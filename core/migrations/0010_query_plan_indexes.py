@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(fields=['species', 'height_m'], name='core_charac_species_51e8f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='character',
+            index=models.Index(fields=['homeworld', 'name'], name='core_charac_homewor_f39c8d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='media',
+            index=models.Index(fields=['media_type', 'episode'], name='core_media_media_t_d216fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planetinquiry',
+            index=models.Index(fields=['created_at'], name='core_planet_created_3caf7d_idx'),
+        ),
+    ]
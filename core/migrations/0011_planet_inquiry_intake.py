@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planetinquiry',
+            name='intake_id',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='planetinquiry',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
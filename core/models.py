@@ -1,11 +1,14 @@
 from django.db import models
 from django.utils.functional import cached_property
+from django.utils import timezone
 
 class Species(models.Model):
     name = models.CharField(max_length=80, unique=True)
     classification = models.CharField(max_length=80, null=True, blank=True)
     designation = models.CharField(max_length=80, null=True, blank=True)
     language = models.CharField(max_length=80, null=True, blank=True)
+    # Contador mantenido por core.counters (personajes de esta especie).
+    character_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -69,6 +72,8 @@ class Planet(models.Model):
     native_species = models.ManyToManyField(
     "Species", through="PlanetSpecies", related_name="homeworlds", blank=True
     )
+    # Contador mantenido por core.counters (personajes originarios del planeta).
+    resident_count = models.PositiveIntegerField(default=0, editable=False)
 
 
     def __str__(self):
@@ -95,9 +100,15 @@ class Media(models.Model):
     starships = models.JSONField(null=True, blank=True)
     vehicles = models.JSONField(null=True, blank=True)
     species = models.JSONField(null=True, blank=True)   
+    # Contador mantenido por core.counters (personajes que aparecen).
+    cast_size = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["media_type", "episode", "release_date", "title"]
+        indexes = [
+            # Listado de películas y contadores: media_type=film ordenado por episodio.
+            models.Index(fields=["media_type", "episode"]),
+        ]
 
     def __str__(self):
         return self.title
@@ -106,6 +117,8 @@ class Media(models.Model):
 class Affiliation(models.Model):
     name = models.CharField(max_length=120, unique=True)
     category = models.CharField(max_length=60, null=True, blank=True)
+    # Contador mantenido por core.counters (personajes afiliados).
+    member_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -138,6 +151,12 @@ class Character(models.Model):
     
     class Meta:
         ordering = ["name"]
+        indexes = [
+            # Home: el más alto de cada especie sin ordenar en una tabla temporal.
+            models.Index(fields=["species", "height_m"]),
+            # Ficha de planeta: residentes por orden alfabético.
+            models.Index(fields=["homeworld", "name"]),
+        ]
 
     def __str__(self):
         return self.name
@@ -177,10 +196,43 @@ class PlanetInquiry(models.Model):
         related_name="inquiries",
     )
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Hora del envío, no la de la inserción: las consultas llegan por la cola de
+    # core.inquiry_queue y bulk_create respetaría auto_now_add con la hora de vaciado.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Id de la línea de la cola; evita duplicados si un vaciado se repite.
+    intake_id = models.UUIDField(null=True, blank=True, unique=True, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [models.Index(fields=["created_at"])]
 
     def __str__(self):
         return f"{self.name} - {self.planet or 'Sin planeta'}"
+
+
+class SearchDocument(models.Model):
+    """Entrada del índice de búsqueda global (ver core.search)."""
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    body = models.TextField(blank=True)
+    # Nº de términos del documento, para normalizar la puntuación BM25.
+    length = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = [("kind", "object_id")]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.title}"
+
+
+class SearchPosting(models.Model):
+    term = models.CharField(max_length=60)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name="postings")
+    frequency = models.PositiveIntegerField()
+    in_title = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["term", "document"]),
+        ]
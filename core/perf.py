@@ -0,0 +1,227 @@
+"""
+Métricas de rendimiento por petición.
+
+`PerformanceMiddleware` abre un `RequestMetrics` en un contextvar (vale igual
+para WSGI, ASGI y los hilos que copian el contexto) y al terminar lo publica
+en la cabecera `Server-Timing` y en una línea JSON del logger `core.perf`:
+
+- SQL: nº de consultas y tiempo, con un `execute_wrapper` que se instala en
+  cada conexión nueva (`connection_created`).
+- Plantillas: tiempo de render, con el backend `TimedDjangoTemplates`.
+- Caché: aciertos y fallos de las cachés de `core.cache` (`CacheStats`).
+- HTTP saliente: llamadas a OpenAI y su duración (`core.chatbot`).
+
+Además suma cada petición a los contadores e histogramas de `/metrics`
+(`core.metrics`).
+
+`PERF_QUERY_BUDGETS` fija el máximo de consultas por nombre de ruta (y
+`PERF_DEFAULT_QUERY_BUDGET` para el resto): al pasarse se registra un aviso o,
+con `PERF_BUDGET_RAISE` (activo en los tests), se lanza `QueryBudgetExceeded`.
+Las consultas de reconstruir un snapshot en memoria (`rebuild_queries`) se
+muestran pero no cuentan: solo ocurren tras un cambio de datos.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+from .metrics import metrics_registry
+
+logger = logging.getLogger("core.perf")
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class RequestMetrics:
+    FIELDS = ("db_queries", "rebuild_queries", "db_ms", "template_ms", "cache_hits", "cache_misses", "http_calls", "http_ms")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self.FIELDS, 0)
+        self._template_depth = 0
+
+    def add(self, **amounts):
+        with self._lock:
+            for field, amount in amounts.items():
+                self._values[field] += amount
+
+    def __getattr__(self, field):
+        if field in RequestMetrics.FIELDS:
+            return self._values[field]
+        raise AttributeError(field)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            values = dict(self._values)
+        return {field: round(value, 2) if isinstance(value, float) else value for field, value in values.items()}
+
+    def server_timing(self, total_ms) -> str:
+        values = self.snapshot()
+        return ", ".join([
+            f'db;dur={values["db_ms"]:.1f};desc="{values["db_queries"]} queries ({values["rebuild_queries"]} rebuild)"',
+            f'tpl;dur={values["template_ms"]:.1f}',
+            f'cache;desc="{values["cache_hits"]} hits {values["cache_misses"]} misses"',
+            f'http;dur={values["http_ms"]:.1f};desc="{values["http_calls"]} calls"',
+            f"total;dur={total_ms:.1f}",
+        ])
+
+
+def current():
+    return _current.get()
+
+
+def record(**amounts):
+    """Suma a las métricas de la petición en curso (no hace nada fuera de una petición)."""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(**amounts)
+
+
+@contextmanager
+def collect():
+    """Mide todo lo que ocurra dentro del bloque en un `RequestMetrics` nuevo."""
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def rebuilding():
+    """Marca las consultas del bloque como reconstrucción de un snapshot (fuera del presupuesto)."""
+    metrics = _current.get()
+    before = metrics.db_queries if metrics else 0
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.add(rebuild_queries=metrics.db_queries - before)
+
+
+# ---------------------------------------------------------------------------
+# SQL
+# ---------------------------------------------------------------------------
+def _db_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add(db_queries=1, db_ms=(time.perf_counter() - start) * 1000)
+
+
+def install_db_wrapper(sender, connection, **kwargs):
+    """Receptor de `connection_created` (conectado en `core.signals`)."""
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+# ---------------------------------------------------------------------------
+# Plantillas
+# ---------------------------------------------------------------------------
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        # Los {% include %} que usan render() no se cuentan dos veces.
+        metrics._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics._template_depth -= 1
+            if not metrics._template_depth:
+                metrics.add(template_ms=(time.perf_counter() - start) * 1000)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """El backend de plantillas de Django midiendo el tiempo de render."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# ---------------------------------------------------------------------------
+# Middleware
+# ---------------------------------------------------------------------------
+class PerformanceMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with collect() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with collect() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics, start)
+
+    def finish(self, request, response, metrics, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        response["Server-Timing"] = metrics.server_timing(total_ms)
+
+        match = getattr(request, "resolver_match", None)
+        route = match.url_name if match else None
+        line = {
+            "method": request.method,
+            "path": request.path,
+            "route": route,
+            "status": response.status_code,
+            "total_ms": round(total_ms, 2),
+            **metrics.snapshot(),
+        }
+        if response.streaming:
+            # El cuerpo se genera después: solo cuenta lo previo al primer byte.
+            line["streaming"] = True
+        logger.info(json.dumps(line))
+
+        # Acumulados entre peticiones y procesos para /metrics.
+        label = route or "unmatched"
+        metrics_registry.inc("requests_total", route=label, method=request.method, status=response.status_code)
+        metrics_registry.observe("request_duration_seconds", total_ms / 1000, route=label)
+        metrics_registry.observe("request_db_queries", metrics.db_queries, route=label)
+
+        budgets = getattr(settings, "PERF_QUERY_BUDGETS", {})
+        budget = budgets.get(route, getattr(settings, "PERF_DEFAULT_QUERY_BUDGET", None))
+        queries = metrics.db_queries - metrics.rebuild_queries
+        if budget is not None and queries > budget:
+            message = f"{request.path} ({route}) hizo {queries} consultas SQL; presupuesto {budget}"
+            logger.warning(message)
+            if getattr(settings, "PERF_BUDGET_RAISE", False):
+                raise QueryBudgetExceeded(message)
+        return response
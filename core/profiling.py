@@ -0,0 +1,190 @@
+"""
+Perfilado bajo demanda de peticiones concretas, también en producción.
+
+`ProfilingMiddleware` perfila una petición cuando:
+- trae la cabecera `X-Profile` con un token firmado (`manage.py profiles
+  --token`), válido `PROFILE_TOKEN_MAX_AGE` segundos; el token dice si además
+  se mide la memoria, o
+- cae en el muestreo aleatorio `PROFILE_SAMPLE_RATE` (0.01 = el 1 %).
+
+Se guarda el perfil de CPU de `cProfile` (`<id>.prof`, legible con `pstats` o
+snakeviz) y un `<id>.json` con la ruta, los tiempos y, si se pidió, la
+diferencia de `tracemalloc` entre el principio y el final de la petición
+(líneas que más memoria han reservado). Todo va a `PROFILE_DIR`
+(`logs/profiles/`) y `manage.py profiles` lo lista y resume.
+
+Solo se perfila una petición a la vez por proceso: cProfile es global al hilo
+y en ASGI el event loop intercala peticiones. En ASGI, además, solo se ve lo que
+corre en el event loop; lo que va por `sync_to_async` queda en otro hilo.
+"""
+
+import cProfile
+import json
+import random
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import signing
+
+HEADER = "X-Profile"
+MODES = ("cpu", "memory")
+TOP_ALLOCATIONS = 25
+_SALT = "core.profiling"
+_busy = threading.Lock()
+
+
+def make_token(mode="cpu") -> str:
+    """Valor de la cabecera `X-Profile` para perfilar una petición (`mode` cpu o memory)."""
+    return signing.TimestampSigner(salt=_SALT).sign(mode)
+
+
+def requested_mode(request):
+    """Modo pedido por la petición (token firmado o muestreo), o None si no toca perfilar."""
+    token = request.headers.get(HEADER)
+    if token:
+        max_age = getattr(settings, "PROFILE_TOKEN_MAX_AGE", 3600)
+        try:
+            mode = signing.TimestampSigner(salt=_SALT).unsign(token, max_age=max_age)
+        except signing.BadSignature:
+            return None
+        return mode if mode in MODES else None
+    rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+    if rate and random.random() < rate:
+        return "memory" if getattr(settings, "PROFILE_SAMPLE_MEMORY", False) else "cpu"
+    return None
+
+
+def profile_dir() -> Path:
+    return Path(settings.PROFILE_DIR)
+
+
+def load_profiles():
+    """Metadatos de los perfiles guardados, del más reciente al más antiguo."""
+    profiles = []
+    for path in profile_dir().glob("*.json"):
+        try:
+            profiles.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(profiles, key=lambda meta: meta["id"], reverse=True)
+
+
+class _Capture:
+    def __init__(self, mode):
+        self.mode = mode
+        self.profiler = cProfile.Profile()
+        self.started_tracing = False
+        self.before = None
+
+    def start(self):
+        if self.mode == "memory":
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            self.before = tracemalloc.take_snapshot()
+        self.start_time = time.perf_counter()
+        self.profiler.enable()
+
+    def abort(self):
+        self.profiler.disable()
+        if self.started_tracing:
+            tracemalloc.stop()
+
+    def stop(self):
+        self.profiler.disable()
+        self.total_ms = (time.perf_counter() - self.start_time) * 1000
+        self.allocations = []
+        if self.before is not None:
+            after = tracemalloc.take_snapshot()
+            if self.started_tracing:
+                tracemalloc.stop()
+            ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*"))
+            stats = after.filter_traces(ignore).compare_to(self.before.filter_traces(ignore), "lineno")
+            self.allocations = [
+                {
+                    "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count_diff,
+                }
+                for stat in stats[:TOP_ALLOCATIONS]
+                if stat.size_diff > 0
+            ]
+
+    def save(self, request, response):
+        match = getattr(request, "resolver_match", None)
+        route = (match.url_name if match else None) or "unmatched"
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{route}-{self.total_ms:.0f}ms-{random.getrandbits(24):06x}"
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        self.profiler.dump_stats(directory / f"{name}.prof")
+        meta = {
+            "id": name,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "route": route,
+            "status": response.status_code,
+            "mode": self.mode,
+            "total_ms": round(self.total_ms, 2),
+            "allocations": self.allocations,
+        }
+        (directory / f"{name}.json").write_text(json.dumps(meta, indent=2))
+        return name
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def _begin(self, request):
+        mode = requested_mode(request)
+        if mode is None or not _busy.acquire(blocking=False):
+            return None
+        capture = _Capture(mode)
+        capture.start()
+        return capture
+
+    def _end(self, capture, request, response):
+        try:
+            capture.stop()
+            response["X-Profile-Id"] = capture.save(request, response)
+        finally:
+            _busy.release()
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        capture = self._begin(request)
+        if capture is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            capture.abort()
+            _busy.release()
+            raise
+        return self._end(capture, request, response)
+
+    async def __acall__(self, request):
+        capture = self._begin(request)
+        if capture is None:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            capture.abort()
+            _busy.release()
+            raise
+        return self._end(capture, request, response)
@@ -0,0 +1,248 @@
+"""
+Planes de ejecución (`EXPLAIN QUERY PLAN` de SQLite) de las consultas del sitio.
+
+- `QueryCollector` recoge, con un `execute_wrapper`, las consultas distintas que
+  lanza un bloque de código (vistas, `load_data`...) con sus ejecuciones y tiempo.
+- `advise()` pide el plan de cada una y marca los recorridos completos de tablas
+  grandes (`SCAN tabla`, sin índice o recorriendo uno entero) y las ordenaciones en tablas temporales
+  (`USE TEMP B-TREE`), con un índice compuesto propuesto a partir de las
+  columnas del WHERE y el ORDER BY. Lo usa el comando `index_advisor`.
+- `HOT_QUERIES` son las consultas calientes de las vistas; su firma (índices
+  usados, recorridos completos y B-trees temporales) se guarda en
+  `benchmarks/query_plans.json` y un test falla si alguna deja de usar su índice.
+- `analyze()` actualiza las estadísticas del planificador (al final de `load_data`).
+"""
+
+import re
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+from django.db.models import OuterRef, Subquery
+
+from .models import Appearance, Character, CharacterAffiliation, Media, PlanetInquiry, SearchPosting
+
+SNAPSHOT_PATH = Path(settings.BASE_DIR) / "benchmarks" / "query_plans.json"
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE")
+# Recorrido completo, también el que sigue un índice solo para leer en orden.
+SCAN_RE = re.compile(r"^SCAN (\w+)(?: USING INDEX \w+)?$")
+INDEX_RE = re.compile(r"USING (?:COVERING )?INDEX (\w+)")
+TEMP_BTREE = "USE TEMP B-TREE"
+ALIAS_RE = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)"?\b')
+# "tabla"."columna" (o alias U0."columna") seguido del operador; las igualdades
+# entre dos columnas (ON de los JOIN) no filtran y no cuentan.
+PREDICATE_RE = re.compile(
+    r'(?:"(\w+)"|([A-Z]\d+))\."(\w+)"\s*(=(?!\s*\(?(?:"\w+"|[A-Z]\d+)\.)|IN\b|IS NULL|<=|>=|<|>|LIKE\b)'
+)
+ORDER_RE = re.compile(r"ORDER BY (.+?)(?: LIMIT| OFFSET|\)|$)")
+ORDER_COLUMN_RE = re.compile(r'(?:"(\w+)"|([A-Z]\d+))\."(\w+)"')
+
+
+def analyze(using="default"):
+    """Recalcula las estadísticas del planificador (SQLite y PostgreSQL)."""
+    conn = connections[using]
+    if conn.vendor in ("sqlite", "postgresql"):
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+def explain(sql, params=()):
+    """Líneas `detail` del plan de SQLite para `sql`."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+# ---------------------------------------------------------------------------
+# Captura
+# ---------------------------------------------------------------------------
+class CapturedQuery:
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.sources = set()
+        self.count = 0
+        self.total_ms = 0.0
+
+
+class QueryCollector:
+    """`with collector.capture("origen"):` agrupa por SQL todo lo que se ejecute dentro."""
+
+    def __init__(self):
+        self.queries = {}
+
+    def capture(self, source):
+        def wrapper(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                if not many and sql.lstrip().upper().startswith(EXPLAINABLE):
+                    query = self.queries.get(sql)
+                    if query is None:
+                        query = self.queries[sql] = CapturedQuery(sql, params)
+                    query.sources.add(source)
+                    query.count += 1
+                    query.total_ms += (time.perf_counter() - start) * 1000
+
+        return connection.execute_wrapper(wrapper)
+
+
+# ---------------------------------------------------------------------------
+# Diagnóstico
+# ---------------------------------------------------------------------------
+class Finding(NamedTuple):
+    query: CapturedQuery
+    plan: list
+    problems: list  # líneas del plan que delatan el problema
+    suggestions: list  # "Modelo: models.Index(fields=[...])"
+
+
+def _aliases(sql):
+    return {alias: table for table, alias in ALIAS_RE.findall(sql)}
+
+
+def _model_field(table, column):
+    for model in apps.get_models():
+        if model._meta.db_table == table:
+            for field in model._meta.concrete_fields:
+                if field.column == column:
+                    return model, field.name
+            return model, column
+    return None, column
+
+
+def _existing_prefixes(model):
+    """Columnas iniciales de los índices que ya tiene la tabla."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return [tuple(info["columns"]) for info in constraints.values() if info["index"] or info["unique"] or info["primary_key"]]
+
+
+def suggest_index(sql, table):
+    """Índice compuesto para `table`: columnas con igualdad, luego rango y luego las del ORDER BY."""
+    aliases = _aliases(sql)
+    equality, ranges, ordering = [], [], []
+    for name, alias, column, operator in PREDICATE_RE.findall(sql):
+        if (name or aliases.get(alias)) != table:
+            continue
+        target = equality if operator in ("=", "IN", "IS NULL") else ranges
+        if operator != "LIKE" and column not in equality + ranges:
+            target.append(column)
+    order = ORDER_RE.search(sql)
+    if order:
+        for name, alias, column in ORDER_COLUMN_RE.findall(order.group(1)):
+            if (name or aliases.get(alias)) == table and column not in equality + ranges + ordering:
+                ordering.append(column)
+    # Solo cabe una columna de rango antes de que el índice deje de servir para ordenar.
+    columns = equality + (ranges[:1] if not ordering else []) + ordering
+    if not columns:
+        return None
+    model, _ = _model_field(table, columns[0])
+    if model is None:
+        return None
+    # Filtrada por clave primaria (id IN (...), JOIN ... ON id): pocas filas, ordenarlas es barato.
+    if model._meta.pk.column in equality:
+        return None
+    if any(prefix[: len(columns)] == tuple(columns) for prefix in _existing_prefixes(model)):
+        return None
+    fields = [_model_field(table, column)[1] for column in columns]
+    return f"{model.__name__}: models.Index(fields={fields!r})"
+
+
+def _table_rows(table):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM "{table}"')
+        return cursor.fetchone()[0]
+
+
+def advise(queries, min_rows=200):
+    """Consultas con recorridos completos de tablas grandes o B-trees temporales, de más a menos tiempo."""
+    findings = []
+    rows = {}
+    for query in queries:
+        try:
+            plan = explain(query.sql, query.params)
+        except DatabaseError:
+            continue
+        aliases = _aliases(query.sql)
+        problems, suggestions = [], []
+        for detail in plan:
+            scan = SCAN_RE.match(detail)
+            if scan:
+                table = aliases.get(scan.group(1), scan.group(1))
+                if table not in rows:
+                    rows[table] = _table_rows(table)
+                if rows[table] >= min_rows:
+                    problems.append(detail)
+                    suggestions.append(suggest_index(query.sql, table))
+            elif detail.startswith(TEMP_BTREE):
+                problems.append(detail)
+                for table in set(re.findall(r'(?:FROM|JOIN) "(\w+)"', query.sql)):
+                    suggestions.append(suggest_index(query.sql, table))
+        if problems:
+            findings.append(Finding(query, plan, problems, sorted({s for s in suggestions if s})))
+    return sorted(findings, key=lambda finding: -finding.query.total_ms)
+
+
+# ---------------------------------------------------------------------------
+# Consultas calientes y su firma
+# ---------------------------------------------------------------------------
+def _home_featured():
+    # Igual que HomeView: el más alto de cada especie con imagen.
+    tallest = (
+        Character.objects.filter(species=OuterRef("species"), image_url__isnull=False)
+        .exclude(image_url="")
+        .order_by("-height_m")
+        .values("pk")[:1]
+    )
+    return Character.objects.filter(pk=Subquery(tallest)).select_related("species").order_by("species_id")
+
+
+HOT_QUERIES = {
+    "home_featured": _home_featured,
+    "film_list": lambda: Media.objects.filter(media_type=Media.FILM).order_by("episode"),
+    "character_films": lambda: Media.objects.filter(cast__id=1, media_type=Media.FILM).order_by("episode"),
+    "planet_residents": lambda: Character.objects.filter(homeworld_id=1).order_by("name"),
+    "species_members": lambda: Character.objects.filter(species_id=1).order_by("name"),
+    "media_cast": lambda: Appearance.objects.filter(media_id=1).select_related("character"),
+    "character_affiliations": lambda: CharacterAffiliation.objects.filter(character_id=1).select_related("affiliation"),
+    "recent_inquiries": lambda: PlanetInquiry.objects.order_by("-created_at")[:20],
+    "search_postings": lambda: SearchPosting.objects.filter(term__in=["luke", "skywalker"]).values_list("document_id"),
+}
+
+
+def plan_signature(queryset):
+    """{"indexes": [...], "scans": [...], "temp_btree": bool} del plan de un queryset."""
+    sql, params = queryset.query.sql_with_params()
+    aliases = _aliases(sql)
+    plan = explain(sql, params)
+    return {
+        "indexes": sorted({name for detail in plan for name in INDEX_RE.findall(detail)}),
+        "scans": sorted({aliases.get(m.group(1), m.group(1)) for detail in plan if (m := SCAN_RE.match(detail))}),
+        "temp_btree": any(detail.startswith(TEMP_BTREE) for detail in plan),
+    }
+
+
+def hot_query_signatures():
+    return {label: plan_signature(build()) for label, build in HOT_QUERIES.items()}
+
+
+def plan_regressions(current, snapshot):
+    """Diferencias que empeoran el plan: índices perdidos, recorridos completos o B-trees nuevos."""
+    problems = defaultdict(list)
+    for label, expected in snapshot.items():
+        actual = current.get(label)
+        if actual is None:
+            continue
+        for index in set(expected["indexes"]) - set(actual["indexes"]):
+            problems[label].append(f"ya no usa {index}")
+        for table in set(actual["scans"]) - set(expected["scans"]):
+            problems[label].append(f"recorre entera {table}")
+        if actual["temp_btree"] and not expected["temp_btree"]:
+            problems[label].append("ordena en un B-tree temporal")
+    return dict(problems)
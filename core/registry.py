@@ -0,0 +1,145 @@
+"""
+Registro en memoria de las tablas de referencia pequeñas del catálogo.
+
+Species, películas, sistemas estelares, regiones y afiliaciones apenas cambian,
+así que cada proceso las carga una vez en registros compactos (`__slots__`)
+indexados por id y por nombre. Vistas y template tags los usan en lugar de
+`select_related` o de consultas de opciones separadas. El registro se recarga
+solo cuando cambia la versión de alguna de esas tablas (ver `core.cache`).
+"""
+
+import sys
+
+from .cache import TableSnapshot
+from .models import Affiliation, Media, Region, Species, StarSystem
+
+
+class Record:
+    """Base de los registros: sin `__dict__`, solo los campos declarados."""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class SpeciesRecord(Record):
+    __slots__ = ("id", "name", "classification", "designation", "language")
+
+
+class FilmRecord(Record):
+    __slots__ = ("id", "title", "episode", "release_date")
+
+    @property
+    def name(self):
+        return self.title
+
+    @property
+    def release_year(self):
+        return self.release_date.year if self.release_date else None
+
+
+class StarSystemRecord(Record):
+    __slots__ = ("id", "name", "sector_id")
+
+
+class RegionRecord(Record):
+    __slots__ = ("id", "name")
+
+
+class AffiliationRecord(Record):
+    __slots__ = ("id", "name", "category")
+
+
+class RecordTable:
+    """Registros de un modelo indexados por id y por nombre (sin distinguir mayúsculas)."""
+
+    __slots__ = ("records", "by_id", "by_name")
+
+    def __init__(self, records):
+        self.records = tuple(records)
+        self.by_id = {record.id: record for record in self.records}
+        self.by_name = {record.name.casefold(): record for record in self.records}
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def named(self, name):
+        if not name:
+            return None
+        return self.by_name.get(name.casefold())
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+class ReferenceRegistry(TableSnapshot):
+    models = (Species, Media, StarSystem, Region, Affiliation)
+
+    def build(self):
+        # values_list evita instanciar modelos y traer los JSONField de Media.
+        return {
+            "species": RecordTable(
+                SpeciesRecord(*row)
+                for row in Species.objects.order_by("name").values_list(
+                    "id", "name", "classification", "designation", "language"
+                )
+            ),
+            "films": RecordTable(
+                FilmRecord(*row)
+                for row in Media.objects.filter(media_type=Media.FILM)
+                .order_by("episode", "release_date", "title")
+                .values_list("id", "title", "episode", "release_date")
+            ),
+            "systems": RecordTable(
+                StarSystemRecord(*row)
+                for row in StarSystem.objects.order_by("name").values_list("id", "name", "sector_id")
+            ),
+            "regions": RecordTable(
+                RegionRecord(*row) for row in Region.objects.order_by("name").values_list("id", "name")
+            ),
+            "affiliations": RecordTable(
+                AffiliationRecord(*row)
+                for row in Affiliation.objects.order_by("name").values_list("id", "name", "category")
+            ),
+        }
+
+    # Accesos rápidos --------------------------------------------------------
+    @property
+    def species(self) -> RecordTable:
+        return self.get()["species"]
+
+    @property
+    def films(self) -> RecordTable:
+        return self.get()["films"]
+
+    @property
+    def systems(self) -> RecordTable:
+        return self.get()["systems"]
+
+    @property
+    def regions(self) -> RecordTable:
+        return self.get()["regions"]
+
+    @property
+    def affiliations(self) -> RecordTable:
+        return self.get()["affiliations"]
+
+    def memory_usage(self) -> int:
+        """Bytes aproximados que ocupan registros e índices (sin contar los valores compartidos)."""
+        total = 0
+        for table in self.get().values():
+            total += sys.getsizeof(table.records) + sys.getsizeof(table.by_id) + sys.getsizeof(table.by_name)
+            total += sum(sys.getsizeof(record) for record in table.records)
+        return total
+
+
+registry = ReferenceRegistry()
@@ -0,0 +1,151 @@
+"""
+Utilidades para llamadas a servicios externos (el LLM del chatbot).
+
+- `SingleFlight` / `AsyncSingleFlight`: las llamadas idénticas en curso se
+  agrupan y comparten el resultado de una sola petición.
+- `CircuitBreaker`: tras varios fallos o respuestas lentas seguidas deja de
+  llamar al servicio durante un tiempo de enfriamiento.
+- `Deadline`: presupuesto de tiempo de una petición repartido entre pasos.
+"""
+
+import asyncio
+import threading
+import time
+
+
+class Deadline:
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap) -> float:
+        """Timeout para el siguiente paso: lo que quede del presupuesto, como mucho `cap`."""
+        return min(cap, self.remaining())
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave entre hilos."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, timeout=None):
+        """Ejecuta `fn()` o espera a quien ya la está ejecutando (None si se agota `timeout`)."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if not call.event.wait(timeout):
+                return None
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """Igual que `SingleFlight` para corrutinas de un mismo event loop."""
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, coro_fn, timeout=None):
+        # La llamada va en su propia tarea: si quien la lanzó se cancela
+        # (el cliente cierra la conexión), los demás siguen esperándola.
+        loop_key = (asyncio.get_running_loop(), key)
+        task = self._calls.get(loop_key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._calls[loop_key] = task
+            task.add_done_callback(lambda _: self._calls.pop(loop_key, None))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class CircuitBreaker:
+    """
+    Cerrado: las llamadas pasan. Con `failure_threshold` fallos o llamadas
+    lentas seguidas se abre y `allow()` devuelve False durante `cooldown`
+    segundos; después deja pasar una sola llamada de prueba (semiabierto) que
+    lo vuelve a cerrar o abrir.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, slow_call=5.0, cooldown=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = 0.0
+            self.short_circuits = 0
+            self._probing = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record(self, ok, elapsed=0.0):
+        """Anota el resultado de una llamada; las lentas cuentan como fallo."""
+        with self._lock:
+            self._probing = False
+            if ok and elapsed < self.slow_call:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        """La llamada no llegó a dar un resultado que juzgar (p. ej. se agotó el presupuesto de la petición)."""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "short_circuits": self.short_circuits}
@@ -0,0 +1,115 @@
+"""
+Lecturas del catálogo contra una conexión de solo lectura (`DB_READ_REPLICA=true`).
+
+La réplica es el alias `replica` de `DATABASES`: por defecto el mismo fichero
+abierto con `mode=ro` y `PRAGMA query_only` (ver `core.db`), o una copia que se
+sincronice aparte (`DB_REPLICA_PATH`). Las lecturas de las vistas no compiten
+por la conexión de las escrituras y no pueden escribir por error.
+
+`ReplicaRoutingMiddleware` decide por petición:
+
+- GET/HEAD de visitantes → los modelos de `core` se leen de la réplica.
+- POST y demás métodos, quien tiene sesión (staff en el admin o en
+  `crear_personaje`) o quien acaba de escribir (cookie `DB_PRIMARY_COOKIE`
+  durante `DB_REPLICA_PIN_SECONDS`) → todo contra `default`, así que ven lo
+  que acaban de guardar.
+
+Solo se miran las cookies: leer `request.user` cargaría la sesión y
+`cache_page_swr` añadiría `Vary: Cookie` a todas las páginas cacheadas.
+
+Fuera de una petición (comandos, shell, tests) todo va a `default`.
+"""
+
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+REPLICA_ALIAS = "replica"
+DB_PRIMARY_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_routing = contextvars.ContextVar("db_routing", default=None)
+
+
+class RoutingState:
+    __slots__ = ("replica", "wrote")
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    """Lecturas de `core` a la réplica cuando la petición lo permite; escrituras y migraciones a `default`."""
+
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        if state is not None and state.replica and model._meta.app_label == "core":
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state is not None and model._meta.app_label == "core":
+            # Desde aquí, y en sus próximas peticiones, este usuario lee de la primaria.
+            state.replica = False
+            state.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {"default", REPLICA_ALIAS} or None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return False if db == REPLICA_ALIAS else None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RoutingState(self._may_use_replica(request))
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = RoutingState(self._may_use_replica(request))
+        token = _routing.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, state)
+
+    @staticmethod
+    def _may_use_replica(request):
+        return (
+            request.method in SAFE_METHODS
+            and DB_PRIMARY_COOKIE not in request.COOKIES
+            and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        )
+
+    @staticmethod
+    def finish(response, state):
+        if state.wrote:
+            response.set_cookie(
+                DB_PRIMARY_COOKIE,
+                "1",
+                max_age=getattr(settings, "DB_REPLICA_PIN_SECONDS", 10),
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,53 @@
+"""
+Enumeración de las URLs públicas del catálogo en todos los idiomas.
+
+Lo usan los comandos que recorren la web entera (precalentado de caché,
+benchmarks...) para no duplicar la lista de rutas y sus modelos.
+"""
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import translation
+
+from .models import Affiliation, Character, Media, Planet, Species
+
+# (nombre de la ruta, modelo cuyo pk recibe o None si es un listado). Solo las
+# vistas con `cache_page_swr`: precalentar las demás es renderizar para nada
+# (los listados de personajes y planetas dependen de filtros y no se cachean).
+CATALOG_ROUTES = [
+    ("media", None),
+    ("media_detail", Media),
+    ("detalle_personaje", Character),
+    ("species_list", None),
+    ("species_detail", Species),
+    ("planet_detail", Planet),
+    ("affiliation_detail", Affiliation),
+]
+
+
+def language_codes():
+    return [code for code, _ in settings.LANGUAGES]
+
+
+def iter_catalog_urls(languages=None, route_names=None):
+    """Genera tuplas (nombre_ruta, path) para cada ficha y listado del catálogo."""
+    languages = languages or language_codes()
+    routes = [
+        (name, model)
+        for name, model in CATALOG_ROUTES
+        if not route_names or name in route_names
+    ]
+    ids = {
+        model: list(model.objects.order_by("pk").values_list("pk", flat=True))
+        for _, model in routes
+        if model is not None
+    }
+
+    for language in languages:
+        with translation.override(language):
+            for name, model in routes:
+                if model is None:
+                    yield name, reverse(name)
+                    continue
+                for pk in ids[model]:
+                    yield name, reverse(name, args=[pk])
@@ -0,0 +1,302 @@
+"""
+Búsqueda global sobre todo el catálogo con un índice invertido en la base de datos.
+
+Cada personaje, especie, planeta, película y afiliación tiene un
+`SearchDocument` (título y texto) y un `SearchPosting` por término con su
+frecuencia. Una consulta solo lee las filas de sus términos (índice por
+`term`), puntúa con BM25 (más peso si el término está en el título) y el último
+término se trata como prefijo para que "sky" encuentre "Skywalker".
+
+`core.signals` reindexa en cada escritura los documentos afectados (también
+los personajes cuando cambia su especie, planeta o afiliaciones) y
+`rebuild_index()` lo reconstruye entero (comando `rebuild_search_index`,
+llamado también al final de `load_data`, que usa `pause_indexing()` para no
+reindexar fila a fila durante la carga).
+"""
+
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Avg, Count, Q
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .autocomplete import DETAIL_ROUTES
+from .entity_index import normalize
+from .models import (
+    Affiliation,
+    Character,
+    CharacterAffiliation,
+    Media,
+    Planet,
+    PlanetSpecies,
+    SearchDocument,
+    SearchPosting,
+    Species,
+)
+from .semantic import tokenize
+
+KINDS = ("character", "species", "planet", "media", "affiliation")
+MODELS = {
+    "character": Character,
+    "species": Species,
+    "planet": Planet,
+    "media": Media,
+    "affiliation": Affiliation,
+}
+# Parámetros habituales de BM25 y bonus por término presente en el título.
+K1 = 1.2
+B = 0.75
+TITLE_BOOST = 2.0
+MIN_PREFIX = 2
+MAX_TERM_LENGTH = 60
+SNIPPET_WORDS = 30
+WORD_RE = re.compile(r"\w+")
+
+
+class SearchHit(NamedTuple):
+    kind: str
+    id: int
+    title: str
+    body: str
+    score: float
+    matched: int  # cuántos términos de la consulta contiene
+
+    @property
+    def url(self):
+        return reverse(DETAIL_ROUTES[self.kind], args=[self.id])
+
+
+class SearchResults(NamedTuple):
+    terms: frozenset  # términos del índice que han coincidido (para resaltar)
+    hits: list
+
+    def grouped(self):
+        """{kind: [hits]} en el orden de KINDS, solo con los tipos que tienen resultados."""
+        groups = defaultdict(list)
+        for hit in self.hits:
+            groups[hit.kind].append(hit)
+        return {kind: groups[kind] for kind in KINDS if groups[kind]}
+
+
+# ---------------------------------------------------------------------------
+# Documentos
+# ---------------------------------------------------------------------------
+def _join(*parts):
+    return " · ".join(str(part) for part in parts if part)
+
+
+def _filter(queryset, pks):
+    return queryset if pks is None else queryset.filter(pk__in=pks)
+
+
+def _character_documents(pks):
+    affiliations = defaultdict(list)
+    links = CharacterAffiliation.objects.all() if pks is None else CharacterAffiliation.objects.filter(character_id__in=pks)
+    for character_id, name in links.values_list("character_id", "affiliation__name"):
+        affiliations[character_id].append(name)
+    rows = _filter(Character.objects, pks).values_list(
+        "id", "name", "species__name", "homeworld__name", "gender", "eye_color", "hair_color", "skin_color", "cybernetics",
+    )
+    for pk, name, *details in rows:
+        yield pk, name, _join(*details, *affiliations[pk])
+
+
+def _species_documents(pks):
+    for pk, name, *details in _filter(Species.objects, pks).values_list("id", "name", "classification", "designation", "language"):
+        yield pk, name, _join(*details)
+
+
+def _planet_documents(pks):
+    natives = defaultdict(list)
+    links = PlanetSpecies.objects.all() if pks is None else PlanetSpecies.objects.filter(planet_id__in=pks)
+    for planet_id, name in links.values_list("planet_id", "species__name"):
+        natives[planet_id].append(name)
+    rows = _filter(Planet.objects, pks).values_list("id", "name", "climate", "terrain", "capital_city", "star_system__name")
+    for pk, name, *details in rows:
+        yield pk, name, _join(*details, *natives[pk])
+
+
+def _media_documents(pks):
+    rows = _filter(Media.objects, pks).values_list("id", "title", "media_type", "director", "producer", "opening_crawl")
+    for pk, title, *details in rows:
+        yield pk, title, _join(*details)
+
+
+def _affiliation_documents(pks):
+    for pk, name, category in _filter(Affiliation.objects, pks).values_list("id", "name", "category"):
+        yield pk, name, _join(category)
+
+
+SOURCES = {
+    "character": _character_documents,
+    "species": _species_documents,
+    "planet": _planet_documents,
+    "media": _media_documents,
+    "affiliation": _affiliation_documents,
+}
+
+
+def _terms(text):
+    return [term for term in tokenize(text) if len(term) <= MAX_TERM_LENGTH]
+
+
+def _postings(document, title, body):
+    title_terms = _terms(title)
+    counts = Counter(title_terms) + Counter(_terms(body))
+    in_title = set(title_terms)
+    document.length = sum(counts.values())
+    return [
+        SearchPosting(term=term, document=document, frequency=frequency, in_title=term in in_title)
+        for term, frequency in counts.items()
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Mantenimiento del índice
+# ---------------------------------------------------------------------------
+_local = threading.local()
+
+
+@contextmanager
+def pause_indexing():
+    """Desactiva el reindexado por señales en este hilo (cargas masivas que acaban en `rebuild_index()`)."""
+    previous = indexing_paused()
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = previous
+
+
+def indexing_paused() -> bool:
+    return getattr(_local, "paused", False)
+
+
+def _delete_documents(documents):
+    # Borrado directo sin Collector: un DELETE por tabla, sin cargar los
+    # postings para resolver la cascada.
+    postings = SearchPosting.objects.filter(document__in=documents)
+    postings._raw_delete(postings.db)
+    documents._raw_delete(documents.db)
+
+
+@transaction.atomic
+def index_documents(kind, pks=None):
+    """(Re)indexa los objetos `pks` de un tipo (todos si es None); devuelve cuántos."""
+    rows = list(SOURCES[kind](pks))
+    stale = SearchDocument.objects.filter(kind=kind)
+    if pks is not None:
+        stale = stale.filter(object_id__in=pks)
+    _delete_documents(stale)
+
+    documents = [SearchDocument(kind=kind, object_id=pk, title=title[:200], body=body) for pk, title, body in rows]
+    postings = [posting for document, (_, title, body) in zip(documents, rows) for posting in _postings(document, title, body)]
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+    SearchPosting.objects.bulk_create(postings, batch_size=2000)
+    return len(documents)
+
+
+def remove_documents(kind, pks):
+    _delete_documents(SearchDocument.objects.filter(kind=kind, object_id__in=pks))
+
+
+@transaction.atomic
+def rebuild_index():
+    """Reconstruye el índice completo; devuelve {kind: documentos}."""
+    _delete_documents(SearchDocument.objects.all())
+    return {kind: index_documents(kind) for kind in KINDS}
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+def _matching_postings(words):
+    exact, prefix = words[:-1], words[-1]
+    condition = Q(term__in=exact) | Q(term=prefix)
+    if len(prefix) >= MIN_PREFIX:
+        # Rango en vez de LIKE: aprovecha el índice por `term` en cualquier backend.
+        condition |= Q(term__gte=prefix, term__lt=prefix + "\U0010ffff")
+    return SearchPosting.objects.filter(condition).values_list("term", "document_id", "frequency", "in_title")
+
+
+def search(text, kinds=None):
+    """Todos los documentos que contienen algún término de `text`, ordenados por relevancia."""
+    words = list(dict.fromkeys(_terms(text)))
+    if not words:
+        return SearchResults(frozenset(), [])
+
+    postings = list(_matching_postings(words))
+    if not postings:
+        return SearchResults(frozenset(), [])
+
+    stats = SearchDocument.objects.aggregate(total=Count("id"), avg_length=Avg("length"))
+    total, avg_length = stats["total"], stats["avg_length"] or 1.0
+    document_frequency = Counter(term for term, _, _, _ in postings)
+    document_ids = {document_id for _, document_id, _, _ in postings}
+    documents = SearchDocument.objects.filter(pk__in=document_ids)
+    if kinds is not None:
+        documents = documents.filter(kind__in=kinds)
+    documents = {
+        pk: (kind, object_id, title, body, length)
+        for pk, kind, object_id, title, body, length in documents.values_list("id", "kind", "object_id", "title", "body", "length")
+    }
+
+    scores = defaultdict(float)
+    matched = defaultdict(set)
+    last = words[-1]
+    for term, document_id, frequency, in_title in postings:
+        if document_id not in documents:
+            continue
+        length = documents[document_id][4]
+        df = document_frequency[term]
+        idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+        tf = frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / avg_length))
+        # El bonus del título no depende de la longitud: una ficha con mucho
+        # texto no debe quedar por debajo de otra que solo lo menciona.
+        scores[document_id] += idf * (tf + (TITLE_BOOST if in_title else 0.0))
+        # Los términos que solo encajan como prefijo cuentan como el último de la consulta.
+        matched[document_id].add(term if term in words else last)
+
+    hits = [
+        SearchHit(kind, object_id, title, body, round(scores[pk], 3), len(matched[pk]))
+        for pk, (kind, object_id, title, body, _) in documents.items()
+    ]
+    # Primero los que contienen más términos de la consulta y luego por BM25.
+    hits.sort(key=lambda hit: (-hit.matched, -hit.score, hit.title))
+    return SearchResults(frozenset(term for term, _, _, _ in postings), hits)
+
+
+def highlight(text, terms, words=None):
+    """HTML escapado de `text` con <mark> en las palabras del índice; recorta a `words` palabras alrededor de la primera."""
+    if not text:
+        return ""
+    spans = [match.span() for match in WORD_RE.finditer(text)]
+    marked = [i for i, (start, end) in enumerate(spans) if normalize(text[start:end]) in terms]
+
+    start_char, end_char = 0, len(text)
+    if words is not None and len(spans) > words:
+        first = max(0, (marked[0] if marked else 0) - words // 3)
+        last = min(len(spans), first + words)
+        first = max(0, last - words)
+        start_char = spans[first][0] if first else 0
+        end_char = spans[last - 1][1] if last < len(spans) else len(text)
+
+    parts, cursor = [], start_char
+    for i in marked:
+        start, end = spans[i]
+        if start < start_char or end > end_char:
+            continue
+        parts.append(escape(text[cursor:start]))
+        parts.append(f"<mark>{escape(text[start:end])}</mark>")
+        cursor = end
+    parts.append(escape(text[cursor:end_char]))
+    prefix = "… " if start_char > 0 else ""
+    suffix = " …" if end_char < len(text) else ""
+    return mark_safe(prefix + "".join(parts) + suffix)
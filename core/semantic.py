@@ -0,0 +1,270 @@
+"""
+Búsqueda semántica local sobre el texto del catálogo (TF-IDF con NumPy).
+
+Cada personaje, especie, planeta, película y afiliación es un documento con
+sus atributos (clima y terreno, afiliaciones, películas, `opening_crawl`...).
+El índice es una matriz TF-IDF dispersa en formato CSC (por término: ids de
+documento y pesos ya normalizados), así que una consulta solo recorre las
+columnas de sus términos y la similitud coseno sale de una suma vectorizada.
+
+Las matrices se guardan en `SEMANTIC_INDEX_DIR` y se abren con `mmap_mode`:
+varios procesos comparten las mismas páginas y un reinicio no reconstruye
+nada si el catálogo no cambió. Al cambiar los datos solo se vuelven a
+tokenizar los documentos cuyo texto es distinto; el resto reutiliza los
+conteos guardados.
+"""
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+from django.conf import settings
+
+from .cache import TableSnapshot
+from .entity_index import normalize
+from .llm_cache import STOPWORDS
+from .models import (
+    Affiliation,
+    Appearance,
+    Character,
+    CharacterAffiliation,
+    Media,
+    Planet,
+    PlanetSpecies,
+    Species,
+    StarSystem,
+)
+
+ARRAYS = ("indptr", "indices", "weights", "idf")
+MIN_SCORE = 0.2
+# Versiones que se quedan en disco: otro proceso puede estar abriendo una anterior.
+KEEP_VERSIONS = 3
+
+
+class SemanticHit(NamedTuple):
+    kind: str  # character, species, planet, media o affiliation
+    id: int
+    name: str
+    score: float
+
+
+def tokenize(text):
+    return [word for word in normalize(text).split() if len(word) > 1 and word not in STOPWORDS]
+
+
+def _join(*parts):
+    return " ".join(str(part) for part in parts if part)
+
+
+def catalog_documents():
+    """Genera (clave, nombre, texto) para cada entidad del catálogo."""
+    affiliations = defaultdict(list)
+    for character_id, name in CharacterAffiliation.objects.values_list("character_id", "affiliation__name"):
+        affiliations[character_id].append(name)
+    films = defaultdict(list)
+    for character_id, title in Appearance.objects.values_list("character_id", "media__title"):
+        films[character_id].append(title)
+    natives = defaultdict(list)
+    for planet_id, name in PlanetSpecies.objects.values_list("planet_id", "species__name"):
+        natives[planet_id].append(name)
+
+    characters = Character.objects.values_list(
+        "id", "name", "species__name", "homeworld__name", "homeworld__climate", "homeworld__terrain",
+        "gender", "eye_color", "hair_color", "skin_color", "cybernetics",
+    )
+    for pk, name, species, homeworld, climate, terrain, *details in characters:
+        text = _join(name, name, species, homeworld, climate, terrain, *details, *affiliations[pk], *films[pk])
+        yield f"character:{pk}", name, text
+
+    for pk, name, *details in Species.objects.values_list("id", "name", "classification", "designation", "language"):
+        yield f"species:{pk}", name, _join(name, name, *details)
+
+    planets = Planet.objects.values_list("id", "name", "climate", "terrain", "capital_city", "star_system__name")
+    for pk, name, *details in planets:
+        yield f"planet:{pk}", name, _join(name, name, *details, *natives[pk])
+
+    media = Media.objects.values_list("id", "title", "media_type", "director", "producer", "opening_crawl")
+    for pk, title, *details in media:
+        yield f"media:{pk}", title, _join(title, title, *details)
+
+    for pk, name, category in Affiliation.objects.values_list("id", "name", "category"):
+        yield f"affiliation:{pk}", name, _join(name, name, category)
+
+
+def _mtime(path):
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0
+
+
+def _touch(path):
+    # Marca la versión como en uso para que `_prune` no la borre pronto.
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+class _SemanticData:
+    def __init__(self, path, meta, arrays):
+        self.path = path
+        self.docs = meta["docs"]  # [[clave, nombre], ...] en el orden de las filas
+        self.vocabulary = {term: column for column, term in enumerate(meta["vocabulary"])}
+        self.indptr, self.indices, self.weights, self.idf = (arrays[name] for name in ARRAYS)
+        self.kinds = np.array([key.split(":", 1)[0] for key, _ in self.docs]) if self.docs else np.array([])
+
+
+class SemanticIndex(TableSnapshot):
+    models = (Character, Species, Planet, Media, Affiliation, CharacterAffiliation, Appearance, StarSystem, PlanetSpecies)
+
+    def __init__(self, directory=None):
+        super().__init__()
+        self._directory = directory
+        self.last_build = {}
+
+    @property
+    def directory(self) -> Path:
+        return Path(self._directory or settings.SEMANTIC_INDEX_DIR)
+
+    # Construcción ----------------------------------------------------------
+    def build(self):
+        documents = list(catalog_documents())
+        hashes = [hashlib.md5(text.encode()).hexdigest() for _, _, text in documents]
+        fingerprint = hashlib.md5(
+            "\n".join(f"{key} {digest}" for (key, _, _), digest in zip(documents, hashes)).encode()
+        ).hexdigest()
+
+        target = self.directory / fingerprint
+        if (target / "meta.json").exists():
+            _touch(target)
+            self.last_build = {"documents": len(documents), "tokenized": 0, "from_disk": True}
+            return self._load(target)
+
+        # Conteos de la versión anterior para no tokenizar lo que no cambió.
+        previous = self._previous_counts()
+        counts, tokenized = [], 0
+        for (key, _, text), digest in zip(documents, hashes):
+            stored = previous.get(key)
+            if stored and stored[0] == digest:
+                counts.append(stored[1])
+            else:
+                counts.append(dict(Counter(tokenize(text))))
+                tokenized += 1
+
+        self._write(target, documents, hashes, counts)
+        self.last_build = {"documents": len(documents), "tokenized": tokenized, "from_disk": False}
+        return self._load(target)
+
+    def _previous_counts(self):
+        current = self.directory / "CURRENT"
+        try:
+            path = self.directory / current.read_text().strip() / "counts.json"
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, target, documents, hashes, counts):
+        vocabulary = sorted({term for doc in counts for term in doc})
+        columns = {term: column for column, term in enumerate(vocabulary)}
+        n_docs = len(documents)
+
+        # Tripletas (término, documento, tf) y de ahí la matriz CSC ordenando por término.
+        term_ids = np.fromiter((columns[t] for doc in counts for t in doc), dtype=np.int32)
+        doc_ids = np.fromiter((row for row, doc in enumerate(counts) for _ in doc), dtype=np.int32)
+        tf = np.fromiter((c for doc in counts for c in doc.values()), dtype=np.float32)
+
+        df = np.bincount(term_ids, minlength=len(vocabulary)).astype(np.float32)
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        weights = (1 + np.log(tf)) * idf[term_ids]
+        # Normalización L2 por documento: el coseno queda en un producto escalar.
+        norms = np.sqrt(np.bincount(doc_ids, weights=weights**2, minlength=n_docs)).astype(np.float32)
+        weights = weights / np.where(norms > 0, norms, 1)[doc_ids]
+
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=indptr[1:])
+        arrays = {
+            "indptr": indptr,
+            "indices": doc_ids[order],
+            "weights": weights[order].astype(np.float32),
+            "idf": idf,
+        }
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(dir=self.directory, prefix=".build-"))
+        for name, array in arrays.items():
+            np.save(tmp / f"{name}.npy", array)
+        meta = {"docs": [[key, name] for key, name, _ in documents], "vocabulary": vocabulary}
+        (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False))
+        (tmp / "counts.json").write_text(
+            json.dumps({key: [digest, doc] for (key, _, _), digest, doc in zip(documents, hashes, counts)}, ensure_ascii=False)
+        )
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # Otro proceso ya escribió esta misma versión.
+            shutil.rmtree(tmp, ignore_errors=True)
+        current_tmp = self.directory / f".CURRENT-{os.getpid()}"
+        current_tmp.write_text(target.name)
+        os.replace(current_tmp, self.directory / "CURRENT")
+        self._prune(keep=target.name)
+
+    def _prune(self, keep):
+        """Borra las versiones viejas menos las `KEEP_VERSIONS` usadas más recientemente."""
+        versions = [
+            path for path in self.directory.iterdir()
+            if path.is_dir() and path.name != keep and not path.name.startswith(".")
+        ]
+        versions.sort(key=_mtime, reverse=True)
+        for path in versions[KEEP_VERSIONS - 1:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _load(self, path):
+        meta = json.loads((path / "meta.json").read_text())
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        return _SemanticData(path, meta, arrays)
+
+    # Búsqueda --------------------------------------------------------------
+    def search(self, text, k=5, kinds=None, min_score=MIN_SCORE):
+        """Los `k` documentos más parecidos a `text` (coseno TF-IDF >= `min_score`)."""
+        data = self.get()
+        query = Counter(token for token in tokenize(text) if token in data.vocabulary)
+        if not query or not data.docs:
+            return []
+
+        scores = np.zeros(len(data.docs), dtype=np.float32)
+        query_norm = 0.0
+        for term, count in query.items():
+            column = data.vocabulary[term]
+            weight = (1 + math.log(count)) * float(data.idf[column])
+            query_norm += weight * weight
+            start, end = data.indptr[column], data.indptr[column + 1]
+            # Cada documento aparece una sola vez por columna: la suma indexada es segura.
+            scores[data.indices[start:end]] += data.weights[start:end] * weight
+        scores /= math.sqrt(query_norm)
+        if kinds is not None:
+            scores[~np.isin(data.kinds, list(kinds))] = 0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        hits = []
+        for row in top:
+            score = float(scores[row])
+            if score < min_score:
+                break
+            key, name = data.docs[row]
+            kind, pk = key.split(":", 1)
+            hits.append(SemanticHit(kind, int(pk), name, round(score, 3)))
+        return hits
+
+
+semantic_index = SemanticIndex()
@@ -0,0 +1,209 @@
+"""
+Receptores de señales de la app `core`.
+
+Cada escritura sobre un modelo del catálogo cambia la versión de su tabla para
+que `core.cache.cached_queryset` deje de servir resultados antiguos, y los
+cambios en personajes y vínculos mantienen los contadores de `core.counters`
+y el índice de búsqueda de `core.search`. También instala en cada conexión a
+la base de datos el contador de consultas de `core.perf` y los PRAGMAs de
+SQLite de `core.db`.
+
+Todos los receptores de modelos se conectan con `sender` (al final del
+módulo): uno de pre/post_delete o m2m_changed sin `sender` impide a Django
+borrar en bloque cualquier modelo del proyecto (sesiones, auth, admin...).
+"""
+
+from django.apps import apps
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from . import db, perf, search
+from .cache import bump_table_versions
+from .counters import TRACKED_FIELDS, refresh_counters, tracked_values
+from .models import (
+    Affiliation, Character, CharacterAffiliation, Planet, PlanetSpecies, SearchDocument, SearchPosting, Species, StarSystem,
+)
+
+
+connection_created.connect(perf.install_db_wrapper, dispatch_uid="core.perf.install_db_wrapper")
+connection_created.connect(db.apply_sqlite_pragmas, dispatch_uid="core.db.apply_sqlite_pragmas")
+
+# El índice de búsqueda se escribe con bulk_create y borrados directos: sin señales.
+CORE_MODELS = [
+    model for model in apps.get_app_config("core").get_models(include_auto_created=True)
+    if model not in (SearchDocument, SearchPosting)
+]
+# Modelos intermedios de los ManyToMany: el `sender` de m2m_changed.
+THROUGH_MODELS = list(dict.fromkeys(
+    field.remote_field.through for model in CORE_MODELS for field in model._meta.local_many_to_many
+))
+
+
+def bump_versions_on_write(sender, **kwargs):
+    bump_table_versions(sender._meta.db_table)
+
+
+def bump_versions_on_m2m_change(sender, action, **kwargs):
+    # `sender` es el modelo intermedio (Appearance, CharacterAffiliation...).
+    if action.startswith("post_"):
+        bump_table_versions(sender._meta.db_table)
+
+
+# ---------------------------------------------------------------------------
+# Contadores desnormalizados (ver core.counters)
+# ---------------------------------------------------------------------------
+def remember_counter_fks(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    fks = [fk for fk, _ in TRACKED_FIELDS[sender]]
+    if update_fields is not None and not any(fk in update_fields for fk in fks):
+        return
+    previous = sender.objects.filter(pk=instance.pk).values(*[f"{fk}_id" for fk in fks]).first()
+    if previous:
+        instance._counter_previous = {
+            target: previous[f"{fk}_id"] for fk, target in TRACKED_FIELDS[sender]
+        }
+
+
+def update_counters_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = instance.__dict__.pop("_counter_previous", {})
+    for target, pk in tracked_values(instance).items():
+        if created:
+            refresh_counters(target, {pk})
+        elif target in previous and previous[target] != pk:
+            refresh_counters(target, {pk, previous[target]})
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    for target, pk in tracked_values(instance).items():
+        refresh_counters(target, {pk})
+
+
+def update_counters_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # El contador vive en el lado Media/Affiliation de la relación.
+    target = TRACKED_FIELDS[sender][0][1]
+    if action == "pre_clear" and not reverse:
+        field = sender._meta.get_field(TRACKED_FIELDS[sender][0][0])
+        instance._counter_cleared = set(
+            sender.objects.filter(character=instance).values_list(field.attname, flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        refresh_counters(target, {instance.pk})
+    elif action == "post_clear":
+        refresh_counters(target, getattr(instance, "_counter_cleared", set()))
+    else:
+        refresh_counters(target, pk_set or set())
+
+
+# ---------------------------------------------------------------------------
+# Índice de búsqueda global (ver core.search)
+# ---------------------------------------------------------------------------
+SEARCH_KINDS = {model: kind for kind, model in search.MODELS.items()}
+
+
+def _search_dependents(instance):
+    """{kind: pks} de los documentos que incluyen el nombre de `instance` en su texto."""
+    if isinstance(instance, Species):
+        return {
+            "character": set(Character.objects.filter(species=instance).values_list("pk", flat=True)),
+            "planet": set(PlanetSpecies.objects.filter(species=instance).values_list("planet_id", flat=True)),
+        }
+    if isinstance(instance, Planet):
+        return {"character": set(Character.objects.filter(homeworld=instance).values_list("pk", flat=True))}
+    if isinstance(instance, Affiliation):
+        return {"character": set(instance.members.values_list("pk", flat=True))}
+    if isinstance(instance, StarSystem):
+        return {"planet": set(instance.planets.values_list("pk", flat=True))}
+    if isinstance(instance, CharacterAffiliation):
+        return {"character": {instance.character_id}}
+    if isinstance(instance, PlanetSpecies):
+        return {"planet": {instance.planet_id}}
+    return {}
+
+
+def _reindex(dependents):
+    for kind, pks in dependents.items():
+        if pks:
+            search.index_documents(kind, pks)
+
+
+def update_search_index_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw or search.indexing_paused():
+        return
+    kind = SEARCH_KINDS.get(sender)
+    if kind:
+        search.index_documents(kind, [instance.pk])
+    if kind is None or not created:
+        # Un alta aún no aparece en el texto de nadie; un cambio de nombre sí.
+        _reindex(_search_dependents(instance))
+
+
+def remember_search_dependents(sender, instance, **kwargs):
+    # Después del borrado los FK ya están a NULL: hay que mirarlo antes.
+    if not search.indexing_paused():
+        instance._search_dependents = _search_dependents(instance)
+
+
+def update_search_index_on_delete(sender, instance, **kwargs):
+    if search.indexing_paused():
+        return
+    kind = SEARCH_KINDS.get(sender)
+    if kind:
+        search.remove_documents(kind, [instance.pk])
+    dependents = instance.__dict__.pop("_search_dependents", None)
+    _reindex(dependents if dependents is not None else _search_dependents(instance))
+
+
+# Vínculos ManyToMany que aparecen en el texto de un documento: modelo
+# intermedio → (FK del dueño del documento, que es también su kind; FK del otro lado).
+SEARCH_LINKS = {CharacterAffiliation: ("character", "affiliation"), PlanetSpecies: ("planet", "species")}
+
+
+def update_search_index_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """`luke.affiliations.add(rebels)`, `rebels.members.clear()`...: el texto del personaje o planeta cambia."""
+    if search.indexing_paused():
+        return
+    owner, other = SEARCH_LINKS[sender]
+    if action == "pre_clear" and reverse:
+        # Tras el clear ya no se sabe a quién pertenecían los vínculos.
+        instance._search_cleared = set(
+            sender.objects.filter(**{other: instance}).values_list(f"{owner}_id", flat=True)
+        )
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        pks = {instance.pk}
+    elif action == "post_clear":
+        pks = instance.__dict__.pop("_search_cleared", set())
+    else:
+        pks = pk_set or set()
+    _reindex({owner: pks})
+
+
+# ---------------------------------------------------------------------------
+# Conexiones, siempre con `sender`
+# ---------------------------------------------------------------------------
+def _connect(signal, receiver, models):
+    for model in models:
+        signal.connect(receiver, sender=model, dispatch_uid=f"core.signals.{receiver.__name__}")
+
+
+_connect(post_save, bump_versions_on_write, CORE_MODELS)
+_connect(post_delete, bump_versions_on_write, CORE_MODELS)
+_connect(m2m_changed, bump_versions_on_m2m_change, THROUGH_MODELS)
+
+_connect(pre_save, remember_counter_fks, TRACKED_FIELDS)
+_connect(post_save, update_counters_on_save, TRACKED_FIELDS)
+_connect(post_delete, update_counters_on_delete, TRACKED_FIELDS)
+_connect(m2m_changed, update_counters_on_m2m_change, [model for model in THROUGH_MODELS if model in TRACKED_FIELDS])
+
+_connect(post_save, update_search_index_on_save, CORE_MODELS)
+_connect(pre_delete, remember_search_dependents, (Species, Planet, Affiliation, StarSystem))
+_connect(post_delete, update_search_index_on_delete, CORE_MODELS)
+_connect(m2m_changed, update_search_index_on_m2m_change, SEARCH_LINKS)
@@ -0,0 +1,23 @@
+"""Filtros que resuelven ids de tablas de referencia usando `core.registry`."""
+
+from django import template
+
+from core.registry import registry
+
+register = template.Library()
+
+
+@register.filter
+def species_record(species_id):
+    """`{{ personaje.species_id|species_record }}` → registro con id y name (o None)."""
+    return registry.species.get(species_id) if species_id else None
+
+
+@register.filter
+def system_record(system_id):
+    return registry.systems.get(system_id) if system_id else None
+
+
+@register.filter
+def film_record(media_id):
+    return registry.films.get(media_id) if media_id else None
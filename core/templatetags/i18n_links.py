@@ -0,0 +1,13 @@
+"""Enlaces a la página actual en otro idioma (selector de idioma del header)."""
+
+from django import template
+from django.urls import translate_url
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def translated_url(context, language):
+    """`{% translated_url "en" %}` → la URL actual (con su query string) bajo el prefijo de `language`."""
+    request = context["request"]
+    return translate_url(request.get_full_path(), language)
@@ -1,10 +1,53 @@
+import asyncio
+import json
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
 from unittest.mock import patch
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.messages import INFO
+from django.contrib.messages.storage.base import Message
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
 from django.core.management import call_command
-from django.test import TestCase
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import translation
 
-from .models import Character, Species
+from . import chatbot
+from .autocomplete import prefix_index
+from .benchmark import compare, run_benchmark, seed_catalog
+from .db import current_pragmas
+from .cache import cache_page_swr, cached_queryset, get_cache_stats, reset_snapshots
+from .models import Affiliation, Appearance, Character, Media, Planet, PlanetInquiry, SearchDocument, Species
+from .entity_index import AhoCorasick, entity_index
+from .facets import bitset_ids, character_facets, to_bitset
+from .fake_openai import run_in_thread
+from .fuzzy import fuzzy_index
+from . import inquiry_queue
+from .loadtest import Targets, parse_mix, run_load
+from .llm_cache import LLMReplyCache, llm_cache, normalize_query
+from .metrics import MetricsRegistry, metrics_registry
+from .registry import SpeciesRecord, registry
+from .perf import QueryBudgetExceeded
+from .profiling import make_token
+from .query_plans import SNAPSHOT_PATH, QueryCollector, advise, hot_query_signatures, plan_regressions
+from .resilience import CircuitBreaker
+from .routes import iter_catalog_urls
+from .routers import DB_PRIMARY_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .search import search
+from .semantic import KEEP_VERSIONS, SemanticHit, SemanticIndex
 
 
 class LoadDataCommandTests(TestCase):
@@ -22,3 +65,1103 @@ class LoadDataCommandTests(TestCase):
 
         second_counts = (Character.objects.count(), Species.objects.count())
         self.assertEqual(first_counts, second_counts)
+
+
+class CachePageSWRTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        self.factory = RequestFactory()
+
+    def _view(self, request):
+        self.calls += 1
+        return HttpResponse(f"render {self.calls}")
+
+    def test_second_request_is_served_from_cache(self):
+        """La segunda petición reutiliza la respuesta sin ejecutar la vista."""
+        view = cache_page_swr(60, beta=0, stats_name="test-hit")(self._view)
+        first = view(self.factory.get("/media/"))
+        second = view(self.factory.get("/media/"))
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, b"render 1")
+
+    def test_expired_entry_served_stale_while_other_request_rebuilds(self):
+        """Con la entrada caducada y el candado cogido se sirve la copia antigua."""
+        stats = get_cache_stats("test-stale")
+        stats.reset()
+        view = cache_page_swr(60, beta=0, stats_name="test-stale")(self._view)
+        view(self.factory.get("/media/"))
+
+        later = time.time() + 61
+        with patch("core.cache.time.time", return_value=later):
+            # Simula otra petición que ya está regenerando la página.
+            with patch.object(cache, "add", return_value=False):
+                stale = view(self.factory.get("/media/"))
+            fresh = view(self.factory.get("/media/"))
+
+        self.assertEqual(stale["X-Cache"], "STALE")
+        self.assertEqual(stale.content, b"render 1")
+        self.assertEqual(fresh["X-Cache"], "MISS")
+        self.assertEqual(fresh.content, b"render 2")
+        self.assertEqual(stats.snapshot()["stale"], 1)
+        self.assertEqual(stats.snapshot()["misses"], 2)
+
+    def test_two_clients_share_page_without_each_others_csrf(self):
+        """Un visitante no recibe el token CSRF ni las cookies de otro."""
+        Species.objects.create(name="Wookiee")
+        with translation.override("es"):
+            url = reverse("species_list")
+        first = self.client.get(url)
+        second = Client().get(url)
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        for response in (first, second):
+            self.assertNotIn("csrftoken", response.cookies)
+            self.assertNotIn(b"csrfmiddlewaretoken", response.content)
+
+    def test_responses_with_csrf_token_are_not_stored(self):
+        """Si la vista usa el token CSRF la respuesta es de ese usuario y no se guarda."""
+        def view(request):
+            self.calls += 1
+            return HttpResponse(get_token(request))
+
+        view = cache_page_swr(60, beta=0, stats_name="test-csrf")(view)
+        first = view(self.factory.get("/media/"))
+        second = view(self.factory.get("/media/"))
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(second["X-Cache"], "MISS")
+        self.assertNotEqual(first.content, second.content)
+
+
+class WarmCacheCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        species = Species.objects.create(name="Wookiee")
+        self.character = Character.objects.create(name="Chewbacca", species=species)
+        Media.objects.create(title="A New Hope", episode=4)
+
+    def test_warm_cache_fills_page_cache_in_every_language(self):
+        """Tras precalentar, las fichas se sirven desde caché en ambos idiomas."""
+        out = StringIO()
+        call_command("warm_cache", "--workers", "1", "--host", "testserver", stdout=out)
+
+        self.assertIn("detalle_personaje", out.getvalue())
+        for language in ("es", "en"):
+            with translation.override(language):
+                url = reverse("detalle_personaje", args=[self.character.pk])
+            response = self.client.get(url, secure=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_only_cached_routes_are_warmed(self):
+        """Todas las rutas que recorre warm_cache pasan por cache_page_swr."""
+        for name, path in iter_catalog_urls(["es"]):
+            with self.subTest(name=name):
+                self.assertTrue(getattr(resolve(path).func, "cache_page_swr", False))
+
+    def test_load_data_forwards_warm_base_url(self):
+        """`load_data --warm-cache --warm-base-url` precalienta el servidor indicado."""
+        skip = ("--skip-akabab", "--skip-planets", "--skip-swapi", "--warm-cache")
+        with patch("core.management.commands.load_data.call_command") as warm:
+            call_command("load_data", *skip, "--warm-base-url", "http://127.0.0.1:8000", stdout=StringIO())
+        warm.assert_called_once()
+        self.assertEqual(warm.call_args.args, ("warm_cache", "--base-url", "http://127.0.0.1:8000"))
+
+        # Sin servidor y con LocMemCache no tiene sentido precalentar este proceso.
+        out = StringIO()
+        with patch("core.management.commands.load_data.call_command") as warm:
+            call_command("load_data", *skip, stdout=out)
+        warm.assert_not_called()
+        self.assertIn("--warm-base-url", out.getvalue())
+
+
+class CachedQuerysetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Species.objects.create(name="Ewok")
+
+    def test_result_reused_until_table_is_written(self):
+        """La consulta se sirve de caché y se invalida al escribir en su tabla."""
+        queryset = Species.objects.order_by("name").values_list("name", flat=True)
+        self.assertEqual(cached_queryset(queryset), ["Ewok"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_queryset(queryset.all()), ["Ewok"])
+
+        Species.objects.create(name="Droid")
+        self.assertEqual(cached_queryset(queryset.all()), ["Droid", "Ewok"])
+
+    def test_joined_tables_invalidate_the_entry(self):
+        """Un cambio en una tabla del JOIN también invalida el resultado."""
+        queryset = Species.objects.filter(character__isnull=False).distinct()
+        self.assertEqual(cached_queryset(queryset), [])
+
+        Character.objects.create(name="Wicket", species=Species.objects.get(name="Ewok"))
+        self.assertEqual([s.name for s in cached_queryset(queryset.all())], ["Ewok"])
+
+    def test_snapshots_see_versions_bumped_by_another_process(self):
+        """Una escritura de otro proceso (p. ej. load_data) invalida los snapshots de este."""
+        reset_snapshots()
+        with patch.object(registry, "check_interval", 0):
+            before = registry.get()
+            self.assertIs(registry.get(), before)
+
+            script = "import django; django.setup(); from core.cache import bump_table_versions; bump_table_versions('core_species')"
+            env = {**os.environ, "DJANGO_SETTINGS_MODULE": "swsite.settings", "TABLE_VERSIONS_DIR": str(settings.TABLE_VERSIONS_DIR)}
+            subprocess.run([sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, check=True)
+            self.assertIsNot(registry.get(), before)
+
+            # Red de seguridad: pasado max_age se reconstruye aunque nadie avise.
+            rebuilt = registry.get()
+            with patch.object(registry, "max_age", 0):
+                self.assertIsNot(registry.get(), rebuilt)
+
+
+class ReferenceRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        Species.objects.create(name="Hutt", language="Huttese")
+        Media.objects.create(title="Return of the Jedi", episode=6)
+
+    def test_lookups_by_id_and_name_without_queries(self):
+        """Tras la primera carga las búsquedas no tocan la base de datos."""
+        registry.get()
+        hutt = Species.objects.get(name="Hutt")
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.species.get(hutt.pk).language, "Huttese")
+            self.assertIs(registry.species.named("hutt"), registry.species.get(hutt.pk))
+            self.assertEqual([film.title for film in registry.films], ["Return of the Jedi"])
+
+    def test_refreshes_when_table_version_changes(self):
+        """Una escritura en una tabla de referencia fuerza la recarga perezosa."""
+        self.assertIsNone(registry.species.named("Gungan"))
+        Species.objects.create(name="Gungan")
+        self.assertIsNotNone(registry.species.named("Gungan"))
+
+    def test_records_are_compact(self):
+        """Los registros usan __slots__ y el registro completo ocupa poco."""
+        record = registry.species.named("Hutt")
+        self.assertIsInstance(record, SpeciesRecord)
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertLess(registry.memory_usage(), 4096)
+
+
+class CounterCacheTests(TestCase):
+    def setUp(self):
+        self.human = Species.objects.create(name="Human")
+        self.tatooine = Planet.objects.create(name="Tatooine")
+        self.luke = Character.objects.create(name="Luke", species=self.human, homeworld=self.tatooine)
+
+    def assertCounts(self, species, residents):
+        self.human.refresh_from_db()
+        self.tatooine.refresh_from_db()
+        self.assertEqual(self.human.character_count, species)
+        self.assertEqual(self.tatooine.resident_count, residents)
+
+    def test_character_changes_update_species_and_planet_counts(self):
+        """Crear, reasignar y borrar personajes mantiene los contadores."""
+        self.assertCounts(species=1, residents=1)
+
+        droid = Species.objects.create(name="Droid")
+        self.luke.species = droid
+        self.luke.save()
+        self.assertCounts(species=0, residents=1)
+
+        self.luke.delete()
+        droid.refresh_from_db()
+        self.assertEqual(droid.character_count, 0)
+        self.assertCounts(species=0, residents=0)
+
+    def test_link_changes_update_cast_and_member_counts(self):
+        """Las relaciones M2M actualizan reparto y miembros en ambos sentidos."""
+        film = Media.objects.create(title="A New Hope", episode=4)
+        rebels = Affiliation.objects.create(name="Rebel Alliance")
+
+        self.luke.films_and_series.add(film)
+        rebels.members.add(self.luke)
+        film.refresh_from_db()
+        rebels.refresh_from_db()
+        self.assertEqual((film.cast_size, rebels.member_count), (1, 1))
+
+        self.luke.affiliations.clear()
+        self.luke.delete()
+        film.refresh_from_db()
+        rebels.refresh_from_db()
+        self.assertEqual((film.cast_size, rebels.member_count), (0, 0))
+
+    def test_receivers_do_not_block_fast_deletes_elsewhere(self):
+        """Los receptores van por modelo: sesiones y log del admin se borran en bloque."""
+        from django.contrib.admin.models import LogEntry
+        from django.contrib.sessions.models import Session
+        from django.db.models.deletion import Collector
+
+        collector = Collector("default")
+        self.assertTrue(collector.can_fast_delete(Session.objects.all()))
+        self.assertTrue(collector.can_fast_delete(LogEntry.objects.all()))
+        self.assertFalse(collector.can_fast_delete(Character.objects.all()))
+
+
+class EntityIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        jedi = Species.objects.create(name="Yoda's species")
+        self.yoda = Character.objects.create(name="Yoda", species=jedi)
+        self.luke = Character.objects.create(name="Luke Skywalker")
+        self.film = Media.objects.create(title="The Empire Strikes Back", episode=5)
+        self.luke.films_and_series.add(self.film)
+
+    def test_automaton_reports_every_occurrence(self):
+        automaton = AhoCorasick(["he", "she", "hers"])
+        matches = sorted((start, end) for start, end, _ in automaton.iter_matches("ushers"))
+        self.assertEqual(matches, [(1, 4), (2, 4), (2, 6)])
+
+    def test_finds_mentions_in_free_text(self):
+        """Encuentra nombres completos dentro de una frase, sin tildes ni mayúsculas."""
+        self.assertEqual(entity_index.find_character("¿Quién es YODA?")["name"], "Yoda")
+        self.assertEqual(entity_index.find_character("sky")["name"], "Luke Skywalker")
+        self.assertEqual(entity_index.find_media("vi the empire strikes back ayer")["name"], self.film.title)
+        self.assertIsNone(entity_index.find_character("odalisca"))
+
+    def test_chatbot_match_served_without_queries(self):
+        """Con el índice cargado, una coincidencia del chatbot no toca la BD."""
+        entity_index.get()
+        with translation.override("es"):
+            url = reverse("chatbot_search")
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"q": "háblame de luke skywalker"})
+        data = response.json()
+        self.assertEqual(data["name"], "Luke Skywalker")
+        self.assertEqual(data["film"], self.film.title)
+
+
+class FuzzyIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        for name in ("Luke Skywalker", "Obi-Wan Kenobi", "Jar Jar Binks", "Darth Vader", "Darth Maul"):
+            Character.objects.create(name=name)
+
+    def test_typos_and_variants_rank_the_expected_character_first(self):
+        for query, expected in (
+            ("skywaker", "Luke Skywalker"),
+            ("Obi Wan", "Obi-Wan Kenobi"),
+            ("Jar-Jar", "Jar Jar Binks"),
+            ("who is darth vadr", "Darth Vader"),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(fuzzy_index.search(query)[0].name, expected)
+        self.assertEqual(fuzzy_index.search("capital of france"), [])
+
+    def test_character_list_falls_back_to_fuzzy_matches(self):
+        """Si la búsqueda literal no encuentra nada, se muestran nombres parecidos."""
+        with translation.override("es"):
+            url = reverse("characters")
+        response = self.client.get(url, {"q": "skywaker"})
+        self.assertTrue(response.context["fuzzy_used"])
+        self.assertEqual([p.name for p in response.context["personajes"]], ["Luke Skywalker"])
+
+
+# Los tests que llegan al paso semántico del chatbot escriben sus matrices aquí.
+TEST_SEMANTIC_DIR = tempfile.mkdtemp(prefix="sw-semantic-")
+
+
+def tearDownModule():
+    shutil.rmtree(TEST_SEMANTIC_DIR, ignore_errors=True)
+
+
+@override_settings(LLM_CACHE_PATH=":memory:", SEMANTIC_INDEX_DIR=TEST_SEMANTIC_DIR)
+class AsyncChatBotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        Character.objects.create(name="Luke Skywalker")
+        llm_cache.clear()
+        chatbot.llm_breaker.reset()
+        self.server, self.stop_server = run_in_thread(delay=0)
+        self.addCleanup(self.stop_server)
+        env = {"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": self.server.base_url}
+        patcher = patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with translation.override("es"):
+            self.url = reverse("chatbot_search_async")
+
+    async def test_local_match_does_not_call_the_llm(self):
+        response = await self.async_client.get(self.url, {"q": "luke"})
+        self.assertEqual(response.json()["name"], "Luke Skywalker")
+        self.assertEqual(self.server.requests, 0)
+
+    async def test_unknown_query_is_answered_by_the_llm(self):
+        """Sin coincidencia local, la respuesta llega del servidor OpenAI (falso) vía httpx."""
+        response = await self.async_client.get(self.url, {"q": "qué es la fuerza"})
+        self.assertEqual(response.json(), {"reply": "Respuesta simulada para: qué es la fuerza"})
+        self.assertEqual(self.server.requests, 1)
+
+    async def test_repeated_question_in_another_language_uses_the_reply_cache(self):
+        for query in ("who is the chosen one?", "¿Quién es el Chosen One?"):
+            response = await self.async_client.get(self.url, {"q": query})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.server.requests, 1)
+
+
+    async def test_identical_concurrent_questions_share_one_llm_call(self):
+        self.server.delay = 0.2
+        responses = await asyncio.gather(
+            *(self.async_client.get(self.url, {"q": "qué es la fuerza"}) for _ in range(5))
+        )
+        self.assertEqual({r.json()["reply"] for r in responses}, {"Respuesta simulada para: qué es la fuerza"})
+        self.assertEqual(self.server.requests, 1)
+
+    async def test_latency_budget_caps_the_llm_wait(self):
+        """Si el LLM no responde dentro del presupuesto se contesta el fallback (sin culpar al upstream)."""
+        self.server.delay = 2
+        started = time.monotonic()
+        with patch.object(chatbot, "LATENCY_BUDGET", 0.7):
+            response = await self.async_client.get(self.url, {"q": "qué es la fuerza"})
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(response.json(), chatbot.fallback_payload())
+        self.assertEqual(chatbot.llm_breaker.state, CircuitBreaker.CLOSED)
+
+
+class CircuitBreakerTests(TestCase):
+    def test_opens_after_failures_and_probes_after_cooldown(self):
+        breaker = CircuitBreaker("test", failure_threshold=2, slow_call=1.0, cooldown=60)
+        breaker.record(False)
+        breaker.record(True, elapsed=3.0)  # lenta: cuenta como fallo
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.snapshot()["short_circuits"], 1)
+
+        breaker.cooldown = 0
+        self.assertTrue(breaker.allow())  # una única llamada de prueba
+        self.assertFalse(breaker.allow())
+        breaker.record(True, elapsed=0.1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+
+class LLMReplyCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        self.yoda = Character.objects.create(name="Yoda")
+        self.cache = LLMReplyCache(path=":memory:", ttl=60, max_entries=2)
+        self.cache.stats.reset()
+
+    def test_query_normalization_is_language_agnostic(self):
+        self.assertEqual(normalize_query("Who is Yoda?"), "yoda")
+        self.assertEqual(normalize_query("¿quién es YODA?"), "yoda")
+        self.assertEqual(normalize_query("qué es la fuerza"), "fuerza")
+
+    def test_query_normalization_keeps_order_and_negations(self):
+        """El orden y las negaciones cambian la pregunta: no comparten respuesta."""
+        self.assertNotEqual(normalize_query("is vader luke's father"), normalize_query("is luke vader's father"))
+        self.assertNotEqual(normalize_query("¿es yoda un jedi?"), normalize_query("¿no es yoda un jedi?"))
+        self.assertEqual(normalize_query("is yoda not a jedi"), "yoda not jedi")
+
+    def test_lru_eviction_and_entity_revalidation(self):
+        self.cache.set("who is yoda", "m", {"name": "Yoda", "body": "Maestro jedi."})
+        self.cache.set("the force", "m", {"name": "", "body": "Un campo de energía."})
+        self.assertEqual(self.cache.get("quién es yoda", "m")["body"], "Maestro jedi.")
+        self.assertIsNone(self.cache.get("quién es yoda", "otro-modelo"))
+
+        # "force" es la menos usada: sale al superar max_entries.
+        self.cache.set("midichlorians", "m", {"name": "", "body": "Organismos."})
+        self.assertIsNone(self.cache.get("the force", "m"))
+        self.assertEqual(len(self.cache), 2)
+
+        # Renombrado en el catálogo: la respuesta guardada deja de ser válida.
+        self.yoda.name = "Grand Master"
+        self.yoda.save()
+        self.assertIsNone(self.cache.get("who is yoda", "m"))
+
+        # La descartada cuenta una sola vez, como "stale", y baja el ratio de aciertos.
+        stats = self.cache.stats.snapshot()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stale"]), (1, 2, 1))
+        self.assertEqual(stats["hit_ratio"], 0.25)
+
+
+@override_settings(LLM_CACHE_PATH=":memory:", SEMANTIC_INDEX_DIR=TEST_SEMANTIC_DIR)
+class ChatBotStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        llm_cache.clear()
+        chatbot.llm_breaker.reset()
+        Character.objects.create(name="Luke Skywalker")
+        self.server, stop_server = run_in_thread(delay=0)
+        self.server.token_delay = 0
+        self.addCleanup(stop_server)
+        patcher = patch.dict(os.environ, {"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": self.server.base_url})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with translation.override("es"):
+            self.url = reverse("chatbot_stream")
+
+    @staticmethod
+    def events(content):
+        return [block.split("\n")[0].removeprefix("event: ") for block in content.split("\n\n") if block.startswith("event:")]
+
+    def test_local_match_is_the_first_event(self):
+        response = self.client.get(self.url, {"q": "luke"})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        content = b"".join(response.streaming_content).decode()
+        self.assertTrue(content.startswith("event: match\n"))
+        self.assertIn('"name": "Luke Skywalker"', content)
+        self.assertEqual(self.server.requests, 0)
+
+    async def test_llm_tokens_are_streamed_under_asgi(self):
+        response = await self.async_client.get(self.url, {"q": "qué es la fuerza"})
+        content = "".join([chunk.decode() async for chunk in response.streaming_content])
+        events = self.events(content)
+        self.assertEqual(events[-1], "done")
+        self.assertEqual(set(events[:-1]), {"token"})
+        self.assertGreater(len(events), 3)
+        self.assertIn('"text": " fuerza"', content)
+
+    def test_streamed_reply_is_cached_with_the_entity_it_names(self):
+        """Lo que se guarda de un stream lleva el nombre de la ficha, para revalidarla al leer."""
+        query = "háblame de Luke Skywalker"
+        body = "".join(chatbot.stream_gpt_reply(query, chatbot.Deadline(chatbot.LATENCY_BUDGET)))
+        self.assertIn("Luke Skywalker", body)
+        model = chatbot.llm_request(query)[1]["model"]
+        self.assertEqual(llm_cache.get(query, model), {"name": "Luke Skywalker", "body": body})
+
+    async def test_stream_cut_by_deadline_is_neither_cached_nor_a_success(self):
+        """Si se agota el presupuesto a mitad, la respuesta truncada no se guarda."""
+        self.server.token_delay = 0.2
+        query = "qué es la fuerza"
+        with patch.object(chatbot.llm_breaker, "record") as record:
+            body = "".join([text async for text in chatbot.astream_gpt_reply(query, chatbot.Deadline(0.7))])
+        self.assertTrue(body)
+        self.assertNotIn("fuerza", body)
+        cached = await sync_to_async(llm_cache.get)(query, chatbot.llm_request(query)[1]["model"])
+        self.assertIsNone(cached)
+        self.assertFalse(any(call.args[0] for call in record.call_args_list))
+
+    def test_concurrent_streams_of_the_same_question_share_one_call(self):
+        """Dos preguntas equivalentes a la vez: una sola llamada a OpenAI y el mismo texto."""
+        self.server.delay = 0.3
+        entity_index.get()  # los hilos no deben tocar la base de datos del test
+        bodies = []
+
+        def ask(query):
+            bodies.append("".join(chatbot.stream_gpt_reply(query, chatbot.Deadline(chatbot.LATENCY_BUDGET))))
+
+        threads = [threading.Thread(target=ask, args=(query,)) for query in ("qué es la fuerza", "¿Qué es la Fuerza?")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(len(bodies), 2)
+        self.assertEqual(len(set(bodies)), 1)
+        self.assertIn("fuerza", bodies[0])
+
+
+@override_settings(SEMANTIC_INDEX_DIR=TEST_SEMANTIC_DIR)
+class SemanticIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.tatooine = Planet.objects.create(name="Tatooine", climate="arid", terrain="desert, twin suns")
+        Planet.objects.create(name="Hoth", climate="frozen", terrain="tundra, ice caves")
+        Character.objects.create(name="Owen Lars", homeworld=self.tatooine)
+
+    def test_top_k_cosine_search(self):
+        hits = SemanticIndex(self.directory).search("arid desert with twin suns", k=2)
+        self.assertEqual([(hit.kind, hit.name) for hit in hits], [("planet", "Tatooine"), ("character", "Owen Lars")])
+        self.assertEqual(SemanticIndex(self.directory).search("ice caves")[0].name, "Hoth")
+
+    def test_reuses_disk_matrices_and_retokenizes_only_changed_documents(self):
+        SemanticIndex(self.directory).get()
+        restarted = SemanticIndex(self.directory)
+        restarted.get()
+        self.assertEqual(restarted.last_build, {"documents": 3, "tokenized": 0, "from_disk": True})
+
+        Planet.objects.filter(name="Hoth").update(climate="temperate")
+        restarted.invalidate()
+        restarted.get()
+        self.assertEqual(restarted.last_build["tokenized"], 1)
+        self.assertEqual(restarted.search("temperate")[0].name, "Hoth")
+
+    def test_prune_keeps_the_most_recent_versions(self):
+        index = SemanticIndex(self.directory)
+        index.get()
+        first = index.get().path
+        for number in range(KEEP_VERSIONS + 1):
+            Planet.objects.filter(name="Hoth").update(climate=f"frozen {number}")
+            index.invalidate()
+            index.get()
+        versions = [path for path in Path(self.directory).iterdir() if path.is_dir()]
+        self.assertEqual(len(versions), KEEP_VERSIONS)
+        self.assertIn(index.get().path, versions)
+        self.assertNotIn(first, versions)
+
+    def test_chatbot_answers_descriptions_without_llm(self):
+        with translation.override("es"):
+            url = reverse("chatbot_search")
+            response = self.client.get(url, {"q": "frozen tundra with ice caves"})
+        self.assertEqual(response.json()["name"], "Hoth")
+        self.assertEqual(response.json()["kind"], "planet")
+
+    def test_character_hit_missing_from_entity_index_falls_back_to_link(self):
+        """Un personaje que el índice de entidades aún no tiene no rompe la respuesta."""
+        hit = SemanticHit("character", 999999, "Beru Lars", 0.9)
+        with translation.override("es"):
+            payload = chatbot.semantic_payload(hit)
+            url = reverse("detalle_personaje", args=[999999])
+        self.assertEqual(payload["name"], "Beru Lars")
+        self.assertEqual(payload["detail_url"], url)
+
+
+@override_settings(LLM_CACHE_PATH=":memory:", SEMANTIC_INDEX_DIR=TEST_SEMANTIC_DIR)
+class ChatBotBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        llm_cache.clear()
+        chatbot.llm_breaker.reset()
+        Character.objects.create(name="Luke Skywalker")
+        self.server, stop_server = run_in_thread(delay=0.3)
+        self.addCleanup(stop_server)
+        patcher = patch.dict(os.environ, {"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": self.server.base_url})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        with translation.override("es"):
+            self.url = reverse("chatbot_batch")
+        self.client.force_login(User.objects.create(username="qa", is_staff=True))
+
+    def post(self, data, client=None):
+        return (client or self.client).post(self.url, json.dumps(data), content_type="application/json")
+
+    def test_results_keep_order_and_llm_calls_run_concurrently(self):
+        queries = ["qué es la fuerza", "luke", "qué es un sable láser", "¿Qué es la fuerza?"]
+        started = time.monotonic()
+        results = self.post({"queries": queries}).json()["results"]
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([r["query"] for r in results], queries)
+        self.assertEqual(results[1]["name"], "Luke Skywalker")
+        self.assertEqual(results[0]["reply"], results[3]["reply"])
+        # Dos preguntas distintas para el LLM (la 1ª y la 4ª son la misma), a la vez.
+        self.assertEqual(self.server.requests, 2)
+        self.assertLess(elapsed, 0.55)
+
+    def test_rejects_invalid_batches(self):
+        self.assertEqual(self.post({"queries": "luke"}).status_code, 400)
+        self.assertEqual(self.post({"queries": ["luke"] * 51}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_rejects_anonymous_and_cross_site_posts(self):
+        """Sin sesión de staff o sin token CSRF no se llega a OpenAI."""
+        self.assertEqual(self.post({"queries": ["qué es la fuerza"]}, client=Client()).status_code, 403)
+        cross_site = Client(enforce_csrf_checks=True)
+        cross_site.force_login(User.objects.get(username="qa"))
+        self.assertEqual(self.post({"queries": ["qué es la fuerza"]}, client=cross_site).status_code, 403)
+        self.assertEqual(self.server.requests, 0)
+
+    @override_settings(CHATBOT_BATCH_RATE=3)
+    def test_questions_per_minute_are_throttled(self):
+        self.assertEqual(self.post({"queries": ["luke", "luke"]}).status_code, 200)
+        response = self.post({"queries": ["luke", "luke"]})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "60")
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        film = Media.objects.create(title="A New Hope")
+        self.luke = Character.objects.create(name="Luke Skywalker")
+        Character.objects.create(name="Anakin Skywalker")
+        Character.objects.create(name="Shmi Skywalker")
+        Appearance.objects.create(character=self.luke, media=film)
+        Planet.objects.create(name="Skye")
+
+    def test_word_prefixes_ranked_by_name_start_and_popularity(self):
+        names = [s.name for s in prefix_index.complete("sky")]
+        self.assertEqual(names[:2], ["Skye", "Luke Skywalker"])
+        self.assertEqual(set(names[2:]), {"Anakin Skywalker", "Shmi Skywalker"})
+
+        Character.objects.create(name="Skywalker Junior")
+        self.assertEqual(prefix_index.complete("skyw")[0].name, "Skywalker Junior")
+
+    def test_endpoint_filters_by_kind(self):
+        with translation.override("es"):
+            url = reverse("autocomplete")
+            response = self.client.get(url, {"q": "Sky", "kinds": "character", "limit": 2})
+            detail = reverse("detalle_personaje", args=[self.luke.pk])
+        self.assertEqual(response["Cache-Control"], "max-age=60")
+        results = response.json()["results"]
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0], {"kind": "character", "id": self.luke.pk, "name": "Luke Skywalker", "url": detail})
+
+
+class GlobalSearchTests(TestCase):
+    def setUp(self):
+        self.tatooine = Planet.objects.create(name="Tatooine", climate="arid", terrain="desert")
+        self.luke = Character.objects.create(name="Luke Skywalker", homeworld=self.tatooine)
+        Media.objects.create(title="A New Hope", opening_crawl="Rebel spaceships have won their first victory against the evil Galactic Empire.")
+        Affiliation.objects.create(name="Galactic Empire")
+
+    def test_signals_keep_the_index_up_to_date(self):
+        self.assertEqual([hit.title for hit in search("desert").hits], ["Tatooine"])
+        self.assertEqual([hit.title for hit in search("tatoo").hits], ["Tatooine", "Luke Skywalker"])
+
+        self.tatooine.name = "Tatooine Prime"
+        self.tatooine.save()
+        luke = search("prime", kinds=["character"]).hits[0]
+        self.assertIn("Tatooine Prime", luke.body)
+
+        self.luke.delete()
+        self.assertFalse(SearchDocument.objects.filter(kind="character").exists())
+
+    def test_m2m_links_reindex_both_directions(self):
+        """Añadir o quitar afiliaciones y especies nativas cambia el texto indexado."""
+        def body(obj):
+            return SearchDocument.objects.get(kind=obj._meta.model_name, object_id=obj.pk).body
+
+        rebels = Affiliation.objects.create(name="Rebel Alliance")
+        self.luke.affiliations.add(rebels)
+        self.assertIn("Rebel Alliance", body(self.luke))
+        rebels.members.remove(self.luke)
+        self.assertNotIn("Rebel Alliance", body(self.luke))
+        rebels.members.add(self.luke)
+        rebels.members.clear()
+        self.assertNotIn("Rebel Alliance", body(self.luke))
+
+        jawa = Species.objects.create(name="Jawa")
+        jawa.homeworlds.add(self.tatooine)
+        self.assertIn("Jawa", body(self.tatooine))
+        self.tatooine.native_species.clear()
+        self.assertNotIn("Jawa", body(self.tatooine))
+
+    def test_api_groups_highlights_and_paginates(self):
+        SearchDocument.objects.all().delete()
+        call_command("rebuild_search_index", stdout=StringIO())
+        with translation.override("es"):
+            url = reverse("search_api")
+            response = self.client.get(url, {"q": "galactic empire"})
+            page = self.client.get(url, {"q": "galactic", "type": "media", "page": 1})
+
+        groups = {group["kind"]: group for group in response.json()["groups"]}
+        self.assertEqual(list(groups), ["media", "affiliation"])
+        self.assertEqual(groups["affiliation"]["results"][0]["title"], "<mark>Galactic</mark> <mark>Empire</mark>")
+        self.assertIn("the evil <mark>Galactic</mark> <mark>Empire</mark>.", groups["media"]["results"][0]["snippet"])
+        self.assertEqual([group["kind"] for group in page.json()["groups"]], ["media"])
+        self.assertEqual(page.json()["groups"][0]["num_pages"], 1)
+
+
+class CharacterFacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        self.human = Species.objects.create(name="Human")
+        self.droid = Species.objects.create(name="Droid")
+        self.film = Media.objects.create(title="A New Hope", episode=4)
+        self.luke = Character.objects.create(name="Luke Skywalker", species=self.human, gender="Male")
+        self.leia = Character.objects.create(name="Leia Organa", species=self.human, gender="female")
+        self.r2 = Character.objects.create(name="R2-D2", species=self.droid)
+        for character in (self.luke, self.r2):
+            Appearance.objects.create(character=character, media=self.film)
+
+    def test_bitsets_round_trip(self):
+        self.assertEqual(bitset_ids(to_bitset([130, 3, 64])), [3, 64, 130])
+        self.assertEqual(to_bitset([]), 0)
+
+    def test_counts_ignore_the_facet_own_filter(self):
+        result = character_facets.query({"species": [self.human.pk], "media": [self.film.pk]})
+        self.assertEqual(result.ids, [self.luke.pk])
+        # Especies contadas solo con el filtro de película, y al revés.
+        self.assertEqual(result.counts["species"], {self.human.pk: 1, self.droid.pk: 1})
+        self.assertEqual(result.counts["media"], {self.film.pk: 1})
+        self.assertEqual(result.counts["gender"], {"male": 1})
+
+    def test_writes_rebuild_only_the_affected_table(self):
+        columns = character_facets.columns.get()
+        Appearance.objects.create(character=self.leia, media=self.film)
+        self.assertEqual(character_facets.query({"media": [self.film.pk]}).total, 3)
+        self.assertIs(character_facets.columns.get(), columns)
+
+        with translation.override("es"):
+            response = self.client.get(reverse("characters"), {"media": self.film.pk, "gender": "Female"})
+        self.assertEqual([c.name for c in response.context["personajes"]], ["Leia Organa"])
+        species = next(f for f in response.context["facet_options"] if f["name"] == "species")
+        self.assertEqual([(c["label"], c["count"]) for c in species["choices"]], [("Human", 1)])
+
+    def test_listing_filters_in_sql_instead_of_passing_ids(self):
+        for number in range(50):
+            Character.objects.create(name=f"Clone {number}", species=self.human, gender="male")
+        with translation.override("es"):
+            response = self.client.get(reverse("characters"), {"species": self.human.pk, "q": "o"})
+        personajes = response.context["personajes"]
+        self.assertEqual(len(personajes), 51)
+        # Solo los valores de los filtros, no los 51 ids.
+        self.assertLess(len(personajes.query.sql_with_params()[1]), 10)
+
+
+@override_settings(LLM_CACHE_PATH=":memory:", SEMANTIC_INDEX_DIR=TEST_SEMANTIC_DIR)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_snapshots()
+        for number in range(5):
+            species = Species.objects.create(name=f"Species {number}")
+            Character.objects.create(name=f"Character {number}", species=species, image_url="https://example.com/a.png")
+        with translation.override("es"):
+            self.home = reverse("home")
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs("core.perf", level="INFO") as logs:
+            response = self.client.get(self.home)
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="4 queries \(0 rebuild\)", tpl;dur=[\d.]+')
+        line = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((line["route"], line["status"], line["db_queries"]), ("home", 200, 4))
+        self.assertGreater(line["template_ms"], 0)
+
+    def test_query_budget_is_enforced(self):
+        # La home no crece con el nº de especies; con el bucle N+1 de antes pasaría de 6.
+        self.assertEqual(self.client.get(self.home).status_code, 200)
+        with override_settings(PERF_QUERY_BUDGETS={"home": 3}), self.assertLogs("core.perf", level="WARNING"):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.home)
+
+    def test_outbound_llm_calls_from_batch_threads_are_counted(self):
+        llm_cache.clear()
+        chatbot.llm_breaker.reset()
+        server, stop_server = run_in_thread(delay=0.05)
+        self.addCleanup(stop_server)
+        self.client.force_login(User.objects.create(username="qa", is_staff=True))
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "fake", "OPENAI_BASE_URL": server.base_url}), translation.override("es"):
+            response = self.client.post(
+                reverse("chatbot_batch"), json.dumps({"queries": ["qué es la fuerza", "qué es un sable láser"]}),
+                content_type="application/json",
+            )
+        self.assertIn('desc="2 calls"', response["Server-Timing"])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_processes_are_merged(self):
+        # Dos registros con su propio fichero, como dos workers.
+        first, second = MetricsRegistry(self.directory), MetricsRegistry(self.directory)
+        first.inc("chatbot_replies_total", outcome="local")
+        second.inc("chatbot_replies_total", 2, outcome="local")
+        first.observe("request_db_queries", 3, route="home")
+        second.observe("request_db_queries", 30, route="home")
+        first.flush()
+        second.flush()
+        text = MetricsRegistry(self.directory).render()
+        self.assertIn('swsite_chatbot_replies_total{outcome="local"} 3', text)
+        self.assertIn('swsite_request_db_queries_bucket{route="home",le="5"} 1', text)
+        self.assertIn('swsite_request_db_queries_bucket{route="home",le="50"} 2', text)
+        self.assertIn('swsite_request_db_queries_count{route="home"} 2', text)
+
+    def test_endpoint_exposes_requests_and_cache_ratio(self):
+        with override_settings(METRICS_DIR=self.directory, METRICS_TOKEN="s3cret"), translation.override("es"):
+            metrics_registry.clear()
+            get_cache_stats("test-metrics").incr("misses")  # alguna caché con consultas, corra solo o no
+            self.client.get(reverse("home"))
+            self.client.get(reverse("home"))
+            response = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        text = response.content.decode()
+        self.assertIn('swsite_requests_total{method="GET",route="home",status="200"} 2', text)
+        self.assertIn('swsite_request_duration_seconds_count{route="home"} 2', text)
+        self.assertIn("# TYPE swsite_cache_hit_ratio gauge", text)
+
+    def test_dead_process_files_are_folded_into_the_aggregate(self):
+        """Los ficheros de procesos terminados se suman a aggregate.json y desaparecen."""
+        dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+        pid = int(dead.stdout)
+        for number in range(3):
+            state = {"counters": [["chatbot_replies_total", {"outcome": "llm"}, 2]], "histograms": [], "gauges": [], "caches": {}}
+            Path(self.directory, f"{pid}-{number:08x}.json").write_text(json.dumps(state))
+        live = MetricsRegistry(self.directory)
+        live.inc("chatbot_replies_total", outcome="llm")
+
+        text = live.render()
+        self.assertIn('swsite_chatbot_replies_total{outcome="llm"} 7', text)
+        self.assertEqual({path.name for path in Path(self.directory).glob("*.json")}, {"aggregate.json", live._file})
+        self.assertEqual(text, live.render())
+
+    def test_endpoint_requires_token_or_internal_ip_in_debug(self):
+        with override_settings(METRICS_DIR=self.directory):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 403)
+            # Sin token y sin DEBUG, ni siquiera 127.0.0.1 (un proxy local).
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="127.0.0.1").status_code, 403)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="127.0.0.1").status_code, 200)
+            with override_settings(METRICS_TOKEN="s3cret"):
+                self.assertEqual(self.client.get("/metrics").status_code, 403)
+                response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret", REMOTE_ADDR="10.1.2.3")
+                self.assertEqual(response.status_code, 200)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        with translation.override("es"):
+            self.url = reverse("species_list")
+
+    def test_signed_header_saves_cpu_and_memory_profile(self):
+        with override_settings(PROFILE_DIR=self.directory):
+            response = self.client.get(self.url, HTTP_X_PROFILE=make_token("memory"))
+            profile_id = response["X-Profile-Id"]
+            self.assertIn("-species_list-", profile_id)
+            meta = json.loads((Path(self.directory) / f"{profile_id}.json").read_text())
+            self.assertEqual((meta["route"], meta["mode"], meta["status"]), ("species_list", "memory", 200))
+            self.assertTrue(meta["allocations"])
+
+            out = StringIO()
+            call_command("profiles", show="latest", top=5, stdout=out)
+            self.assertIn("Funciones (cumulative)", out.getvalue())
+            self.assertIn("Reservas de memoria", out.getvalue())
+
+    def test_unsigned_or_unsampled_requests_are_not_profiled(self):
+        with override_settings(PROFILE_DIR=self.directory, PROFILE_SAMPLE_RATE=0):
+            self.assertNotIn("X-Profile-Id", self.client.get(self.url))
+            self.assertNotIn("X-Profile-Id", self.client.get(self.url, HTTP_X_PROFILE="memory"))
+        with override_settings(PROFILE_DIR=self.directory, PROFILE_SAMPLE_RATE=1.0):
+            self.assertIn("X-Profile-Id", self.client.get(self.url))
+
+
+class ViewBenchmarkTests(TestCase):
+    def test_every_named_route_is_benchmarked(self):
+        from . import urls
+
+        user = seed_catalog(40)
+        results = run_benchmark(user, repeat=1, languages=["es"])
+        routes = {key.split(":")[1] for key in results}
+        self.assertEqual(routes, {pattern.name for pattern in urls.urlpatterns})
+        for key, measures in results.items():
+            self.assertLess(measures["status"], 400, key)
+        self.assertEqual(results["es:home:default"]["queries"], 4)
+
+    def test_regressions_against_baseline(self):
+        baseline = {"es:home:default": {"p50_ms": 8.0, "p95_ms": 10.0, "queries": 4, "bytes": 100}}
+        noise = {"es:home:default": {"p50_ms": 9.0, "p95_ms": 14.0, "queries": 4, "bytes": 100}}
+        self.assertEqual(compare(noise, baseline), [])
+        slower = {"es:home:default": {"p50_ms": 20.0, "p95_ms": 25.0, "queries": 5, "bytes": 100}}
+        self.assertEqual([r.metric for r in compare(slower, baseline)], ["queries", "p50_ms", "p95_ms"])
+
+
+class LoadTestTests(TestCase):
+    def setUp(self):
+        species = Species.objects.create(name="Wookiee")
+        Planet.objects.create(name="Kashyyyk", climate="tropical")
+        Character.objects.create(name="Chewbacca", species=species)
+
+    def test_sqlite_lock_becomes_503(self):
+        from django.db import OperationalError
+
+        with patch("core.views.HomeView.get_context_data", side_effect=OperationalError("database is locked")), \
+                translation.override("es"), self.assertLogs("core.middleware", level="WARNING"):
+            response = self.client.get(reverse("home"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual((response["Retry-After"], response["X-DB-Lock-Timeout"]), ("1", "1"))
+
+    def test_run_load_counts_statuses_and_lock_timeouts(self):
+        import httpx
+
+        seen = []
+
+        def handler(request):
+            seen.append((request.method, request.url.path))
+            if request.method == "POST":
+                self.assertEqual(request.headers["X-CSRFToken"], "tok")
+                return httpx.Response(503, headers={"X-DB-Lock-Timeout": "1"})
+            return httpx.Response(200, text='<input name="csrfmiddlewaretoken" value="tok">')
+
+        targets = Targets.load("es")
+        # Sin el OpenAI falso no se pregunta nada al LLM de verdad.
+        self.assertNotIn("chatbot_llm", parse_mix(""))
+        self.assertEqual(parse_mix("", llm=True)["chatbot_llm"], 2)
+        self.assertNotIn("chatbot_llm", parse_mix("chatbot_llm=0", llm=True))
+        with self.assertRaises(ValueError):
+            parse_mix("chatbot_llm=1")
+        with self.assertRaises(ValueError):
+            parse_mix("nope=1")
+        mix = {"home": 1, "inquiry_post": 1}
+        stats = asyncio.run(run_load("http://loadtest", targets, mix, concurrency=3, duration=0.2, seed=1, transport=httpx.MockTransport(handler)))
+        summary = stats.summary()
+        self.assertEqual(summary["requests"], summary["statuses"][200] + summary["statuses"][503])
+        self.assertEqual(summary["lock_timeouts"], summary["statuses"][503])
+        self.assertGreater(summary["lock_timeouts"], 0)
+        self.assertEqual(seen[0], ("GET", targets.urls["planets"]))
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_keep_their_indexes(self):
+        snapshot = json.loads(SNAPSHOT_PATH.read_text())
+        self.assertEqual(plan_regressions(hot_query_signatures(), snapshot), {})
+        worse = {**snapshot, "film_list": {"indexes": [], "scans": ["core_media"], "temp_btree": True}}
+        self.assertEqual(len(plan_regressions(worse, snapshot)["film_list"]), 3)
+
+    def test_advise_flags_scan_and_suggests_index(self):
+        Planet.objects.bulk_create(Planet(name=f"P{i:03d}", terrain="desert" if i % 2 else "ocean") for i in range(50))
+        collector = QueryCollector()
+        with collector.capture("test"):
+            list(Planet.objects.filter(terrain="desert").order_by("name"))
+            list(Planet.objects.filter(pk=1))
+        findings = advise(collector.queries.values(), min_rows=10)
+        self.assertEqual(len(findings), 1)
+        self.assertTrue(findings[0].problems[0].startswith("SCAN core_planet"))
+        self.assertEqual(findings[0].suggestions, ["Planet: models.Index(fields=['terrain', 'name'])"])
+        self.assertEqual(advise(collector.queries.values(), min_rows=100), [])
+
+
+class SQLiteProfileTests(TestCase):
+    def test_production_pragmas_let_readers_through_a_write(self):
+        import sqlite3
+
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        pragmas = {"busy_timeout": 0, "journal_mode": "WAL", "synchronous": "NORMAL", "temp_store": "MEMORY"}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(SQLITE_PRAGMAS=pragmas):
+            path = str(Path(tmp) / "db.sqlite3")
+            reader = DatabaseWrapper({**connection.settings_dict, "NAME": path}, alias="wal")
+            try:
+                with reader.cursor() as cursor:
+                    cursor.execute("CREATE TABLE t (x INTEGER)")
+                    cursor.execute("INSERT INTO t VALUES (1)")
+                self.assertEqual(current_pragmas(reader), {"busy_timeout": 0, "journal_mode": "wal", "synchronous": 1, "temp_store": 2})
+                writer = sqlite3.connect(path)
+                writer.execute("BEGIN EXCLUSIVE")
+                writer.execute("INSERT INTO t VALUES (2)")
+                # En modo WAL la lectura no espera al escritor (con busy_timeout=0 fallaría al instante).
+                with reader.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM t")
+                    self.assertEqual(cursor.fetchone()[0], 1)
+                writer.rollback()
+                writer.close()
+            finally:
+                reader.close()
+
+    def test_default_profile_leaves_sqlite_untouched(self):
+        self.assertNotEqual(current_pragmas(names=["journal_mode"])["journal_mode"], "wal")
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+
+    def route(self, method="get", cookies=None, write=False):
+        """(alias de lectura de Character y de User, respuesta) dentro del middleware."""
+        from django.contrib.auth.models import User
+
+        seen = {}
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Character)
+            seen["character"] = self.router.db_for_read(Character)
+            seen["user"] = self.router.db_for_read(User)
+            return HttpResponse("ok")
+
+        request = getattr(RequestFactory(), method)("/es/planets/")
+        request.COOKIES.update(cookies or {})
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_visitor_reads_catalog_from_replica(self):
+        seen, response = self.route()
+        self.assertEqual(seen, {"character": "replica", "user": None})
+        self.assertNotIn(DB_PRIMARY_COOKIE, response.cookies)
+        # Fuera de una petición (comandos, shell) todo va a la primaria.
+        self.assertIsNone(self.router.db_for_read(Character))
+        self.assertFalse(self.router.allow_migrate("replica", "core"))
+
+    def test_writers_and_staff_read_their_writes(self):
+        seen, response = self.route("post", write=True)
+        self.assertIsNone(seen["character"])
+        self.assertEqual(response.cookies[DB_PRIMARY_COOKIE]["max-age"], 10)
+        self.assertIsNone(self.route(cookies={DB_PRIMARY_COOKIE: "1"})[0]["character"])
+        self.assertIsNone(self.route(cookies={settings.SESSION_COOKIE_NAME: "abc"})[0]["character"])
+        # Una escritura a mitad de un GET también fija la primaria desde ese momento.
+        seen, response = self.route(write=True)
+        self.assertIsNone(seen["character"])
+        self.assertIn(DB_PRIMARY_COOKIE, response.cookies)
+
+    def test_cached_pages_do_not_vary_on_cookie_with_replica(self):
+        """Decidir la ruta no toca la sesión: las páginas cacheadas siguen siendo una por URL."""
+        cache.clear()
+        Species.objects.create(name="Wookiee")
+        middleware = list(settings.MIDDLEWARE)
+        middleware.insert(middleware.index("django.contrib.auth.middleware.AuthenticationMiddleware") + 1, "core.routers.ReplicaRoutingMiddleware")
+        with override_settings(MIDDLEWARE=middleware), translation.override("es"):
+            url = reverse("species_list")
+            with patch.object(ReplicaRoutingMiddleware, "_may_use_replica", wraps=ReplicaRoutingMiddleware._may_use_replica) as decided:
+                first = self.client.get(url)
+                second = self.client.get(url)
+        decided.assert_called()
+        self.assertEqual(second["X-Cache"], "HIT")
+        for response in (first, second):
+            self.assertNotIn("Cookie", response.get("Vary", ""))
+
+
+class InquiryQueueTests(TestCase):
+    def setUp(self):
+        self.queue_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.queue_dir)
+        override = override_settings(INQUIRY_QUEUE_DIR=self.queue_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.planet = Planet.objects.create(name="Hoth", climate="frozen")
+
+    def test_post_is_queued_and_redirects(self):
+        with translation.override("es"):
+            url = reverse("planets") + "?climate=frozen"
+            response = self.client.post(url, {"name": "Leia", "planet": self.planet.pk, "message": "Base rebelde"})
+            self.assertRedirects(response, url + "#inquiry", fetch_redirect_response=False)
+            self.assertEqual((PlanetInquiry.objects.count(), inquiry_queue.pending()), (0, 1))
+            self.assertContains(self.client.get(url), "Transmisión recibida")
+            invalid = self.client.post(url, {"name": "", "message": ""})
+        self.assertEqual(invalid.status_code, 200)
+        self.assertEqual(inquiry_queue.flush(), 1)
+        self.assertEqual((inquiry_queue.pending(), inquiry_queue.flush()), (0, 0))
+        inquiry = PlanetInquiry.objects.get()
+        self.assertEqual((inquiry.name, inquiry.planet, inquiry.message), ("Leia", self.planet, "Base rebelde"))
+
+    def test_success_message_is_translated_and_kept_to_the_inquiry_box(self):
+        with translation.override("en"):
+            url = reverse("planets")
+            self.client.post(url, {"name": "Leia", "planet": self.planet.pk, "message": "Base rebelde"})
+            # Un aviso de otra parte de la web no debe acabar en la caja del formulario.
+            storage = CookieStorage(RequestFactory().get(url))
+            pending = storage._decode(self.client.cookies["messages"].value)
+            self.client.cookies["messages"] = storage._encode(pending + [Message(INFO, "Sesión cerrada")])
+            response = self.client.get(url)
+        self.assertContains(response, "Transmission received. Thank you for helping the galaxy.")
+        self.assertNotContains(response, "Sesión cerrada")
+
+    def test_flush_is_idempotent_and_skips_broken_lines(self):
+        done = inquiry_queue.enqueue({"name": "Han", "planet": self.planet, "message": "Ya insertada"})
+        lando = inquiry_queue.enqueue({"name": "Lando", "planet": self.planet, "message": "Planeta borrado"})
+        self.assertEqual(inquiry_queue.flush(), 2)
+        # Un vaciado que murió antes de borrar su lote, con la última línea a medias.
+        lines = [json.dumps({"intake_id": done, "created_at": "2026-01-01T00:00:00+00:00", "planet_id": None,
+                             "name": "Han", "message": "Ya insertada"}), '{"intake_id": "roto']
+        (Path(self.queue_dir) / "batch-1.jsonl").write_text("\n".join(lines))
+        inquiry_queue.enqueue({"name": "Mon", "planet": Planet(pk=999), "message": "Sin planeta"})
+        with self.assertLogs("core.inquiry_queue", level="WARNING"):
+            self.assertEqual(inquiry_queue.flush(), 1)
+        self.assertIsNone(PlanetInquiry.objects.get(name="Mon").planet)
+        self.assertEqual(PlanetInquiry.objects.filter(intake_id=lando).count(), 1)
+        self.assertEqual(list(Path(self.queue_dir).glob("*.jsonl")), [])
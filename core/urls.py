@@ -1,5 +1,5 @@
 from django.urls import path
-from django.views.decorators.cache import cache_page
+from core.cache import cache_page_swr
 from core.views import (
     HomeView,
     MediaListView,
@@ -14,23 +14,37 @@ from core.views import (
     crear_personaje,
     ChatPageView,
     ChatBotSearchView,
+    AsyncChatBotSearchView,
+    ChatBotStreamView,
+    ChatBotBatchView,
+    cache_stats_view,
+    autocomplete_view,
+    SearchView,
+    search_api_view,
 )
 
 
 urlpatterns = [
     path("", HomeView.as_view(), name="home"),
     path("chat/", ChatPageView.as_view(), name="chat"),
-    path("media/<int:media_id>/", cache_page(60 * 15)(MediaDetailView.as_view()), name="media_detail"),
-    path("media/", cache_page(60 * 15)(MediaListView.as_view()), name="media"),
+    path("media/<int:media_id>/", cache_page_swr(60 * 15)(MediaDetailView.as_view()), name="media_detail"),
+    path("media/", cache_page_swr(60 * 15)(MediaListView.as_view()), name="media"),
     path("characters/", CharacterListView.as_view(), name="characters"),
-    path("characters/<int:personaje_id>/", cache_page(60 * 15)(CharacterDetailView.as_view()), name="detalle_personaje"),
+    path("characters/<int:personaje_id>/", cache_page_swr(60 * 15)(CharacterDetailView.as_view()), name="detalle_personaje"),
     path("personajes/", CharacterListView.as_view(), name="index_personajes"),
-    path("species/<int:species_id>/", cache_page(60 * 15)(SpeciesDetailView.as_view()), name="species_detail"),
-    path("species/", cache_page(60 * 15)(SpeciesListView.as_view()), name="species_list"),
+    path("species/<int:species_id>/", cache_page_swr(60 * 15)(SpeciesDetailView.as_view()), name="species_detail"),
+    path("species/", cache_page_swr(60 * 15)(SpeciesListView.as_view()), name="species_list"),
     path("planets/", PlanetsView.as_view(), name="planets"),
-    path("planets/<int:planet_id>/", cache_page(60 * 15)(PlanetDetailView.as_view()), name="planet_detail"),
-    path("affiliations/<int:affiliation_id>/", cache_page(60 * 15)(AffiliationDetailView.as_view()), name="affiliation_detail"),
+    path("planets/<int:planet_id>/", cache_page_swr(60 * 15)(PlanetDetailView.as_view()), name="planet_detail"),
+    path("affiliations/<int:affiliation_id>/", cache_page_swr(60 * 15)(AffiliationDetailView.as_view()), name="affiliation_detail"),
     path("characters/crear/", crear_personaje, name="crear_personaje"),
     path("chatbot/search/", ChatBotSearchView.as_view(), name="chatbot_search"),
+    path("chatbot/search/async/", AsyncChatBotSearchView.as_view(), name="chatbot_search_async"),
+    path("chatbot/stream/", ChatBotStreamView.as_view(), name="chatbot_stream"),
+    path("chatbot/batch/", ChatBotBatchView.as_view(), name="chatbot_batch"),
+    path("autocomplete/", autocomplete_view, name="autocomplete"),
+    path("search/", SearchView.as_view(), name="search"),
+    path("search/api/", search_api_view, name="search_api"),
+    path("cache/stats/", cache_stats_view, name="cache_stats"),
     
 ]
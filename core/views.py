@@ -1,16 +1,33 @@
-import os
 import json
-import requests
+import secrets
+import time
 
-from django.db.models import Count, Prefetch, Q
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Prefetch, Q, Subquery
 from django.shortcuts import render, redirect
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.translation import gettext_lazy as _
+from django.views import View
 from django.views.generic import TemplateView, ListView, DetailView
 from django.contrib.auth.decorators import login_required, permission_required
-from django.urls import reverse
-
-from .models import Affiliation, Character, Media, Planet, Species, StarSystem
+from django.contrib.admin.views.decorators import staff_member_required
+from django.contrib import messages
+
+from . import chatbot, inquiry_queue
+from .autocomplete import KINDS as AUTOCOMPLETE_KINDS, prefix_index
+from .cache import cache_stats, cached_queryset
+from .facets import FACETS, character_facets, to_bitset
+from .models import Affiliation, Appearance, Character, CharacterAffiliation, Media, Planet, Species
 from .forms import PlanetInquiryForm, CharacterForm
+from .metrics import metrics_registry
+from .fuzzy import fuzzy_index
+from .registry import registry
+from .resilience import Deadline
+from .search import KINDS as SEARCH_KINDS, SNIPPET_WORDS, highlight, search
 
 
 @login_required
@@ -34,21 +51,20 @@ class HomeView(TemplateView):
     def get_context_data(self, **kwargs):
         """Monta el escaparate de la home con el personaje más alto de cada especie."""
         context = super().get_context_data(**kwargs)
-        featured = []
-
-        for s in Species.objects.all():
-            tallest = (
-                Character.objects
-                .filter(
-                    species=s,
-                    image_url__isnull=False
-                )
-                .exclude(image_url="")
-                .order_by("-height_m")
-                .first()
-            )
-            if tallest:
-                featured.append(tallest)
+        # Una sola consulta: el id del más alto de cada especie sale de una subconsulta correlacionada.
+        tallest = (
+            Character.objects
+            .filter(species=OuterRef("species"), image_url__isnull=False)
+            .exclude(image_url="")
+            .order_by("-height_m")
+            .values("pk")[:1]
+        )
+        featured = list(
+            Character.objects
+            .filter(pk=Subquery(tallest))
+            .select_related("species")
+            .order_by("species_id")
+        )
 
         context["featured_characters"] = featured
         context["stats"] = {
@@ -88,7 +104,8 @@ class MediaDetailView(DetailView):
     context_object_name = "film"
 
     def get_queryset(self):
-        character_qs = Character.objects.select_related("species").order_by("name")
+        # La especie se resuelve con el registro de referencia, sin JOIN.
+        character_qs = Character.objects.order_by("name")
         return Media.objects.prefetch_related(Prefetch("cast", queryset=character_qs))
 
     def get_context_data(self, **kwargs):
@@ -101,6 +118,108 @@ class MediaDetailView(DetailView):
         return context
 
 
+@staff_member_required
+def cache_stats_view(request):
+    """Contadores de las cachés de este proceso y estado del circuit breaker del LLM (solo staff)."""
+    return JsonResponse({**cache_stats(), "llm_breaker": chatbot.llm_breaker.snapshot()})
+
+
+def metrics_view(request):
+    """Métricas de todos los procesos en formato Prometheus (token Bearer; INTERNAL_IPS solo con DEBUG)."""
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = secrets.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+    else:
+        # Detrás de un proxy local todas las peticiones llegan desde 127.0.0.1.
+        allowed = settings.DEBUG and request.META.get("REMOTE_ADDR") in settings.INTERNAL_IPS
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def autocomplete_view(request):
+    """Sugerencias para los buscadores: `?q=prefijo&kinds=character,planet&limit=8`."""
+    kinds = {kind for kind in request.GET.get("kinds", "").split(",") if kind in AUTOCOMPLETE_KINDS} or None
+    try:
+        limit = min(max(int(request.GET.get("limit", 8)), 1), 20)
+    except ValueError:
+        limit = 8
+    suggestions = prefix_index.complete(request.GET.get("q", ""), kinds=kinds, limit=limit)
+    response = JsonResponse({"results": [suggestion.as_dict() for suggestion in suggestions]})
+    # El navegador puede reutilizar la respuesta mientras se escribe y se borra.
+    response["Cache-Control"] = "max-age=60"
+    return response
+
+
+SEARCH_LABELS = {
+    "character": _("Personajes"),
+    "species": _("Especies"),
+    "planet": _("Planetas"),
+    "media": _("Películas y series"),
+    "affiliation": _("Afiliaciones"),
+}
+
+
+def search_groups(request, group_size=5, page_size=20):
+    """
+    Resultados de `?q=` agrupados por tipo. Sin `type` muestra los primeros de
+    cada grupo; con `?type=planet&page=2` pagina solo ese tipo.
+    """
+    query = request.GET.get("q", "").strip()
+    kind = request.GET.get("type", "")
+    kinds = [kind] if kind in SEARCH_KINDS else None
+    results = search(query, kinds=kinds)
+
+    groups = []
+    for group_kind, hits in results.grouped().items():
+        page = Paginator(hits, page_size if kinds else group_size).get_page(request.GET.get("page") if kinds else 1)
+        groups.append({
+            "kind": group_kind,
+            "label": SEARCH_LABELS[group_kind],
+            "total": len(hits),
+            "page": page,
+            "results": [
+                {
+                    "kind": hit.kind,
+                    "id": hit.id,
+                    "url": hit.url,
+                    "title": highlight(hit.title, results.terms),
+                    "snippet": highlight(hit.body, results.terms, SNIPPET_WORDS),
+                    "score": hit.score,
+                }
+                for hit in page
+            ],
+        })
+    return {"q": query, "type": kinds[0] if kinds else "", "total": len(results.hits), "groups": groups}
+
+
+class SearchView(TemplateView):
+    """Búsqueda global en todo el catálogo (ver core.search)."""
+    template_name = "search.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(search_groups(self.request))
+        context["kind_options"] = SEARCH_LABELS.items()
+        return context
+
+
+def search_api_view(request):
+    """Misma búsqueda en JSON: títulos y fragmentos con <mark> en los términos encontrados."""
+    context = search_groups(request)
+    groups = [
+        {
+            "kind": group["kind"],
+            "total": group["total"],
+            "page": group["page"].number,
+            "num_pages": group["page"].paginator.num_pages,
+            "results": group["results"],
+        }
+        for group in context["groups"]
+    ]
+    return JsonResponse({"query": context["q"], "total": context["total"], "groups": groups})
+
+
 def handler_404(request, exception, template_name="errors/404.html"):
     return render(request, template_name, status=404)
 
@@ -127,65 +246,131 @@ class CharacterDetailView(DetailView):
 
 
 class CharacterListView(ListView):
-    """Buscador con filtros de texto, especie y película (sin caché: depende de permisos)."""
+    """Buscador con texto libre y facetas (sin caché: depende de permisos)."""
     model = Character
     template_name = "characters/list.html"
     context_object_name = "personajes"
+    facet_labels = {
+        "species": _("Especie"),
+        "media": _("Película"),
+        "affiliation": _("Afiliación"),
+        "gender": _("Género"),
+        "homeworld": _("Planeta natal"),
+    }
+    fuzzy_used = False
 
     def get_filters(self):
-        return {
-            "q": self.request.GET.get("q", "").strip(),
-            "species": self.request.GET.get("species", "").strip(),
-            "media": self.request.GET.get("media", "").strip(),
-        }
+        filters = {"q": self.request.GET.get("q", "").strip()}
+        for facet in FACETS:
+            filters[facet] = self.request.GET.get(facet, "").strip()
+        filters["gender"] = filters["gender"].lower()
+        return filters
+
+    def get_selection(self, filters):
+        """{faceta: [valor]} con los ids ya convertidos a int."""
+        selection = {}
+        for facet in FACETS:
+            value = filters[facet]
+            if facet == "gender" and value:
+                selection[facet] = [value]
+            elif value.isdigit():
+                selection[facet] = [int(value)]
+        return selection
 
     def get_queryset(self):
         filters = self.get_filters()
-        personajes = Character.objects.select_related("species").prefetch_related("films_and_series").all()
+        selection = self.get_selection(filters)
 
+        restrict = None
+        personajes = Character.objects.all()
         if filters["q"]:
             search = filters["q"]
-            personajes = personajes.filter(
+            text = (
                 Q(name__icontains=search)
                 | Q(gender__icontains=search)
                 | Q(species__name__icontains=search)
                 | Q(eye_color__icontains=search)
             )
-
-        if filters["species"].isdigit():
-            personajes = personajes.filter(species_id=int(filters["species"]))
-
-        if filters["media"].isdigit():
-            personajes = personajes.filter(films_and_series__id=int(filters["media"]))
-
-        return personajes.distinct().order_by("name")
+            restrict = to_bitset(list(Character.objects.filter(text).values_list("pk", flat=True)))
+            if not character_facets.query(selection, restrict).total:
+                # Sin coincidencias literales probamos con nombres aproximados ("skywaker").
+                self.fuzzy_used = True
+                text = self._fuzzy_filter(search)
+                restrict = to_bitset(list(Character.objects.filter(text).values_list("pk", flat=True)))
+            personajes = personajes.filter(text)
+
+        # Los bitsets dan los recuentos; el listado filtra en SQL para no
+        # mandar miles de ids como parámetros con facetas muy amplias.
+        self.facets = character_facets.query(selection, restrict)
+        for facet, values in selection.items():
+            personajes = personajes.filter(self._facet_filter(facet, values))
+        return personajes.order_by("name")
+
+    @staticmethod
+    def _facet_filter(facet, values):
+        if facet == "media":
+            return Q(pk__in=Appearance.objects.filter(media_id__in=values).values("character_id"))
+        if facet == "affiliation":
+            return Q(pk__in=CharacterAffiliation.objects.filter(affiliation_id__in=values).values("character_id"))
+        if facet == "gender":
+            return Q(gender__iexact=values[0])
+        return Q(**{f"{facet}_id__in": values})
+
+    def _fuzzy_filter(self, search):
+        character_ids, species_ids = set(), set()
+        for match in fuzzy_index.search(search, kinds={"character", "species"}, limit=10):
+            if match.kind == "character":
+                character_ids.add(match.id)
+            else:
+                especie = registry.species.named(match.name)
+                if especie:
+                    species_ids.add(especie.id)
+        return Q(pk__in=character_ids) | Q(species_id__in=species_ids)
+
+    def get_facet_options(self, filters):
+        """Opciones de cada desplegable con su recuento para la selección actual."""
+        options = []
+        selection = self.get_selection(filters)
+        for facet in FACETS:
+            counts = dict(self.facets.counts[facet])
+            for value in selection.get(facet, []):
+                # Lo elegido se sigue mostrando aunque ya no tenga personajes.
+                counts.setdefault(value, 0)
+            choices = []
+            for value, count in counts.items():
+                label = character_facets.label(facet, value)
+                if label:
+                    choices.append({"value": str(value), "label": label, "count": count})
+            if facet == "media":
+                # Las películas en orden de episodio, como en el registro.
+                order = {film.id: index for index, film in enumerate(registry.films)}
+                choices.sort(key=lambda choice: order.get(int(choice["value"]), len(order)))
+            else:
+                choices.sort(key=lambda choice: choice["label"].casefold())
+            options.append({"name": facet, "label": self.facet_labels[facet], "selected": filters[facet], "choices": choices})
+        return options
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         filters = self.get_filters()
         context["filters"] = filters
         context["filters_active"] = any(filters.values())
-        context["species_options"] = (
-            Species.objects.filter(character__isnull=False)
-            .annotate(character_count=Count("character", distinct=True))
-            .order_by("name")
-        )
-        context["media_options"] = Media.objects.filter(media_type=Media.FILM).order_by("episode", "release_date", "title")
+        context["fuzzy_used"] = self.fuzzy_used
+        context["facet_options"] = self.get_facet_options(filters)
         return context
 
 
 class SpeciesListView(ListView):
-    """Especies ordenadas que tengan al menos un personaje asociado."""
+    """Especies con al menos un personaje (o `?min=N`), por nombre o por nº de personajes (`?sort=count`)."""
     model = Species
     template_name = "species/list.html"
     context_object_name = "species_list"
 
     def get_queryset(self):
-        return (
-            Species.objects.filter(character__isnull=False)
-            .annotate(character_count=Count("character", distinct=True))
-            .order_by("name")
-        )
+        minimum = self.request.GET.get("min", "").strip()
+        minimum = int(minimum) if minimum.isdigit() else 1
+        ordering = ("-character_count", "name") if self.request.GET.get("sort") == "count" else ("name",)
+        return Species.objects.filter(character_count__gte=minimum).order_by(*ordering)
 
 
 class SpeciesDetailView(DetailView):
@@ -210,7 +395,6 @@ class SpeciesDetailView(DetailView):
 class PlanetsView(TemplateView):
     """Listado de planetas y formulario de contacto. Sin caché para no romper el POST."""
     template_name = "planets/list.html"
-    form_success = False
 
     def get_filters(self):
         return {
@@ -222,7 +406,7 @@ class PlanetsView(TemplateView):
 
     def get_planets(self):
         filters = self.get_filters()
-        planets_qs = Planet.objects.select_related("star_system").all().order_by("name")
+        planets_qs = Planet.objects.all().order_by("name")
 
         if filters["q"]:
             planets_qs = planets_qs.filter(name__icontains=filters["q"])
@@ -250,6 +434,7 @@ class PlanetsView(TemplateView):
             }
             return phrases.get(field, "Archivo incompleto.")
 
+        systems = registry.systems
         clean_planets = []
         for p in planets_qs:
             fields = {
@@ -267,7 +452,8 @@ class PlanetsView(TemplateView):
             p.display_population = p.population if fields["population"] not in bad_values else imperial_phrase("population")
             p.display_capital = p.capital_city if fields["capital_city"] not in bad_values else imperial_phrase("capital_city")
             p.display_grid = p.grid_coordinates if fields["grid_coordinates"] not in bad_values else imperial_phrase("grid_coordinates")
-            p.display_system = getattr(p.star_system, "name", imperial_phrase("star_system"))
+            system = systems.get(p.star_system_id)
+            p.display_system = system.name if system else imperial_phrase("star_system")
 
             p.valid_fields = valid_count
             clean_planets.append(p)
@@ -281,31 +467,32 @@ class PlanetsView(TemplateView):
         context["filters"] = filters
         context["filters_active"] = any(filters.values())
         context["planets"] = self.get_planets()
-        context["climate_options"] = (
+        context["climate_options"] = cached_queryset(
             Planet.objects.exclude(climate__isnull=True)
             .exclude(climate__exact="")
             .order_by("climate")
             .values_list("climate", flat=True)
             .distinct()
         )
-        context["terrain_options"] = (
+        context["terrain_options"] = cached_queryset(
             Planet.objects.exclude(terrain__isnull=True)
             .exclude(terrain__exact="")
             .order_by("terrain")
             .values_list("terrain", flat=True)
             .distinct()
         )
-        context["system_options"] = StarSystem.objects.order_by("name")
+        context["system_options"] = registry.systems
         context["inquiry_form"] = kwargs.get("inquiry_form", PlanetInquiryForm())
-        context["form_success"] = getattr(self, "form_success", False)
         return context
 
     def post(self, request, *args, **kwargs):
         form = PlanetInquiryForm(request.POST)
         if form.is_valid():
-            form.save()
-            self.form_success = True
-            return self.render_to_response(self.get_context_data(inquiry_form=PlanetInquiryForm()))
+            # A la cola (core.inquiry_queue) y redirección: ni cerrojo de SQLite ni
+            # volver a montar el listado, y recargar la página no reenvía el formulario.
+            inquiry_queue.enqueue(form.cleaned_data)
+            messages.success(request, _("Transmisión recibida. Gracias por colaborar con la galaxia."), extra_tags="inquiry")
+            return redirect(f"{request.get_full_path()}#inquiry")
         return self.render_to_response(self.get_context_data(inquiry_form=form))
 
 
@@ -316,20 +503,12 @@ class PlanetDetailView(DetailView):
     template_name = "planets/detail.html"
     context_object_name = "planet"
 
-    def get_queryset(self):
-        return Planet.objects.select_related("star_system")
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         planet = context["planet"]
-        context["native_species"] = (
-            planet.native_species.all()
-            .annotate(character_count=Count("character", distinct=True))
-            .order_by("name")
-        )
+        context["native_species"] = planet.native_species.order_by("name")
         context["residents"] = (
             Character.objects.filter(homeworld=planet)
-            .select_related("species")
             .order_by("name")
         )
         return context
@@ -347,7 +526,7 @@ class AffiliationDetailView(DetailView):
         affiliation = context["affiliation"]
         context["members"] = (
             Character.objects.filter(affiliations=affiliation)
-            .select_related("species", "homeworld")
+            .select_related("homeworld")
             .distinct()
             .order_by("name")
         )
@@ -364,141 +543,99 @@ class ChatBotSearchView(ListView):
         if not query:
             return JsonResponse({"error": "Falta la consulta"}, status=400)
 
-        personaje = self._find_character(query)
-        if personaje:
-            payload = self._character_payload(personaje, body=f"Te muestro info de {personaje.name}:")
-            return JsonResponse(payload, status=200)
-
-        media_obj = self._find_media(query)
-        if media_obj:
-            payload = self._media_payload(media_obj, body=f"Te muestro info de {media_obj.title}:")
-            return JsonResponse(payload, status=200)
-
-        gpt_data = self._gpt_reply(query)
-        if gpt_data:
-            name = gpt_data.get("name") or ""
-            body = gpt_data.get("body")
-
-            match = self._find_character(name)
-            if match:
-                payload = self._character_payload(match, body=body)
-                return JsonResponse(payload, status=200)
-
-            media_match = self._find_media(name)
-            if media_match:
-                payload = self._media_payload(media_match, body=body)
-                return JsonResponse(payload, status=200)
-
-            if body:
-                match = self._find_character(body)
-                if match:
-                    payload = self._character_payload(match, body=body)
-                    return JsonResponse(payload, status=200)
-                media_match = self._find_media(body)
-                if media_match:
-                    payload = self._media_payload(media_match, body=body)
-                    return JsonResponse(payload, status=200)
-
-            if body:
-                return JsonResponse({"reply": body}, status=200)
-
-        return JsonResponse(
-            {"reply": "Solo puedo ayudarte con personajes o películas de Star Wars. Prueba con un nombre o especie."},
-            status=200,
-        )
+        deadline = Deadline(chatbot.LATENCY_BUDGET)
+        # Las búsquedas devuelven tarjetas precalculadas del índice en memoria
+        # (core.entity_index), así que una coincidencia no consulta la BD.
+        payload = chatbot.resolve_local(query)
+        if payload is None:
+            payload = chatbot.resolve_llm(self._gpt_reply(query, deadline)) or chatbot.fallback_payload()
+        return JsonResponse(payload, status=200)
 
-    def _find_character(self, text: str):
-        return (
-            Character.objects.select_related("species", "homeworld")
-            .prefetch_related("films_and_series")
-            .filter(
-                Q(name__icontains=text)
-                | Q(species__name__icontains=text)
-                | Q(homeworld__name__icontains=text)
-            )
-            .order_by("name")
-            .first()
-        )
+    def _gpt_reply(self, query: str, deadline=None) -> dict | None:
+        return chatbot.gpt_reply(query, deadline=deadline)
 
-    def _character_payload(self, personaje, body=None):
-        films = (
-            personaje.films_and_series.filter(media_type=Media.FILM)
-            .order_by("episode", "release_date")
-            .values_list("title", flat=True)
-        )
-        return {
-            "kind": "character",
-            "name": personaje.name,
-            "body": body or f"Aquí tienes información sobre {personaje.name}.",
-            "species": getattr(personaje.species, "name", "Desconocida"),
-            "homeworld": getattr(personaje.homeworld, "name", "Desconocido"),
-            "cybernetics": personaje.cybernetics or "",
-            "film": films[0] if films else "Sin película registrada",
-            "image": personaje.image_url or "",
-            "detail_url": reverse("detalle_personaje", args=[personaje.id]),
-        }
 
-    def _find_media(self, text: str):
-        return (
-            Media.objects.filter(media_type=Media.FILM, title__icontains=text)
-            .order_by("episode", "release_date", "title")
-            .first()
-        )
+class AsyncChatBotSearchView(View):
+    """
+    Versión asíncrona del chatbot para servir con ASGI (uvicorn).
 
-    def _media_payload(self, media_obj, body=None):
-        poster_pool = [f"img/{i}.jpg" for i in range(1, 8)]
-        poster = poster_pool[(media_obj.id - 1) % len(poster_pool)]
-        return {
-            "kind": "media",
-            "name": media_obj.title,
-            "body": body or f"Aquí tienes información sobre {media_obj.title}.",
-            "release_year": media_obj.release_date.year if media_obj.release_date else None,
-            "episode": media_obj.episode,
-            "poster": poster,
-            "detail_url": reverse("media_detail", args=[media_obj.id]),
-        }
+    Mientras espera al LLM no ocupa ningún hilo: miles de conversaciones pueden
+    quedar pendientes del upstream sin agotar los workers.
+    """
+    http_method_names = ["get"]
 
-    def _gpt_reply(self, query: str) -> dict | None:
-        """Llama a la API de OpenAI si hay clave y devuelve JSON {name, body}."""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            return None
+    async def get(self, request, *args, **kwargs):
+        query = request.GET.get("q", "").strip()
+        if not query:
+            return JsonResponse({"error": "Falta la consulta"}, status=400)
 
-        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        payload = {
-            "model": model,
-            "messages": [
-                {
-                    "role": "system",
-                    "content": (
-                        "Responde solo sobre personajes o películas de Star Wars. "
-                        "Devuelve siempre un JSON con los campos 'name' y 'body'. "
-                        "En 'name' pon el nombre del personaje o título de la película si se entiende de la pregunta; "
-                        "si no es de Star Wars, deja name vacío y body indicando que solo respondes sobre Star Wars."
-                    ),
-                },
-                {"role": "user", "content": query},
-            ],
-            "temperature": 0.2,
-            "max_tokens": 120,
-            "response_format": {"type": "json_object"},
-        }
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-        }
+        deadline = Deadline(chatbot.LATENCY_BUDGET)
+        # El índice puede tener que reconstruirse desde la BD: fuera del event loop.
+        payload = await sync_to_async(chatbot.resolve_local)(query)
+        if payload is None:
+            gpt_data = await chatbot.agpt_reply(query, deadline=deadline)
+            payload = await sync_to_async(chatbot.resolve_llm)(gpt_data) or chatbot.fallback_payload()
+        return JsonResponse(payload, status=200)
+
+
+def _over_rate(request, scope, amount, limit, period=60):
+    """Ventana fija por usuario (o IP) en la caché: True si con `amount` se pasa de `limit` por `period` s."""
+    client = request.user.pk if request.user.is_authenticated else request.META.get("REMOTE_ADDR", "")
+    key = f"rate:{scope}:{client}:{int(time.time() // period)}"
+    cache.add(key, 0, period)
+    try:
+        return cache.incr(key, amount) > limit
+    except ValueError:  # la ventana caducó entre add e incr
+        return False
+
+
+class ChatBotBatchView(View):
+    """
+    Varias preguntas en una sola petición (QA masivo, precarga de sugerencias).
+
+    POST con JSON `{"queries": ["...", ...]}`; responde `{"results": [...]}` en
+    el mismo orden, cada resultado con su `query` y la misma forma que el
+    endpoint individual. Cada pregunta puede ser una llamada de pago a OpenAI:
+    solo para staff (con su sesión y token CSRF) y como mucho
+    `CHATBOT_BATCH_RATE` preguntas por minuto y usuario.
+    """
+    http_method_names = ["post"]
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return JsonResponse({"error": "Solo para staff"}, status=403)
         try:
-            res = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                json=payload,
-                headers=headers,
-                timeout=10,
-            )
-            res.raise_for_status()
-            data = res.json()
-            content = data["choices"][0]["message"]["content"]
-            if isinstance(content, str):
-                return json.loads(content)
-            return content
-        except Exception:
-            return None
+            queries = json.loads(request.body)["queries"]
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse({"error": "Se espera un JSON con la lista 'queries'"}, status=400)
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) for q in queries):
+            return JsonResponse({"error": "'queries' debe ser una lista de textos"}, status=400)
+        if len(queries) > chatbot.BATCH_MAX_QUERIES:
+            return JsonResponse({"error": f"Máximo {chatbot.BATCH_MAX_QUERIES} preguntas por lote"}, status=400)
+        if _over_rate(request, "chatbot_batch", len(queries), settings.CHATBOT_BATCH_RATE):
+            response = JsonResponse({"error": "Demasiadas preguntas; prueba en un minuto"}, status=429)
+            response["Retry-After"] = "60"
+            return response
+        return JsonResponse({"results": chatbot.resolve_batch([q.strip() for q in queries])})
+
+
+class ChatBotStreamView(View):
+    """
+    Chatbot por Server-Sent Events: la ficha local sale en el primer evento y
+    el texto del LLM se envía según llega. Con ASGI usa el generador asíncrono.
+    """
+    http_method_names = ["get"]
+
+    def get(self, request, *args, **kwargs):
+        query = request.GET.get("q", "").strip()
+        if not query:
+            return JsonResponse({"error": "Falta la consulta"}, status=400)
+        if isinstance(request, ASGIRequest):
+            events = chatbot.astream_events(query)
+        else:
+            events = chatbot.stream_events(query)
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Evita que nginx acumule el stream antes de enviarlo.
+        response["X-Accel-Buffering"] = "no"
+        return response
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Compara el chatbot síncrono y el asíncrono contra un OpenAI falso.
+
+Lanza `core.fake_openai` con la latencia indicada y manda N preguntas que no
+están en el índice local (todas acaban en el LLM):
+
+- sync: `/chatbot/search/` con un pool de W hilos, como W workers WSGI.
+- async: `/chatbot/search/async/` con todas las peticiones a la vez sobre el
+  handler ASGI, como un único worker de uvicorn.
+
+Uso:
+    python scripts/bench_chatbot.py --requests 200 --workers 8 --delay 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "swsite.settings")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def report(label, started, latencies, statuses):
+    total = time.perf_counter() - started
+    errors = sum(1 for status in statuses if status != 200)
+    print(
+        f"{label:<6} total {total:6.2f}s  {len(latencies) / total:7.1f} req/s  "
+        f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  p95 {percentile(latencies, 95) * 1000:7.1f} ms  "
+        f"errores {errors}"
+    )
+
+
+def bench_sync(url, queries, workers):
+    from django.test import Client
+
+    def one(query):
+        start = time.perf_counter()
+        response = Client().get(url, {"q": query})
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, queries))
+    report("sync", started, [r[0] for r in results], [r[1] for r in results])
+
+
+async def bench_async(url, queries):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+
+    async def one(query):
+        start = time.perf_counter()
+        response = await client.get(url, {"q": query})
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one(query) for query in queries))
+    report("async", started, [r[0] for r in results], [r[1] for r in results])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8, help="Hilos del modo síncrono (workers WSGI simulados).")
+    parser.add_argument("--delay", type=float, default=0.5, help="Latencia simulada del LLM en segundos.")
+    args = parser.parse_args()
+
+    from core.fake_openai import run_in_thread
+
+    server, stop = run_in_thread(delay=args.delay)
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "fake"
+    # Todas las preguntas deben llegar al LLM.
+    os.environ["LLM_CACHE_TTL"] = "0"
+
+    import django
+
+    django.setup()
+    from django.conf import settings
+    from django.urls import reverse
+    from django.utils import translation
+
+    from core.entity_index import entity_index
+    from core.fuzzy import fuzzy_index
+
+    settings.ALLOWED_HOSTS.append("testserver")
+    # Índices construidos antes de medir, como en un proceso ya caliente.
+    fuzzy_index.get()
+    with translation.override("es"):
+        sync_url = reverse("chatbot_search")
+        async_url = reverse("chatbot_search_async")
+    entity_index.get()
+
+    queries = [f"pregunta {i} sobre qwzx" for i in range(args.requests)]
+    print(f"{args.requests} peticiones, LLM falso con {args.delay}s de latencia, {args.workers} workers síncronos")
+    try:
+        bench_sync(sync_url, queries, args.workers)
+        asyncio.run(bench_async(async_url, queries))
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
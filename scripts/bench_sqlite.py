@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Compara el perfil de SQLite por defecto con `DJANGO_DB_PROFILE=production`.
+
+Para cada perfil copia `db.sqlite3` a un directorio temporal (en modo de
+journal clásico, para que ambos partan igual) y lanza `manage.py loadtest
+--serve` contra la copia: uvicorn con varios workers, OpenAI falso y una mezcla
+de lecturas con envíos del formulario de planetas (`--write-weight`). Con
+`--load-data` además ejecuta `load_data --skip-swapi` en bucle durante la
+prueba, como escritor pesado; con `--replica` las lecturas del catálogo van por
+la conexión de solo lectura (`core.routers`). La base de datos de desarrollo no
+se modifica.
+
+Uso:
+    python scripts/bench_sqlite.py --workers 4 --concurrency 40 --duration 20 --load-data
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILES = ("default", "production")
+
+
+def copy_database(source, target):
+    """Copia consistente (también si el origen está en WAL) y en modo DELETE."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        src.close()
+        dst.close()
+
+
+def count_inquiries(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM core_planetinquiry").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def load_data_loop(env, stop, runs):
+    while not stop.is_set():
+        result = subprocess.run(
+            [sys.executable, "manage.py", "load_data", "--skip-swapi"],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        runs.append(result.returncode)
+
+
+def run_profile(profile, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp) / "db.sqlite3"
+        copy_database(args.database, database)
+        inquiries = count_inquiries(database)
+        env = {
+            **os.environ,
+            "DJANGO_DB_PROFILE": profile,
+            "DJANGO_DB_PATH": str(database),
+            "METRICS_DIR": str(Path(tmp) / "metrics"),
+            "LLM_CACHE_PATH": str(Path(tmp) / "llm_cache.sqlite3"),
+            "INQUIRY_QUEUE_DIR": str(Path(tmp) / "inquiries"),
+            "PERF_LOG_LEVEL": "WARNING",
+            "DB_READ_REPLICA": "true" if args.replica else "false",
+        }
+        command = [
+            sys.executable, "manage.py", "loadtest", "--serve", "--json",
+            "--workers", str(args.workers), "--concurrency", str(args.concurrency),
+            "--duration", str(args.duration), "--mix", ",".join(filter(None, [f"inquiry_post={args.write_weight}", args.mix])),
+        ]
+        if args.seed is not None:
+            command += ["--seed", str(args.seed)]
+
+        stop, runs = threading.Event(), []
+        writer = None
+        if args.load_data:
+            writer = threading.Thread(target=load_data_loop, args=(env, stop, runs), daemon=True)
+            writer.start()
+        try:
+            result = subprocess.run(command, cwd=BASE_DIR, env=env, capture_output=True, text=True)
+        finally:
+            stop.set()
+            if writer is not None:
+                writer.join()
+        if result.returncode:
+            sys.exit(f"[{profile}] loadtest falló:\n{result.stderr or result.stdout}")
+        # Lo que quedó en la cola de consultas al parar uvicorn.
+        subprocess.run([sys.executable, "manage.py", "flush_inquiries"], cwd=BASE_DIR, env=env, capture_output=True)
+        # El resumen JSON es lo último que imprime; antes van las líneas de arranque.
+        summary = json.loads(result.stdout[result.stdout.index("{"):])
+        summary["inquiries_written"] = count_inquiries(database) - inquiries
+        summary["load_data_runs"] = len(runs)
+        summary["load_data_failed"] = sum(1 for code in runs if code)
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", type=Path, default=BASE_DIR / "db.sqlite3", help="Base de datos a copiar.")
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    parser.add_argument("--workers", type=int, default=4, help="Procesos de uvicorn.")
+    parser.add_argument("--concurrency", type=int, default=40, help="Usuarios virtuales simultáneos.")
+    parser.add_argument("--duration", type=float, default=20, help="Segundos de prueba por perfil.")
+    parser.add_argument("--write-weight", type=float, default=10, help="Peso de los POST del formulario de planetas.")
+    parser.add_argument("--mix", help="Más pesos para loadtest, p. ej. 'characters=0,inquiry_post=20'.")
+    parser.add_argument("--load-data", action="store_true", help="Ejecuta load_data en bucle durante la prueba.")
+    parser.add_argument("--replica", action="store_true", help="Lecturas del catálogo por la réplica de solo lectura.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if not args.database.exists():
+        sys.exit(f"No existe {args.database}: ejecuta migrate y load_data antes.")
+    print(
+        f"{args.workers} workers, {args.concurrency} usuarios, {args.duration:.0f}s por perfil, "
+        f"peso de escrituras {args.write_weight}{', con load_data en bucle' if args.load_data else ''}"
+    )
+    print(
+        f"{'perfil':<11} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8} "
+        f"{'503 lock':>8} {'POSTs':>6} {'load_data':>9}"
+    )
+    for profile in args.profiles:
+        s = run_profile(profile, args)
+        load_data = f"{s['load_data_runs'] - s['load_data_failed']}/{s['load_data_runs']}" if args.load_data else "-"
+        print(
+            f"{profile:<11} {s['throughput']:>7} {s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8} "
+            f"{s['error_rate']:>8.2%} {s['lock_timeouts']:>8} {s['inquiries_written']:>6} {load_data:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
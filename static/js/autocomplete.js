@@ -0,0 +1,111 @@
+// Autocompletado de los buscadores (endpoint /autocomplete/).
+// Se activa en cualquier input con data-autocomplete="<url>"; opcionalmente
+// data-autocomplete-kinds="character,planet" y data-autocomplete-mode="fill"
+// (rellena el input y envía el formulario en vez de ir a la ficha).
+(() => {
+  const DEBOUNCE_MS = 150;
+  // Respuestas ya recibidas, compartidas por todos los inputs de la página.
+  const responses = new Map();
+
+  const setup = (input) => {
+    const url = input.dataset.autocomplete;
+    const kinds = input.dataset.autocompleteKinds || "";
+    const fill = input.dataset.autocompleteMode === "fill";
+    const list = document.createElement("ul");
+    list.className = "autocomplete-list";
+    list.hidden = true;
+    input.setAttribute("autocomplete", "off");
+    input.parentNode.classList.add("autocomplete-host");
+    input.parentNode.appendChild(list);
+
+    let timer = null;
+    let controller = null;
+    let active = -1;
+
+    const close = () => {
+      list.hidden = true;
+      active = -1;
+    };
+
+    const choose = (item) => {
+      if (fill) {
+        input.value = item.name;
+        close();
+        input.form?.requestSubmit();
+      } else {
+        window.location.href = item.url;
+      }
+    };
+
+    const render = (items) => {
+      list.innerHTML = "";
+      active = -1;
+      items.forEach((item) => {
+        const li = document.createElement("li");
+        const link = document.createElement("a");
+        link.href = item.url;
+        link.textContent = item.name;
+        const kind = document.createElement("small");
+        kind.textContent = item.kind;
+        link.appendChild(kind);
+        link.addEventListener("mousedown", (event) => {
+          event.preventDefault();
+          choose(item);
+        });
+        li.appendChild(link);
+        list.appendChild(li);
+      });
+      list.hidden = items.length === 0;
+      list._items = items;
+    };
+
+    const lookup = async (query) => {
+      const key = `${kinds}|${query.toLowerCase()}`;
+      if (responses.has(key)) {
+        render(responses.get(key));
+        return;
+      }
+      controller?.abort();
+      controller = new AbortController();
+      try {
+        const params = new URLSearchParams({ q: query, kinds });
+        const res = await fetch(`${url}?${params}`, { signal: controller.signal });
+        const data = await res.json();
+        responses.set(key, data.results || []);
+        if (input.value.trim() === query) render(data.results || []);
+      } catch (err) {
+        // Petición cancelada por otra más reciente o error de red: se ignora.
+      }
+    };
+
+    input.addEventListener("input", () => {
+      clearTimeout(timer);
+      const query = input.value.trim();
+      if (!query) {
+        close();
+        return;
+      }
+      timer = setTimeout(() => lookup(query), DEBOUNCE_MS);
+    });
+
+    input.addEventListener("keydown", (event) => {
+      const items = list._items || [];
+      if (list.hidden || !items.length) return;
+      if (event.key === "ArrowDown" || event.key === "ArrowUp") {
+        event.preventDefault();
+        const step = event.key === "ArrowDown" ? 1 : -1;
+        active = (active + step + items.length) % items.length;
+        list.querySelectorAll("li").forEach((li, i) => li.classList.toggle("active", i === active));
+      } else if (event.key === "Enter" && active >= 0) {
+        event.preventDefault();
+        choose(items[active]);
+      } else if (event.key === "Escape") {
+        close();
+      }
+    });
+
+    input.addEventListener("blur", close);
+  };
+
+  document.querySelectorAll("input[data-autocomplete]").forEach(setup);
+})();
@@ -45,23 +45,27 @@
       if (data.detail_url) {
         parts.push(`<small><a href="${data.detail_url}">Ver más</a></small>`);
       }
+    } else if (data.detail_url) {
+      parts.push(`<small><a href="${data.detail_url}">Ver más</a></small>`);
     }
     parts.push("</div>");
     return parts.join("");
   };
 
-  form.addEventListener("submit", async (e) => {
-    e.preventDefault();
-    const query = input.value.trim();
-    if (!query) return;
-
-    addMessage(query, "user");
-    animateDock();
-    input.value = "";
-    input.focus();
+  const showAnswer = (data) => {
+    if (data.name) {
+      const cardHtml = buildCard(data);
+      const text = data.body || `Te muestro info sobre ${data.name}:`;
+      addMessage(text, "bot", cardHtml);
+    } else if (data.reply) {
+      addMessage(data.reply, "bot");
+    } else {
+      addMessage("No encontré nada. Pregunta por un personaje o especie concreta.", "bot");
+    }
+  };
 
+  const fetchAnswer = async (query) => {
     const endpoint = chatSection.dataset.endpoint || "/chatbot/search/";
-
     try {
       const res = await fetch(`${endpoint}?q=${encodeURIComponent(query)}`);
       const data = await res.json();
@@ -69,18 +73,75 @@
         addMessage("Solo puedo ayudarte con personajes de Star Wars. Prueba con un nombre o especie.", "bot");
         return;
       }
+      showAnswer(data);
+    } catch (err) {
+      addMessage("No pude procesar tu consulta ahora mismo.", "bot");
+    }
+  };
+
+  // Server-Sent Events: la ficha local llega en el primer evento y el texto
+  // del LLM se va pintando según llega. Si el stream falla sin haber recibido
+  // nada, se repite la consulta con el endpoint JSON.
+  const streamAnswer = (endpoint, query) => {
+    const source = new EventSource(`${endpoint}?q=${encodeURIComponent(query)}`);
+    let bubble = null;
+    let received = false;
+
+    const streamingText = () => {
+      if (!bubble) {
+        bubble = document.createElement("div");
+        bubble.className = "chat-bubble bot";
+        bubble.appendChild(document.createElement("p"));
+        log.appendChild(bubble);
+      }
+      return bubble.querySelector("p");
+    };
 
-      if (data.name) {
-        const cardHtml = buildCard(data);
-        const text = data.body || `Te muestro info sobre ${data.name}:`;
-        addMessage(text, "bot", cardHtml);
-      } else if (data.reply) {
-        addMessage(data.reply, "bot");
+    source.addEventListener("token", (event) => {
+      received = true;
+      streamingText().textContent += JSON.parse(event.data).text;
+      log.scrollTop = log.scrollHeight;
+    });
+
+    source.addEventListener("match", (event) => {
+      received = true;
+      const data = JSON.parse(event.data);
+      if (bubble) {
+        bubble.insertAdjacentHTML("beforeend", buildCard(data));
+        log.scrollTop = log.scrollHeight;
       } else {
-        addMessage("No encontré nada. Pregunta por un personaje o especie concreta.", "bot");
+        showAnswer(data);
       }
-    } catch (err) {
-      addMessage("No pude procesar tu consulta ahora mismo.", "bot");
+    });
+
+    source.addEventListener("reply", (event) => {
+      received = true;
+      showAnswer(JSON.parse(event.data));
+    });
+
+    source.addEventListener("done", () => source.close());
+
+    source.onerror = () => {
+      source.close();
+      if (!received) fetchAnswer(query);
+    };
+  };
+
+  form.addEventListener("submit", async (e) => {
+    e.preventDefault();
+    const query = input.value.trim();
+    if (!query) return;
+
+    addMessage(query, "user");
+    animateDock();
+    input.value = "";
+    input.focus();
+
+    const streamEndpoint = chatSection.dataset.streamEndpoint;
+    if (streamEndpoint && window.EventSource) {
+      streamAnswer(streamEndpoint, query);
+    } else {
+      fetchAnswer(query);
     }
   });
 })();
@@ -3,6 +3,10 @@ ASGI config for swsite project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Necesario para el chatbot asíncrono (``chatbot/search/async/``):
+
+    uvicorn swsite.asgi:application --workers 2
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
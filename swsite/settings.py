@@ -15,7 +15,9 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 
 import os
+import sys
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from django.utils.translation import gettext_lazy as _
 
 
@@ -85,7 +87,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise apto para ASGI
+    'core.perf.PerformanceMiddleware',  # Server-Timing y presupuestos de consultas
+    'core.profiling.ProfilingMiddleware',  # perfiles bajo demanda (cabecera X-Profile)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,6 +97,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.DatabaseLockMiddleware',  # SQLite bloqueado → 503 + Retry-After
 ]
 
 # Añadir debug toolbar solo si está instalada y en DEBUG
@@ -110,7 +115,7 @@ ROOT_URLCONF = 'swsite.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.perf.TimedDjangoTemplates',  # DjangoTemplates midiendo el render
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -133,13 +138,59 @@ WSGI_APPLICATION = 'swsite.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
+# Ejecución de `manage.py test` (varios ajustes cambian en los tests).
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': Path(os.getenv("DJANGO_DB_PATH", BASE_DIR / 'db.sqlite3')),
     }
 }
 
+# Perfil de la base de datos (core/db.py). "production": WAL y PRAGMAs ajustados
+# en cada conexión, conexiones persistentes con health check y transacciones
+# BEGIN IMMEDIATE (el cerrojo de escritura se pide al empezar y se espera con
+# busy_timeout, en vez de fallar al intentar subir de lectura a escritura).
+DB_PROFILE = os.getenv("DJANGO_DB_PROFILE", "default").lower()
+SQLITE_PRAGMAS = {}
+if DB_PROFILE == "production":
+    DATABASES["default"].update(
+        CONN_MAX_AGE=int(os.getenv("DB_CONN_MAX_AGE", 600)),
+        CONN_HEALTH_CHECKS=True,
+        OPTIONS={"transaction_mode": "IMMEDIATE"},
+    )
+    SQLITE_PRAGMAS = {
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+        "cache_size": -64 * 1024,  # en KiB: 64 MiB por conexión
+        "temp_store": "MEMORY",
+    }
+elif DB_PROFILE != "default":
+    raise ImproperlyConfigured(f"DJANGO_DB_PROFILE desconocido: {DB_PROFILE} (default o production)")
+
+# Réplica de solo lectura para las lecturas del catálogo (core/routers.py): el
+# mismo fichero en modo `mode=ro` o una copia sincronizada aparte. Quien acaba
+# de escribir lee de la primaria durante DB_REPLICA_PIN_SECONDS. En los tests
+# no se usa: las lecturas no verían los datos de la transacción de cada test.
+DB_READ_REPLICA = os.getenv("DB_READ_REPLICA", "false").lower() == "true" and not TESTING
+DB_REPLICA_PIN_SECONDS = int(os.getenv("DB_REPLICA_PIN_SECONDS", 10))
+if DB_READ_REPLICA:
+    replica_path = Path(os.getenv("DB_REPLICA_PATH", DATABASES["default"]["NAME"])).resolve()
+    DATABASES["replica"] = {
+        **{key: value for key, value in DATABASES["default"].items() if key != "OPTIONS"},
+        "NAME": f"file:{replica_path}?mode=ro",
+    }
+    DATABASE_ROUTERS = ["core.routers.PrimaryReplicaRouter"]
+    # Tras AuthenticationMiddleware: el staff siempre lee de la primaria.
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+        'core.routers.ReplicaRoutingMiddleware',
+    )
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -169,6 +220,82 @@ CACHES = {
 }
 
 
+# Versiones por tabla de core.cache: un fichero por tabla, compartido por todos
+# los procesos de la máquina (workers, load_data, flush_inquiries...).
+TABLE_VERSIONS_DIR = Path(os.getenv("TABLE_VERSIONS_DIR", BASE_DIR / "var" / ("table-versions-test" if TESTING else "table-versions")))
+
+
+# Caché en disco de respuestas del LLM del chatbot (core/llm_cache.py).
+# LLM_CACHE_TTL=0 la desactiva.
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", BASE_DIR / "var" / "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+
+
+# Matrices TF-IDF de la búsqueda semántica del chatbot (core/semantic.py).
+SEMANTIC_INDEX_DIR = Path(os.getenv("SEMANTIC_INDEX_DIR", BASE_DIR / "var" / "semantic"))
+
+
+# Métricas por petición (core/perf.py): máximo de consultas SQL por nombre de
+# ruta. Al pasarse se registra un aviso; en los tests se lanza una excepción.
+PERF_QUERY_BUDGETS = {
+    "home": 6,
+    "characters": 8,
+    "detalle_personaje": 8,
+    "media": 4,
+    "media_detail": 6,
+    "species_list": 4,
+    "species_detail": 8,
+    "planets": 8,
+    "planet_detail": 8,
+    "affiliation_detail": 6,
+    "search": 8,
+    "search_api": 6,
+    "autocomplete": 12,
+}
+PERF_DEFAULT_QUERY_BUDGET = int(os.getenv("PERF_DEFAULT_QUERY_BUDGET", 50))
+PERF_BUDGET_RAISE = TESTING
+
+# Lotes del chatbot (chatbot/batch/, solo staff): preguntas por minuto y usuario.
+CHATBOT_BATCH_RATE = int(os.getenv("CHATBOT_BATCH_RATE", 100))
+
+# Endpoint /metrics (core/metrics.py): cada proceso vuelca sus métricas en un
+# JSON de METRICS_DIR. Con METRICS_TOKEN se exige "Authorization: Bearer <token>";
+# sin él solo se atiende a las INTERNAL_IPS y únicamente con DEBUG.
+METRICS_DIR = Path(os.getenv("METRICS_DIR", BASE_DIR / "var" / ("metrics-test" if TESTING else "metrics")))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Perfiles de CPU y memoria por petición (core/profiling.py): con la cabecera
+# firmada X-Profile (`manage.py profiles --token`) o para una fracción al azar
+# del tráfico. Se listan con `manage.py profiles`.
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", BASE_DIR / "logs" / "profiles"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SAMPLE_MEMORY = os.getenv("PROFILE_SAMPLE_MEMORY", "false").lower() == "true"
+PROFILE_TOKEN_MAX_AGE = int(os.getenv("PROFILE_TOKEN_MAX_AGE", 3600))
+
+# Cola de las consultas del formulario de planetas (core/inquiry_queue.py): el
+# POST solo añade una línea a un fichero y un hilo de cada proceso las inserta
+# en lote cada INQUIRY_FLUSH_INTERVAL segundos (0 lo desactiva; en los tests se
+# vacía a mano). `manage.py flush_inquiries` hace lo mismo desde fuera.
+INQUIRY_QUEUE_DIR = Path(os.getenv("INQUIRY_QUEUE_DIR", BASE_DIR / "var" / ("inquiries-test" if TESTING else "inquiries")))
+INQUIRY_FLUSH_INTERVAL = 0 if TESTING else float(os.getenv("INQUIRY_FLUSH_INTERVAL", 2))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"plain": {"format": "%(levelname)s %(name)s %(message)s"}},
+    "handlers": {"console": {"class": "logging.StreamHandler", "formatter": "plain"}},
+    "loggers": {
+        # Una línea JSON por petición; PERF_LOG_LEVEL=WARNING deja solo los avisos de presupuesto.
+        "core.perf": {
+            "handlers": ["console"],
+            "level": os.getenv("PERF_LOG_LEVEL", "WARNING" if TESTING else "INFO"),
+            "propagate": False,
+        },
+    },
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
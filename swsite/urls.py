@@ -19,8 +19,12 @@ from django.contrib import admin
 from django.conf.urls.i18n import i18n_patterns
 from django.urls import path, include
 
+from core.views import metrics_view
+
 urlpatterns = [
     path("i18n/", include("django.conf.urls.i18n")),
+    # Sin prefijo de idioma: es la URL que consulta Prometheus.
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 urlpatterns += i18n_patterns(